@@ -0,0 +1,92 @@
+# benchmarks/__main__.py
+"""
+Offline benchmark suite against the fake SmartAPI broker (src.fake_broker).
+
+    python -m benchmarks                      # run, compare with benchmarks/baseline.json if present
+    python -m benchmarks --save               # run and record the results as the baseline
+    python -m benchmarks --only tick_to_signal order_round_trip --quick
+
+Exits with status 1 when a result regresses past the tolerances or a benchmark's own
+check fails (e.g. the fake broker refused calls over its rate limit), so it can gate a
+change. Baselines are machine specific: record one before a change, on the same
+machine, and compare after it.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.cases import BENCHMARKS, BenchmarkContext
+from benchmarks.harness import compare, format_table, load_baseline, save_baseline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline performance benchmarks.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, for a smoke run.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare with or save to.")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline instead of comparing.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed p50 latency and throughput regression (fraction, default 0.2).")
+    parser.add_argument("--tail-tolerance", type=float, default=0.5,
+                        help="Allowed p99 latency regression (fraction, default 0.5).")
+    parser.add_argument("--scrip-rows", type=int, default=150_000, help="Rows of the synthetic scrip master.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fixed fake broker latency per call.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Mean exponential latency tail per call.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of broker calls that fail.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    # Warnings and errors (unknown symbols, injected broker failures) would swamp the output;
+    # the benchmarks count them instead.
+    logging.basicConfig(level=logging.CRITICAL)
+    settings = {name: getattr(args, name) for name in ('quick', 'scrip_rows', 'latency_ms', 'jitter_ms',
+                                                       'error_rate', 'seed')}
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        ctx = BenchmarkContext(workdir, args.scrip_rows, args.latency_ms, args.jitter_ms, args.error_rate,
+                               args.quick, args.seed)
+        results = {}
+        failures = []
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            for result_name, samples in BENCHMARKS[name](ctx).items():
+                results[result_name] = samples.summary()
+                failures.extend(f"{result_name}: {message}" for message in samples.failures)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+    for failure in failures:
+        print(f"FAILED {failure}")
+    if failures:
+        return 1
+    if args.save:
+        save_baseline(args.baseline, results, settings)
+        print(f"Saved baseline to {args.baseline}.")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to record one.")
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline.get('settings') != settings:
+        print(f"Warning: baseline was recorded with different settings: {baseline.get('settings')}.")
+    regressions = compare(results, baseline, args.tolerance, args.tail_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions against {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
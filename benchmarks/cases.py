@@ -0,0 +1,238 @@
+# benchmarks/cases.py
+import os
+import random
+import time
+
+from benchmarks.harness import Samples
+from src.api import AngelOneAPI
+from src.bar_aggregator import BarAggregator
+from src.clock import SimulatedClock
+from src.config import ConfigManager
+from src.fake_broker import FakeBroker, write_scrip_master
+from src.market_data_manager import SNAP_QUOTE, MarketDataManager, encode_tick
+from src.models.enums import OrderType, Side
+from src.orders import PaperTradingEngine
+from src.portfolio import Portfolio
+from src.risk_manager import RiskManager
+from src.stock_basket import StockBasketManager
+from src.strategy import IndicatorEngine, TrendStrategy
+
+SESSION_START_MS = 1717386300000  # Monday 2024-06-03 09:15 IST
+
+
+class BenchmarkContext:
+    """
+    Shared setup of a benchmark run: a scratch directory with the synthetic scrip
+    master, a ConfigManager pointed at it with fake credentials, and the FakeBroker
+    every AngelOneAPI of the run talks to.
+    """
+
+    def __init__(self, workdir: str, scrip_rows: int = 150_000, latency_ms: float = 20.0, jitter_ms: float = 10.0,
+                 error_rate: float = 0.0, quick: bool = False, seed: int = 1):
+        self.workdir = workdir
+        self.quick = quick
+        self.seed = seed
+        self.scrip_master_path = os.path.join(workdir, "OpenAPIScripMaster.json")
+        self.symbols = write_scrip_master(self.scrip_master_path, scrip_rows, seed=seed)
+        self.broker = FakeBroker(latency_ms, jitter_ms, error_rate, seed=seed)
+        os.environ.update({
+            'ANGELONE_CLIENT_ID': 'bench', 'ANGELONE_CLIENT_SECRET': 'bench',
+            'ANGELONE_REDIRECT_URI': 'http://localhost', 'ANGELONE_USERNAME': 'BENCH01', 'ANGELONE_PIN': '0000',
+            'ANGELONE_TOTP_SECRET': 'JBSWY3DPEHPK3PXP',
+            'SCRIP_MASTER_PATH': self.scrip_master_path,
+            'SCRIP_INDEX_PATH': os.path.join(workdir, "OpenAPIScripMaster.idx"),
+            'SESSION_CACHE_PATH': os.path.join(workdir, "session.bin"),
+            'CANDLE_CACHE_DIR': os.path.join(workdir, "candles"),
+        })
+        self.config = ConfigManager()
+
+    def api(self, login: bool = False) -> AngelOneAPI:
+        api = AngelOneAPI(self.config, smart_connect=self.broker.connect)
+        if login and not api.login():
+            raise RuntimeError("Fake broker login failed.")
+        return api
+
+    def scale(self, full: int, quick: int) -> int:
+        return quick if self.quick else full
+
+
+def bench_scrip_master(ctx: BenchmarkContext) -> dict:
+    """AngelOneAPI.load_scrip_master: building the index from JSON (cold) and mapping it (warm)."""
+    cold, warm = Samples(), Samples()
+    for _ in range(ctx.scale(3, 1)):
+        if os.path.exists(ctx.config.scrip_index_path):
+            os.remove(ctx.config.scrip_index_path)
+        api = ctx.api()
+        cold.time(api.load_scrip_master)
+        api.scrip_data.close()
+    for _ in range(ctx.scale(50, 10)):
+        api = ctx.api()
+        warm.time(api.load_scrip_master)
+        api.scrip_data.close()
+    return {'load_scrip_master.cold': cold, 'load_scrip_master.warm': warm}
+
+
+def bench_token_lookup(ctx: BenchmarkContext) -> dict:
+    """AngelOneAPI.get_token_by_symbol on a mix of base symbols, -EQ symbols and misses."""
+    api = ctx.api()
+    api.load_scrip_master()
+    rng = random.Random(ctx.seed)
+    queries = []
+    for _ in range(ctx.scale(50_000, 5_000)):
+        draw = rng.random()
+        if draw < 0.8:
+            queries.append(rng.choice(ctx.symbols))
+        elif draw < 0.9:
+            queries.append(f"{rng.choice(ctx.symbols)}-EQ")
+        else:
+            queries.append(f"NOSUCH{rng.randrange(10 ** 6)}")
+    samples = Samples()
+    found = 0
+    started = time.perf_counter()
+    for symbol in queries:
+        found += samples.time(api.get_token_by_symbol, symbol) is not None
+    samples.wall_seconds = time.perf_counter() - started
+    samples.counters['found'] = found
+    api.scrip_data.close()
+    return {'get_token_by_symbol': samples}
+
+
+def bench_basket_quotes(ctx: BenchmarkContext) -> dict:
+    """StockBasketManager.get_market_data_for_basket through the fake broker's latency and limits."""
+    api = ctx.api(login=True)
+    api.load_scrip_master()
+    basket = StockBasketManager(api)
+    # Enough requests, even in a quick run, that they only fit the broker's limit if paced.
+    basket.load_basket_stocks(ctx.symbols[:200])
+    ctx.broker.reset_stats()
+    samples = Samples()
+    missing = 0
+    started = time.perf_counter()
+    for _ in range(ctx.scale(10, 5)):
+        quotes = samples.time(basket.get_market_data_for_basket, "FULL")
+        missing += len(basket.basket_stocks) - len(quotes)
+    samples.wall_seconds = time.perf_counter() - started
+    rate_limited = sum(ctx.broker.rate_limited.values())
+    samples.counters.update({
+        'instruments': len(basket.basket_stocks), 'missing_quotes': missing,
+        'limiter_waits': api._quote_limiter.wait_count,
+        'broker_rate_limited': rate_limited, 'broker_errors': sum(ctx.broker.errors.values()),
+    })
+    if rate_limited:
+        # The client-side limiter must keep every call within the broker's limit.
+        samples.fail(f"the broker refused {rate_limited} calls over its rate limit")
+    api.scrip_data.close()
+    return {'get_market_data_for_basket': samples}
+
+
+def _instruments(ctx, n):
+    return [{'symbol': f"{symbol}-EQ", 'token': str(1000 + i), 'exchange': 'NSE'}
+            for i, symbol in enumerate(ctx.symbols[:n])]
+
+
+def bench_tick_to_signal(ctx: BenchmarkContext) -> dict:
+    """
+    Feed packet -> MarketDataManager -> BarAggregator -> IndicatorEngine -> TrendStrategy,
+    in process. Every tick is timed; ticks that complete a bar (and so run the indicators
+    and the strategy) are also reported on their own as the tick-to-signal latency.
+    """
+    instruments = _instruments(ctx, 50)
+    market_data = MarketDataManager(None)
+    market_data.subscribe(instruments)
+    aggregator = BarAggregator(market_data, timeframes=(60,))
+    engine = IndicatorEngine(aggregator, 60)
+    strategy = TrendStrategy(engine)
+    closed = [False]
+    signals = []
+    aggregator.add_bar_listener(lambda timeframe, slot, bar: closed.__setitem__(0, True))
+    strategy.add_signal_listener(signals.append)
+
+    packets = []
+    for second in range(ctx.scale(3600, 600)):
+        for instrument in instruments:
+            price = ctx.broker.price('NSE', instrument['token'])
+            packets.append(encode_tick(int(instrument['token']), 1, SNAP_QUOTE, len(packets),
+                                       SESSION_START_MS + second * 1000, price, 10, second * 10,
+                                       price - 0.05, price + 0.05, 500, 500))
+
+    ticks, bar_closes = Samples(), Samples()
+    on_packet = market_data.on_packet
+    clock = time.perf_counter_ns
+    started = time.perf_counter()
+    for packet in packets:
+        closed[0] = False
+        before = clock()
+        on_packet(packet)
+        elapsed = clock() - before
+        ticks.add(elapsed)
+        if closed[0]:
+            bar_closes.add(elapsed)
+    ticks.wall_seconds = time.perf_counter() - started
+    bar_closes.counters['signals'] = len(signals)
+    return {'tick': ticks, 'tick_to_signal': bar_closes}
+
+
+def bench_order_round_trip(ctx: BenchmarkContext) -> dict:
+    """
+    Order round trip through the bot's order path: RiskManager.place_order ->
+    PaperTradingEngine -> fill -> Portfolio and risk updates. Market orders fill on
+    placement; limit orders rest until a crossing tick, whose processing is included.
+    """
+    instruments = _instruments(ctx, 20)
+    clock = SimulatedClock(SESSION_START_MS + 3600 * 1000)
+    market_data = MarketDataManager(None)
+    market_data.subscribe(instruments)
+    max_slots = market_data.store.max_slots
+    portfolio = Portfolio(1e9, max_slots, market_data=market_data)
+    gateway = PaperTradingEngine(market_data, clock)
+    gateway.add_fill_listener(portfolio.on_fill)
+    risk = RiskManager(portfolio, gateway, market_data, limits={'max_daily_loss': 1e12}, max_slots=max_slots)
+    filled_at = [0]
+    portfolio.add_fill_listener(lambda fill, position: filled_at.__setitem__(0, time.perf_counter_ns()))
+
+    def tick(instrument, bid, ask):
+        return encode_tick(int(instrument['token']), 1, SNAP_QUOTE, 0, clock.now_ms(), (bid + ask) / 2, 10, 0,
+                           bid, ask, 500, 500)
+
+    prices = {instrument['token']: ctx.broker.price('NSE', instrument['token']) for instrument in instruments}
+    for instrument in instruments:
+        price = prices[instrument['token']]
+        market_data.on_packet(tick(instrument, price - 0.05, price + 0.05))
+
+    market, limit = Samples(), Samples()
+    orders = ctx.scale(5000, 1000)
+    for i in range(orders):
+        instrument = instruments[i % len(instruments)]
+        side = Side.BUY if (i // len(instruments)) % 2 == 0 else Side.SELL
+        filled_at[0] = 0
+        before = time.perf_counter_ns()
+        risk.place_order(instrument, side, 1)
+        if filled_at[0]:
+            market.add(filled_at[0] - before)
+    for i in range(orders):
+        instrument = instruments[i % len(instruments)]
+        side = Side.BUY if (i // len(instruments)) % 2 == 0 else Side.SELL
+        price = prices[instrument['token']]
+        limit_price = price - 0.5 if side == Side.BUY else price + 0.5
+        crossing = tick(instrument, price - 1.05, price - 0.95) if side == Side.BUY else \
+            tick(instrument, price + 0.95, price + 1.05)
+        filled_at[0] = 0
+        before = time.perf_counter_ns()
+        risk.place_order(instrument, side, 1, OrderType.LIMIT, limit_price)
+        market_data.on_packet(crossing)
+        if filled_at[0]:
+            limit.add(filled_at[0] - before)
+        market_data.on_packet(tick(instrument, price - 0.05, price + 0.05))
+    market.counters['unfilled'] = orders - len(market.ns)
+    limit.counters['unfilled'] = orders - len(limit.ns)
+    market.counters['rejections'] = risk.rejections
+    return {'order_round_trip.market': market, 'order_round_trip.limit': limit}
+
+
+BENCHMARKS = {
+    'scrip_master': bench_scrip_master,
+    'token_lookup': bench_token_lookup,
+    'basket_quotes': bench_basket_quotes,
+    'tick_to_signal': bench_tick_to_signal,
+    'order_round_trip': bench_order_round_trip,
+}
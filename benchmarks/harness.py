@@ -0,0 +1,107 @@
+# benchmarks/harness.py
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+# Fields of a result that regress when they grow (latencies) or shrink (throughput).
+LATENCY_FIELDS = ('p50_us', 'p99_us')
+THROUGHPUT_FIELD = 'ops_per_sec'
+
+
+class Samples:
+    """Per-operation latencies (nanoseconds) and the wall time the operations took."""
+
+    def __init__(self):
+        self.ns = []
+        self.wall_seconds = 0.0
+        self.counters = {}
+        self.failures = []  # checks the run itself failed, whatever the timings
+
+    def fail(self, message: str):
+        """Marks the run as failed; the suite then exits with status 1 and saves no baseline."""
+        self.failures.append(message)
+
+    def add(self, ns: int):
+        self.ns.append(ns)
+
+    def time(self, function, *args):
+        started = time.perf_counter_ns()
+        result = function(*args)
+        self.ns.append(time.perf_counter_ns() - started)
+        return result
+
+    def summary(self) -> dict:
+        """{'n', 'p50_us', 'p99_us', 'max_us', 'mean_us', 'ops_per_sec'} plus any counters."""
+        ns = np.asarray(self.ns, dtype=np.float64)
+        if not len(ns):
+            return {'n': 0, **self.counters}
+        wall = self.wall_seconds or ns.sum() / 1e9
+        return {
+            'n': len(ns),
+            'p50_us': round(float(np.percentile(ns, 50)) / 1e3, 3),
+            'p99_us': round(float(np.percentile(ns, 99)) / 1e3, 3),
+            'max_us': round(float(ns.max()) / 1e3, 3),
+            'mean_us': round(float(ns.mean()) / 1e3, 3),
+            'ops_per_sec': round(len(ns) / wall, 1) if wall > 0 else None,
+            **self.counters,
+        }
+
+
+def environment() -> dict:
+    """Where the numbers were taken; baselines only compare well on the same machine."""
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'node': platform.node(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def save_baseline(path: str, results: dict, settings: dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'settings': settings, 'results': results}, f, indent=2)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, tail_tolerance: float) -> list:
+    """
+    Regressions of `results` against a saved baseline: p50 latency or throughput worse
+    by more than `tolerance` (a fraction), or p99 latency worse by more than
+    `tail_tolerance`. Benchmarks missing from either side are skipped.
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline['results'].get(name)
+        if not base or not result.get('n') or not base.get('n'):
+            continue
+        for field, allowed in (('p50_us', tolerance), ('p99_us', tail_tolerance)):
+            if base.get(field) and result[field] > base[field] * (1.0 + allowed):
+                regressions.append(f"{name}: {field} {result[field]:.1f} vs baseline {base[field]:.1f} "
+                                   f"(+{result[field] / base[field] - 1.0:.0%}, allowed +{allowed:.0%})")
+        current, previous = result.get(THROUGHPUT_FIELD), base.get(THROUGHPUT_FIELD)
+        if previous and current is not None and current < previous / (1.0 + tolerance):
+            regressions.append(f"{name}: {THROUGHPUT_FIELD} {current:.1f} vs baseline {previous:.1f} "
+                               f"({current / previous - 1.0:.0%})")
+    return regressions
+
+
+def format_table(results: dict) -> str:
+    lines = [f"{'benchmark':<34}{'n':>9}{'p50 us':>12}{'p99 us':>12}{'ops/s':>14}"]
+    for name, result in results.items():
+        if not result.get('n'):
+            lines.append(f"{name:<34}{0:>9}")
+            continue
+        lines.append(f"{name:<34}{result['n']:>9}{result['p50_us']:>12.1f}{result['p99_us']:>12.1f}"
+                     f"{result['ops_per_sec']:>14,.0f}")
+        extra = {k: v for k, v in result.items() if k not in ('n', 'p50_us', 'p99_us', 'max_us', 'mean_us',
+                                                              'ops_per_sec')}
+        if extra:
+            lines.append(f"{'':<4}" + ", ".join(f"{k}={v}" for k, v in extra.items()))
+    return "\n".join(lines)
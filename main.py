@@ -1,15 +1,20 @@
 # main.py
 import os
+import asyncio
 import logging
 from src.config import ConfigManager
 from src.api import AngelOneAPI
-from src import stock_basket
+from src.logger import parse_levels, setup_logging, shutdown_logging
+from src.metrics import setup_metrics, shutdown_metrics
+from src.scheduler import TradingRuntime
 
 
 def main():
     print("Starting bot setup...")
     try:
         config = ConfigManager()
+        setup_logging(config.log_dir, config.log_level, parse_levels(config.log_levels))
+        setup_metrics(config.metrics_enabled, config.metrics_port, config.metrics_dump_seconds, config.log_dir)
         print("Config loaded successfully!")
         print(f"API Key (from Dashboard): {config.api_key}")
         print(f"Angel One Login Username: {config.username}") # New print to confirm
@@ -25,24 +30,11 @@ def main():
         # print("--- END .env VERIFICATION ---\n")
         # --- END VERY IMPORTANT DEBUG PRINTS ---
 
-        # --- Initialize and Test AngelOneAPI ---
+        # --- Initialize AngelOneAPI ---
+        # Login, scrip master and basket loading now happen inside the runtime,
+        # with every blocking API call running in its thread pool.
         angel_api = AngelOneAPI(config)
 
-        if angel_api.login(): # Call without any arguments
-            print("Angel One API Login successful!")
-            # Here you would typically proceed with other bot operations
-            # Load scrip master data - essential for stock basket operations
-            print("Loading scrip master data...")
-            if not angel_api.load_scrip_master():
-                logging.error("Failed to load scrip master. Exiting application.")
-                angel_api.logout()
-                return
-        else:
-            print("Angel One API Login failed. Check logs for details.")
-
-        # Example of checking login status
-        print(f"Is API logged in? {angel_api.is_logged_in()}")
-
          # Define your basket symbols
         my_basket_symbols = [
             "BSE","RPOWER","BAJAJHIND","TRIDENT","CANBK","MAHABANK",
@@ -54,28 +46,19 @@ def main():
         # Check if any stocks were actually loaded.
         if not my_basket_symbols: # Check if the list is empty
             logging.warning("No basket symbols defined in main.py. Please add stocks to 'my_basket_symbols'.")
-            # If no symbols are defined, you might want to log out and exit, or proceed depending on your bot's design
-            angel_api.logout()
-            print(f"Is API logged in after logout? {angel_api.is_logged_in()}")
-            return
-
-        # Initialize StockBasketManager
-        basket_manager = stock_basket.StockBasketManager(angel_api)
-
-        # Load stocks into the basket using the manager instance
-        print(f"Attempting to load {len(my_basket_symbols)} symbols into the basket...")
-        if not basket_manager.load_basket_stocks(my_basket_symbols):
-            logging.error("No basket stocks were successfully loaded. Exiting application.")
-            angel_api.logout()
-            print(f"Is API logged in after logout? {angel_api.is_logged_in()}")
             return
-        
-        logging.info(f"Successfully loaded {len(basket_manager.get_basket_details())} stocks into the basket: {basket_manager.get_basket_symbols()}")
 
-        # --- Your main bot logic would go here ---
-        # For example, fetching market data, placing orders, etc.
-        # Remember the instruction: stop trading when the market moves sideways.
-        # You'll implement this logic here using market data from your API.
+        # --- Run the bot ---
+        # The runtime streams ticks for the basket, builds bars, evaluates the strategy
+        # (which stops trading when the market moves sideways) and routes orders through
+        # the risk checks, following the market-session schedule until interrupted.
+        runtime = TradingRuntime(config, angel_api, my_basket_symbols)
+        print(f"Starting trading runtime for {len(my_basket_symbols)} symbols (Ctrl+C to stop)...")
+        try:
+            if not asyncio.run(runtime.run()):
+                print("Runtime failed to start. Check logs for details.")
+        except KeyboardInterrupt:
+            print("Stopping...")
 
     except ValueError as e:
         print(f"Configuration error: {e}")
@@ -86,9 +69,11 @@ def main():
     finally:
         # Log out when done (or in case of error, to ensure cleanup)
         if 'angel_api' in locals() and angel_api.is_logged_in():
-            angel_api.logout()
+            angel_api.logout(terminate=not config.keep_session_on_exit)
             logging.info("Angel One API Logout successful.")
             print(f"Is API logged in after logout? {angel_api.is_logged_in()}")
+        shutdown_metrics()
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,73 +5,154 @@ import datetime
 import logging
 import os 
 import json
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import METRICS, timed
+from src.rate_limiter import SlidingWindowLimiter
+from src.scrip_index import ScripMasterIndex
+from src.session_cache import SessionCache, jwt_expiry
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_jwt(token: str) -> str:
+    """The bare JWT from an Authorization-style "Bearer <jwt>" value."""
+    return token[len("Bearer "):] if token and token.startswith("Bearer ") else token
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("api_debug.log"),
-                        logging.StreamHandler()
-                    ])
 
 class AngelOneAPI:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, smart_connect=SmartConnect):
+        """
+        Args:
+            config_manager (ConfigManager): Credentials, paths and request limits.
+            smart_connect: SmartConnect or a stand-in with its constructor (e.g. FakeBroker.connect).
+        """
         self.config = config_manager
+        self._smart_connect = smart_connect
         self.smartapi = None
         self.jwt_token = None
         self.refresh_token = None
         self.feed_token = None
         self.session_expiry_time = None
-        self.scrip_data = None # Initialize scrip_data
-        self._scrip_data_by_token = None # Initialize _scrip_data_by_token
+        self.scrip_data = None # ScripMasterIndex, set by load_scrip_master()
+        # Shared across all quote requests so concurrent batches respect the broker's per-second limit.
+        # A sliding window, not a token bucket: a full bucket would let a cold start send up to
+        # twice the limit within the first second, and the broker refuses the excess.
+        self._quote_limiter = SlidingWindowLimiter(self.config.quote_rate_limit)
+        self._historical_limiter = SlidingWindowLimiter(self.config.historical_rate_limit)
+        METRICS.register_limiter('get_market_data_batch', self._quote_limiter)
+        METRICS.register_limiter('get_candle_data', self._historical_limiter)
+        self._session_cache = SessionCache(self.config.session_cache_path,
+                                           self.config.session_cache_key or f"{self.config.totp_secret}:{self.config.pin}",
+                                           self.config.username)
 
-    def login(self): 
+    @timed()
+    def login(self):
         """
-        Logs into the Angel One SmartAPI and obtains session tokens.
+        Establishes a SmartAPI session, cheapest way first: reuse the cached session if
+        the broker still accepts it, renew it with its refresh token, and only then run
+        the full TOTP login.
+        Returns:
+            bool: True if a usable session was obtained.
         """
         try:
-            # 1. Initialize SmartConnect with the API Key from the dashboard
-            self.smartapi = SmartConnect(api_key=self.config.api_key,)
-            logging.info("SmartConnect instance created with API Key.")
-
-            # 2. Generate TOTP
-            totp = pyotp.TOTP(self.config.totp_secret).now()
-            logging.info(f"TOTP generated: {totp}")
-
-            # 3. Perform login using Angel One trading account username, password, and TOTP
-            data = self.smartapi.generateSession(self.config.username, self.config.pin, totp)
-            logging.info(f"Angel One login response: {data}")
-
-            if data and data.get("status"):
-                self.jwt_token = data['data']['jwtToken']
-                self.refresh_token = data['data']['refreshToken']
-                self.feed_token = data['data']['feedToken']
-                # Token usually valid for a day, adjust if SmartAPI docs say otherwise
-                self.session_expiry_time = datetime.datetime.now() + datetime.timedelta(hours=24) 
-
-                logging.info("Login successful! Tokens obtained.")
-                logging.info(f"JWT Token: {self.jwt_token[:10]}...")
-                logging.info(f"Feed Token: {self.feed_token}")
+            session = self._session_cache.load()
+            if session and (self._resume_session(session) or self._renew_session(session['refresh_token'])):
                 return True
-            else:
-                error_message = data.get("message", "Unknown login error")
-                logging.error(f"Login failed: {error_message}")
-                logging.error(f"Full response: {data}")
-                return False
+            return self._login_with_totp()
+        except Exception as e:
+            logger.error("An error occurred during Angel One login: %s", e)
+            return False
 
+    @timed()
+    def refresh_session(self):
+        """
+        Renews the current session before it expires, with the refresh token if the broker
+        issues a later expiry for it, otherwise with a full login.
+        Returns:
+            bool: True if a usable session was obtained.
+        """
+        previous_expiry = self.session_expiry_time
+        try:
+            if self.refresh_token and self._renew_session(self.refresh_token) \
+                    and (previous_expiry is None or self.session_expiry_time > previous_expiry):
+                return True
+            return self._login_with_totp()
         except Exception as e:
-            logging.error(f"An error occurred during Angel One login: {e}")
+            logger.error("An error occurred while refreshing the Angel One session: %s", e)
+            return False
+
+    def _resume_session(self, session):
+        """Reuses cached tokens if the broker still accepts them (one getProfile call)."""
+        self.smartapi = self._smart_connect(api_key=self.config.api_key, access_token=_raw_jwt(session['jwt_token']),
+                                            refresh_token=session['refresh_token'],
+                                            feed_token=session['feed_token'])
+        profile = self.smartapi.getProfile(session['refresh_token'])
+        if not (profile and profile.get("status")):
+            logger.info("Cached session was rejected by the broker.")
+            return False
+        self._set_session(session['jwt_token'], session['refresh_token'], session['feed_token'], save=False)
+        logger.info("Reusing cached session, valid until %s.", self.session_expiry_time)
+        return True
+
+    def _renew_session(self, refresh_token):
+        """Obtains new jwt and feed tokens with the refresh token (no TOTP)."""
+        if self.smartapi is None:
+            self.smartapi = self._smart_connect(api_key=self.config.api_key)
+        response = self.smartapi.generateToken(refresh_token)
+        if not (response and response.get("status")):
+            message = response.get("message", "Unknown error") if response else "Empty response"
+            logger.info("Session renewal with refresh token failed: %s", message)
             return False
+        data = response['data']
+        self._set_session(data['jwtToken'], data.get('refreshToken') or refresh_token, data['feedToken'])
+        logger.info("Session renewed with refresh token, valid until %s.", self.session_expiry_time)
+        return True
+
+    def _login_with_totp(self):
+        # 1. Initialize SmartConnect with the API Key from the dashboard
+        self.smartapi = self._smart_connect(api_key=self.config.api_key,)
+        logger.debug("SmartConnect instance created with API Key.")
+
+        # 2. Generate TOTP (never logged: it is a live credential)
+        totp = pyotp.TOTP(self.config.totp_secret).now()
+
+        # 3. Perform login using Angel One trading account username, password, and TOTP
+        data = self.smartapi.generateSession(self.config.username, self.config.pin, totp)
 
-    def logout(self):
+        if data and data.get("status"):
+            self._set_session(data['data']['jwtToken'], data['data']['refreshToken'], data['data']['feedToken'])
+            logger.info("Login successful! Tokens obtained, valid until %s.", self.session_expiry_time)
+            return True
+        else:
+            error_message = data.get("message", "Unknown login error") if data else "Empty response"
+            error_code = data.get("errorcode", "N/A") if data else "N/A"
+            logger.error("Login failed: %s (Error Code: %s)", error_message, error_code)
+            return False
+
+    def _set_session(self, jwt_token, refresh_token, feed_token, save=True):
+        self.jwt_token = jwt_token if jwt_token.startswith("Bearer ") else f"Bearer {jwt_token}"
+        self.refresh_token = refresh_token
+        self.feed_token = feed_token
+        # The JWT carries its real expiry; fall back to a day if it does not.
+        self.session_expiry_time = jwt_expiry(_raw_jwt(jwt_token)) or \
+            datetime.datetime.now() + datetime.timedelta(hours=24)
+        if save:
+            self._session_cache.save(self.jwt_token, refresh_token, feed_token, self.session_expiry_time)
+
+    def logout(self, terminate: bool = True):
         """
         Logs out from the Angel One SmartAPI session.
+        Args:
+            terminate (bool): End the session at the broker and forget the cached tokens.
+                False only drops the local state, so the next start can reuse the session.
         """
-        if self.smartapi:
+        if self.smartapi and terminate:
             try:
                 self.smartapi.terminateSession(self.config.username) # Use username for termination
-                logging.info("Logged out from Angel One SmartAPI.")
+                logger.info("Logged out from Angel One SmartAPI.")
             except Exception as e:
-                logging.error(f"Error during Angel One logout: {e}")
+                logger.error("Error during Angel One logout: %s", e)
+            self._session_cache.clear()
         self.jwt_token = None
         self.refresh_token = None
         self.feed_token = None
@@ -83,67 +164,48 @@ class AngelOneAPI:
         if not self.jwt_token or not self.feed_token or not self.smartapi:
             return False
         if self.session_expiry_time and datetime.datetime.now() > self.session_expiry_time:
-            logging.warning("Angel One session token expired. Re-login required.")
+            logger.warning("Angel One session token expired. Re-login required.")
             return False
         return True
     
+    @timed()
     def load_scrip_master(self):
         """
-        Loads the scrip master JSON file from the path specified in ConfigManager
-        and stores it in self.scrip_data for quick lookup. This file is large,
-        so it should be loaded once.
+        Loads the scrip master from the path specified in ConfigManager via the
+        memory-mapped ScripMasterIndex and stores it in self.scrip_data for quick lookup.
+        The JSON file is only parsed when the on-disk index is missing or the source
+        file has changed since the index was built.
         Returns:
             bool: True if scrip master is loaded successfully, False otherwise.
         """
         if self.scrip_data: # Check if data is already loaded
-            logging.info("Scrip master already loaded.")
+            logger.info("Scrip master already loaded.")
             return True
 
         scrip_path = self.config.scrip_master_path
+        index_path = self.config.scrip_index_path
         try:
             if not os.path.exists(scrip_path):
-                logging.error(f"Scrip master file not found at {scrip_path}. Please download it from: https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json")
+                logger.error("Scrip master file not found at %s. Please download it from: "
+                             "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json",
+                             scrip_path)
                 return False
 
-            logging.info(f"Loading scrip master from {scrip_path}...")
-            with open(scrip_path, 'r') as f:
-                raw_data = json.load(f)
-
-            # Optimizing lookup: Store as {symbol: {token, exch_seg, name}}
-            # We are assuming 'symbol' in the JSON is sufficient for lookup.
-            # If Angel One uses 'SYMBOL-EQ' for equities in the master,
-            # you might need to adjust your basket symbols accordingly.
-            self.scrip_data = {
-                entry.get('symbol'): { # Use .get() for safety
-                    'token': entry.get('token'),
-                    'exch_seg': entry.get('exch_seg'),
-                    'name': entry.get('name')
-                }
-                for entry in raw_data
-                if all(k in entry for k in ['symbol', 'token', 'exch_seg', 'name']) # Ensure all keys exist
-            }
-            # Also add an alternative lookup by token if needed later
-            self._scrip_data_by_token = {
-                entry.get('token'): {
-                    'symbol': entry.get('symbol'),
-                    'exch_seg': entry.get('exch_seg'),
-                    'name': entry.get('name')
-                }
-                for entry in raw_data
-                if all(k in entry for k in ['symbol', 'token', 'exch_seg', 'name'])
-            }
-            logging.info(f"Scrip master loaded with {len(self.scrip_data)} entries.")
+            logger.info("Loading scrip master from %s (index: %s)...", scrip_path, index_path)
+            self.scrip_data = ScripMasterIndex.load(scrip_path, index_path)
+            logger.info("Scrip master loaded with %d entries.", len(self.scrip_data))
             return True
         except FileNotFoundError:
-            logging.error(f"Scrip master file not found at {scrip_path}. Please verify path and file existence.")
+            logger.error("Scrip master file not found at %s. Please verify path and file existence.", scrip_path)
             return False
         except json.JSONDecodeError as e:
-            logging.error(f"Error decoding scrip master JSON from {scrip_path}: {e}", exc_info=True)
+            logger.error("Error decoding scrip master JSON from %s: %s", scrip_path, e, exc_info=True)
             return False
         except Exception as e:
-            logging.error(f"An unexpected error occurred loading scrip master from {scrip_path}: {e}", exc_info=True)
+            logger.error("An unexpected error occurred loading scrip master from %s: %s", scrip_path, e, exc_info=True)
             return False
 
+    @timed()
     def get_token_by_symbol(self, symbol: str, exchange_segment: str = 'NSE'):
         """
         Looks up the token and exchange segment for a given stock symbol.
@@ -155,41 +217,36 @@ class AngelOneAPI:
             dict: A dictionary {'token': '...', 'exchange': '...'} if found, None otherwise.
         """
         if not self.scrip_data:
-            logging.error("Scrip master data not loaded. Call load_scrip_master() first.")
+            logger.error("Scrip master data not loaded. Call load_scrip_master() first.")
             return None
 
-        # Angel One scrip master might use 'SYMBOL-EQ' for equity.
-        # It's safest to iterate and find the best match.
-        # Or, if you know the exact symbol as it appears in the JSON, use direct lookup.
-        
-        # Let's refine the search for robustness:
-        # We'll prioritize exact match, then symbol + -EQ match.
-        
+        # Angel One scrip master uses 'SYMBOL-EQ' for equity.
+        # We prioritize exact match, then symbol + -EQ match, then any other
+        # series of the same symbol (e.g. 'SYMBOL-BE') via the sorted prefix index.
         target_symbol_exact = symbol.upper()
         target_symbol_eq = f"{symbol.upper()}-EQ"
 
-        found_info = None
-
-        # Check for exact match in the symbol field and correct exchange segment
-        if target_symbol_exact in self.scrip_data:
-            data = self.scrip_data[target_symbol_exact]
-            if data['exch_seg'] == exchange_segment:
-                found_info = data
-        
-        # If not found, check for SYMBOL-EQ format
-        if not found_info and target_symbol_eq in self.scrip_data:
-            data = self.scrip_data[target_symbol_eq]
-            if data['exch_seg'] == exchange_segment:
-                found_info = data
-        
-        if found_info:
-            logging.info(f"Found token {found_info['token']} for {symbol} on {exchange_segment}.")
+        row = self.scrip_data.find_row(target_symbol_exact, exchange_segment)
+        if row is None:
+            row = self.scrip_data.find_row(target_symbol_eq, exchange_segment)
+        if row is None:
+            series = self.scrip_data.find_rows_by_prefix(f"{target_symbol_exact}-", exchange_segment, limit=1)
+            if series:
+                row = series[0]
+                logger.warning("'%s' has no -EQ series on %s; using %s.", symbol, exchange_segment,
+                               self.scrip_data.row(row)['symbol'])
+
+        if row is not None:
+            found_info = self.scrip_data.row(row)
+            logger.debug("Found token %s for %s on %s.", found_info['token'], symbol, exchange_segment)
             return {'token': found_info['token'], 'exchange': found_info['exch_seg']}
         else:
-            logging.warning(f"Symbol '{symbol}' not found in '{exchange_segment}' segment (checked exact and -EQ forms).")
+            logger.warning("Symbol '%s' not found in '%s' segment (checked exact, -EQ and other series).",
+                           symbol, exchange_segment)
             return None
 
 
+    @timed()
     def get_market_data(self, exchange: str, symbol_token: str, mode: str = "FULL"):
         """
         Fetches market data for a given symbol token.
@@ -200,30 +257,107 @@ class AngelOneAPI:
         Returns:
             dict: A dictionary containing market data if successful, None otherwise.
         """
+        quotes = self.get_market_data_batch({exchange: [symbol_token]}, mode=mode)
+        return quotes.get((exchange, str(symbol_token)))
+
+    @timed()
+    def get_market_data_batch(self, exchange_tokens: dict, mode: str = "FULL") -> dict:
+        """
+        Fetches market data for many tokens using as few requests as possible.
+        Tokens are grouped per exchange into chunks of at most config.quote_batch_size,
+        and the chunks are sent concurrently behind the shared quote rate limiter.
+        Args:
+            exchange_tokens (dict): {exchange: [token, ...]}, e.g. {"NSE": ["3045", "1594"]}.
+            mode (str): The data mode ("LTP", "OHLC", or "FULL"). Defaults to "FULL".
+        Returns:
+            dict: {(exchange, token): market data dict} for every token that was fetched.
+                  Tokens the broker could not fetch are simply absent.
+        """
         if not self.is_logged_in():
-            logging.error("Not logged in to Angel One. Cannot fetch market data.")
-            return None
+            logger.error("Not logged in to Angel One. Cannot fetch market data.")
+            return {}
+
+        batch_size = self.config.quote_batch_size
+        chunks = []
+        for exchange, tokens in exchange_tokens.items():
+            tokens = [str(token) for token in tokens]
+            for i in range(0, len(tokens), batch_size):
+                chunks.append((exchange, tokens[i:i + batch_size]))
+        if not chunks:
+            return {}
+
+        results = {}
+        if len(chunks) == 1:
+            results.update(self._fetch_quote_chunk(mode, *chunks[0]))
+            return results
+
+        workers = min(self.config.quote_max_workers, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quotes") as pool:
+            for chunk_result in pool.map(lambda chunk: self._fetch_quote_chunk(mode, *chunk), chunks):
+                results.update(chunk_result)
+        return results
 
+    def _fetch_quote_chunk(self, mode: str, exchange: str, tokens: list) -> dict:
+        """Issues one getMarketData request for a single exchange chunk."""
+        self._quote_limiter.acquire()
         try:
-            payload = {
-                "mode": mode,
-                "exchangeType": exchange,
-                "scripToken": symbol_token
-            }
-            logging.info(f"Requesting {mode} market data for {exchange}:{symbol_token}")
-            response = self.smartapi.getMarketData(payload)
+            logger.debug("Requesting %s market data for %d tokens on %s", mode, len(tokens), exchange)
+            response = self.smartapi.getMarketData(mode, {exchange: tokens})
 
             if response and response.get('status'):
-                logging.info(f"Successfully fetched {mode} data for {exchange}:{symbol_token}.")
-                return response['data']
+                data = response.get('data') or {}
+                unfetched = data.get('unfetched') or []
+                if unfetched:
+                    logger.warning("Broker could not fetch %s data for %d tokens on %s: %s",
+                                   mode, len(unfetched), exchange, unfetched)
+                return {(entry.get('exchange', exchange), str(entry.get('symbolToken'))): entry
+                        for entry in data.get('fetched') or []}
             else:
-                message = response.get('message', 'Unknown market data error')
-                error_code = response.get('errorcode', 'N/A')
-                logging.error(f"Failed to fetch {mode} market data for {exchange}:{symbol_token}: {message} (Error Code: {error_code})")
-                # Log full response if it contains useful error details
-                if response:
-                    logging.error(f"Full market data response for debug: {response}")
-                return None
+                message = response.get('message', 'Unknown market data error') if response else 'Empty response'
+                error_code = response.get('errorcode', 'N/A') if response else 'N/A'
+                logger.error("Failed to fetch %s market data for %s:%s: %s (Error Code: %s)",
+                             mode, exchange, tokens, message, error_code)
+                return {}
+        except Exception as e:
+            logger.error("Error fetching %s market data for %s:%s: %s", mode, exchange, tokens, e, exc_info=True)
+            return {}
+
+    @timed()
+    def get_candle_data(self, exchange: str, symbol_token: str, interval: str,
+                        from_date: datetime.datetime, to_date: datetime.datetime):
+        """
+        Fetches historical candles for one instrument. Calls are paced by the shared
+        historical-data rate limiter, so this is safe to call from several threads.
+        Args:
+            exchange (str): The exchange (e.g., "NSE").
+            symbol_token (str): The unique scrip token for the instrument.
+            interval (str): SmartAPI interval name (e.g., "ONE_MINUTE", "FIVE_MINUTE", "ONE_DAY").
+            from_date (datetime.datetime): Start of the range (inclusive).
+            to_date (datetime.datetime): End of the range (inclusive).
+        Returns:
+            list: Candles as [timestamp, open, high, low, close, volume] lists if successful, None otherwise.
+        """
+        if not self.is_logged_in():
+            logger.error("Not logged in to Angel One. Cannot fetch candle data.")
+            return None
+
+        params = {
+            "exchange": exchange,
+            "symboltoken": str(symbol_token),
+            "interval": interval,
+            "fromdate": from_date.strftime("%Y-%m-%d %H:%M"),
+            "todate": to_date.strftime("%Y-%m-%d %H:%M"),
+        }
+        self._historical_limiter.acquire()
+        try:
+            response = self.smartapi.getCandleData(params)
+            if response and response.get('status'):
+                return response.get('data') or []
+            message = response.get('message', 'Unknown candle data error') if response else 'Empty response'
+            error_code = response.get('errorcode', 'N/A') if response else 'N/A'
+            logger.error("Failed to fetch %s candles for %s:%s: %s (Error Code: %s)",
+                         interval, exchange, symbol_token, message, error_code)
+            return None
         except Exception as e:
-            logging.error(f"Error fetching {mode} market data for {exchange}:{symbol_token}: {e}", exc_info=True)
+            logger.error("Error fetching %s candles for %s:%s: %s", interval, exchange, symbol_token, e, exc_info=True)
             return None
@@ -0,0 +1,247 @@
+# src/backtester.py
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.bar_aggregator import B_CLOSE, B_OPEN, B_START, BarAggregator, DAY_MS, IST_OFFSET_MS
+from src.clock import SimulatedClock
+from src.costs import FixedBpsSlippage, IntradayEquityCharges
+from src.database_manager import INTERVALS, CandleStore
+from src.market_data_manager import EXCHANGE_TYPES, LTP_MODE, MarketDataManager, encode_tick, packet_timestamp
+from src.models.trade import TradeBlotter
+from src.orders import PaperTradingEngine
+from src.portfolio import Portfolio
+from src.risk_manager import RiskManager
+from src.strategy import IndicatorEngine, TrendStrategy
+
+logger = logging.getLogger(__name__)
+
+
+class BacktestResult:
+    """Trades, daily equity and summary statistics of one backtest run."""
+
+    def __init__(self, backtester, daily_equity: list, bars: int, ticks: int, elapsed: float,
+                 params: dict = None, symbols: list = None):
+        portfolio = backtester.portfolio
+        self.trades = backtester.trades
+        self.refused = backtester.risk.rejections
+        self.round_trips = portfolio.round_trips
+        self.daily_equity = daily_equity
+        self.starting_cash = backtester.starting_cash
+        self.final_equity = portfolio.equity()
+        self.fees = portfolio.fees
+        self.bars = bars
+        self.ticks = ticks
+        self.elapsed = elapsed
+        self.params = params or {}
+        self.symbols = symbols or []
+
+    def max_drawdown(self) -> float:
+        peak = self.starting_cash
+        worst = 0.0
+        for _, equity in self.daily_equity:
+            peak = max(peak, equity)
+            worst = min(worst, equity - peak)
+        return worst
+
+    def summary(self) -> dict:
+        wins = sum(1 for pnl in self.round_trips if pnl > 0)
+        return {
+            'symbols': self.symbols,
+            'params': self.params,
+            'net_pnl': round(self.final_equity - self.starting_cash, 2),
+            'fees': round(self.fees, 2),
+            'orders': len(self.trades),
+            'refused': self.refused,
+            'round_trips': len(self.round_trips),
+            'win_rate': round(wins / len(self.round_trips), 4) if self.round_trips else 0.0,
+            'max_drawdown': round(self.max_drawdown(), 2),
+            'bars': self.bars,
+            'ticks': self.ticks,
+            'elapsed_seconds': round(self.elapsed, 3),
+        }
+
+
+class Backtester:
+    """
+    Replays stored candles or recorded ticks through the live pipeline: feed packets
+    go through MarketDataManager (-> BarAggregator) -> IndicatorEngine -> TrendStrategy,
+    and signals through the same RiskManager -> PaperTradingEngine -> Portfolio path
+    as the runtime, with wall-clock time replaced by a SimulatedClock. Runs are
+    deterministic for the same inputs.
+    """
+
+    def __init__(self, instruments: list, timeframe: int = 60, params: dict = None, starting_cash: float = 60000.0,
+                 capital_per_trade: float = 10000.0, allow_short: bool = True, slippage=None, brokerage=None,
+                 risk_limits: dict = None):
+        """
+        Args:
+            instruments (list): {'symbol', 'token', 'exchange'} dicts; list position is the slot.
+            timeframe (int): Bar timeframe (seconds) the strategy runs on.
+            params (dict): Indicator/regime overrides (see DEFAULT_INDICATOR_PARAMS).
+            starting_cash (float): Simulated funds.
+            capital_per_trade (float): Notional per entry used by TrendStrategy.
+            allow_short (bool): Whether the strategy may go short.
+            slippage (callable): Slippage model from src.costs for market fills; defaults to 2 bps.
+            brokerage (callable): Charges model from src.costs; defaults to intraday equity charges.
+            risk_limits (dict): Overrides for DEFAULT_RISK_LIMITS; orders always pass the RiskManager, as live.
+        """
+        self.instruments = list(instruments)
+        self.timeframe = timeframe
+        self.params = params or {}
+        self.starting_cash = starting_cash
+        self.capital_per_trade = capital_per_trade
+        self.allow_short = allow_short
+        self.slippage = slippage
+        self.brokerage = brokerage
+        self.risk_limits = risk_limits
+
+    def _build(self, ticks: bool = False):
+        n = len(self.instruments)
+        self.clock = SimulatedClock()
+        self.market_data = MarketDataManager(feed=None, max_tokens=n, capacity=64)
+        self.market_data.subscribe(self.instruments)
+        # Tick listeners run in registration order, as in the runtime: marks, matching, loss check, bars.
+        self.portfolio = Portfolio(self.starting_cash, max_slots=n, market_data=self.market_data)
+        self.gateway = PaperTradingEngine(self.market_data, self.clock, self.brokerage or IntradayEquityCharges(),
+                                          slippage=self.slippage or FixedBpsSlippage())
+        self.gateway.add_fill_listener(self.portfolio.on_fill)
+        self.trades = TradeBlotter()
+        self.gateway.add_fill_listener(self.trades.add_fill)
+        self.risk = RiskManager(self.portfolio, self.gateway, self.market_data, self.risk_limits, max_slots=n)
+        aggregator = BarAggregator(self.market_data, timeframes=(self.timeframe,), history=64) if ticks else None
+        self.aggregator = aggregator
+        self.engine = IndicatorEngine(aggregator, self.timeframe, self.params, max_slots=n)
+        self.strategy = TrendStrategy(self.engine, self.capital_per_trade, self.allow_short)
+        self.strategy.add_signal_listener(self.risk.submit_target)
+        self._daily_equity = []
+        self._day = None
+
+    def _replay(self, timestamp_ms: int, packet):
+        """Moves the clock to the packet's time (closing the session on a new day) and feeds it in."""
+        if timestamp_ms > self.clock.now_ms():
+            day = (timestamp_ms + IST_OFFSET_MS) // DAY_MS
+            if self._day is not None and day != self._day:
+                self._close_session()
+            self._day = day
+            self.clock.set(timestamp_ms)
+        self.market_data.on_packet(packet)
+
+    def _close_session(self):
+        """Flattens anything still open through the gateway and records end-of-day equity."""
+        if self.portfolio.open_positions:
+            logger.debug("Backtest: forced square-off of %d positions at session end.", self.portfolio.open_positions)
+        self.gateway.square_off()  # also cancels whatever is still working
+        for slot in range(len(self.instruments)):
+            self.strategy.reset(slot)
+        self._daily_equity.append((self._day, self.portfolio.equity()))
+        self.risk.start_session()
+
+    def _result(self, bars: int, ticks: int, started: float) -> BacktestResult:
+        if self._day is not None:
+            self._close_session()
+        return BacktestResult(self, self._daily_equity, bars, ticks, time.perf_counter() - started,
+                              self.params, [inst['symbol'] for inst in self.instruments])
+
+    def run_bars(self, bars_by_slot: list) -> BacktestResult:
+        """
+        Replays completed bars. bars_by_slot[i] is a (BAR_FIELDS, n) array for instrument i
+        (e.g. CandleStore.read_bars). Bars from all instruments are merged in time order.
+        Each bar is fed in as two LTP ticks, its open at the bar start and its close just
+        before the bar ends, and then handed to the strategy; orders fill against the
+        close tick, as they would against the live feed when the bar completes.
+        """
+        started = time.perf_counter()
+        self._build()
+        blocks = [np.asarray(bars, dtype=np.float64) for bars in bars_by_slot]
+        slots = np.concatenate([np.full(block.shape[1], i) for i, block in enumerate(blocks)]) \
+            if blocks else np.empty(0, dtype=np.int64)
+        merged = np.concatenate(blocks, axis=1) if blocks else np.empty((6, 0))
+        order = np.lexsort((slots, merged[B_START]))
+        rows = merged[:, order].T.tolist()
+        slot_list = slots[order].tolist()
+        bar_ms = self.timeframe * 1000
+        tokens = [inst['token'] for inst in self.instruments]
+        exchange_types = [EXCHANGE_TYPES[inst['exchange']] for inst in self.instruments]
+
+        on_bar = self.engine.on_bar
+        replay = self._replay
+        timeframe = self.timeframe
+        for slot, bar in zip(slot_list, rows):
+            start = int(bar[B_START])
+            token, exchange_type = tokens[slot], exchange_types[slot]
+            replay(start, encode_tick(token, exchange_type, LTP_MODE, 0, start, bar[B_OPEN]))
+            end = start + bar_ms - 1
+            replay(end, encode_tick(token, exchange_type, LTP_MODE, 0, end, bar[B_CLOSE]))
+            on_bar(timeframe, slot, bar)
+        return self._result(len(rows), 0, started)
+
+    def run_candles(self, store: CandleStore, interval: str, start, end) -> BacktestResult:
+        """Replays candles from the local cache (fetching missing ranges if the store has an API)."""
+        if INTERVALS[interval][0] != self.timeframe:
+            raise ValueError(f"Interval {interval} does not match the backtest timeframe of {self.timeframe}s.")
+        if store.angel_api is not None:
+            store.ensure(self.instruments, interval, start, end)
+        bars = [store.read_bars(inst['exchange'], inst['token'], interval, start, end) for inst in self.instruments]
+        return self.run_bars(bars)
+
+    def run_ticks(self, packets) -> BacktestResult:
+        """
+        Replays recorded binary feed packets through MarketDataManager and BarAggregator.
+        Orders fill against the following ticks for the instrument (ask for buys, bid for
+        sells, limited to the quoted depth).
+        """
+        started = time.perf_counter()
+        self._build(ticks=True)
+        replay = self._replay
+        for packet in packets:
+            replay(packet_timestamp(packet), packet)
+        self.aggregator.flush()
+        return self._result(0, self.market_data.ticks_received, started)
+
+
+# --- Parallel runs ------------------------------------------------------------------------
+
+def _run_job(job: dict) -> dict:
+    """Runs one backtest described by plain, picklable data (see run_parallel)."""
+    store = CandleStore(root=job['cache_root'])
+    backtester = Backtester(job['instruments'], timeframe=INTERVALS[job['interval']][0], **job.get('options', {}))
+    return backtester.run_candles(store, job['interval'], job['start'], job['end']).summary()
+
+
+def parameter_sweep(instruments: list, grid: dict, cache_root: str, interval: str, start, end,
+                    options: dict = None) -> list:
+    """
+    Jobs for every combination of indicator parameters in grid, e.g.
+    {'adx_trend_threshold': [15, 20, 25], 'chop_sideways_threshold': [55, 61.8]}.
+    """
+    names = sorted(grid)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        job_options = dict(options or {})
+        job_options['params'] = {**job_options.get('params', {}), **dict(zip(names, values))}
+        jobs.append({'instruments': instruments, 'cache_root': cache_root, 'interval': interval,
+                     'start': start, 'end': end, 'options': job_options})
+    return jobs
+
+
+def symbol_shards(instruments: list, shards: int, cache_root: str, interval: str, start, end,
+                  options: dict = None) -> list:
+    """Jobs splitting the instruments round-robin into `shards` independent backtests."""
+    return [{'instruments': instruments[i::shards], 'cache_root': cache_root, 'interval': interval,
+             'start': start, 'end': end, 'options': dict(options or {})}
+            for i in range(shards) if instruments[i::shards]]
+
+
+def run_parallel(jobs: list, processes: int = None) -> list:
+    """
+    Runs backtest jobs across a process pool. Candles must already be in the cache
+    (workers open it read-only). Results come back as summary dicts in job order.
+    """
+    if not jobs:
+        return []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_run_job, jobs))
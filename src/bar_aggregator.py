@@ -0,0 +1,283 @@
+# src/bar_aggregator.py
+import asyncio
+import logging
+
+from src.market_data_manager import F_LTP, F_LTQ, F_TIMESTAMP, F_VOLUME, RingStore
+from src.metrics import BAR_CLOSE, METRICS
+
+logger = logging.getLogger(__name__)
+
+# Completed bars are stored with these fields, in this order.
+BAR_FIELDS = ('start', 'open', 'high', 'low', 'close', 'volume')
+(B_START, B_OPEN, B_HIGH, B_LOW, B_CLOSE, B_VOLUME) = range(len(BAR_FIELDS))
+
+DEFAULT_TIMEFRAMES = (60, 180, 300, 900)  # 1m, 3m, 5m, 15m in seconds
+
+IST_OFFSET_MS = 19800 * 1000  # Exchange timestamps are epoch ms; sessions are defined in IST.
+DAY_MS = 86400 * 1000
+SESSION_OPEN_MS = (9 * 3600 + 15 * 60) * 1000    # 09:15 IST
+SESSION_CLOSE_MS = (15 * 3600 + 30 * 60) * 1000  # 15:30 IST
+
+_NO_BAR = -1
+
+
+class BarAggregator:
+    """
+    Builds OHLCV bars for several timeframes from the tick stream.
+
+    Every tick is folded into the open bar of each timeframe in constant time. Bars are
+    aligned to the session open (so 3m/15m bars start at 09:15, not at epoch multiples)
+    and never extend past the session close. A bar is completed by the first tick
+    belonging to a later bar, by on_time() once its end has passed, or by flush().
+
+    Completed bars go to a RingStore per timeframe (same slot numbering as the
+    MarketDataManager) and are announced to bar listeners and any attached asyncio queue.
+
+    Late ticks (older than the open bar, or for a bar on_time() already completed)
+    never reopen a bar; they still amend the high/low of the most recently completed
+    bar if they belong to it, and older ones are only counted. Volume comes from
+    the feed's cumulative day volume, falling back to summing last traded quantity
+    when the feed mode carries no volume.
+    """
+
+    def __init__(self, market_data=None, timeframes=DEFAULT_TIMEFRAMES, history: int = 500,
+                 max_slots: int = None, session_open_ms: int = SESSION_OPEN_MS,
+                 session_close_ms: int = SESSION_CLOSE_MS):
+        """
+        Args:
+            market_data (MarketDataManager): Tick source to attach to; None to feed ticks via add_tick().
+            timeframes (tuple): Bar lengths in seconds.
+            history (int): Completed bars kept per instrument and timeframe.
+            max_slots (int): Number of instrument slots; defaults to the MarketDataManager's.
+            session_open_ms (int): Session open as milliseconds after IST midnight.
+            session_close_ms (int): Session close as milliseconds after IST midnight.
+        """
+        if max_slots is None:
+            max_slots = market_data.store.max_slots if market_data is not None else 512
+        self.market_data = market_data
+        self.timeframes = tuple(timeframes)
+        self.session_open_ms = session_open_ms
+        self.session_close_ms = session_close_ms
+        self._tf_ms = [tf * 1000 for tf in self.timeframes]
+        self.bars = {tf: RingStore(BAR_FIELDS, max_slots, history) for tf in self.timeframes}
+        self._stores = [self.bars[tf] for tf in self.timeframes]
+
+        # Open bar state per timeframe, as flat per-slot lists (cheaper than numpy scalars per tick).
+        n_tf = len(self.timeframes)
+        self._start = [[_NO_BAR] * max_slots for _ in range(n_tf)]
+        self._end = [[0] * max_slots for _ in range(n_tf)]
+        self._open = [[0.0] * max_slots for _ in range(n_tf)]
+        self._high = [[0.0] * max_slots for _ in range(n_tf)]
+        self._low = [[0.0] * max_slots for _ in range(n_tf)]
+        self._close = [[0.0] * max_slots for _ in range(n_tf)]
+        self._close_ts = [[0] * max_slots for _ in range(n_tf)]
+        self._base_volume = [[0.0] * max_slots for _ in range(n_tf)]  # cumulative volume before this bar
+        self._last_volume = [[0.0] * max_slots for _ in range(n_tf)]  # highest cumulative volume seen in it
+        self._last_start = [[_NO_BAR] * max_slots for _ in range(n_tf)]  # start of the last completed bar
+
+        # Per-slot session bookkeeping.
+        self._session_day = [_NO_BAR] * max_slots
+        self._synthetic_volume = [0.0] * max_slots
+
+        self._listeners = []
+        self._queues = []
+        self.late_ticks = 0
+        self.out_of_session_ticks = 0
+
+        if market_data is not None:
+            market_data.add_tick_listener(self.on_tick)
+
+    # --- Consumers -------------------------------------------------------------------
+
+    def add_bar_listener(self, callback):
+        """Registers callback(timeframe_seconds, slot, bar) for every completed bar; bar is a BAR_FIELDS tuple."""
+        self._listeners.append(callback)
+
+    def attach_queue(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        """
+        Delivers completed bars as (timeframe_seconds, slot, bar) tuples to an asyncio queue.
+        Safe to call from the feed thread; bars are dropped (and logged) if the queue is full.
+        """
+        self._queues.append((queue, loop))
+
+    def _put_nowait(self, queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning("Bar queue full; dropping %ss bar for slot %s.", item[0], item[1])
+
+    def _emit(self, tf_index, slot, bar):
+        if METRICS.enabled:
+            METRICS.stage(BAR_CLOSE, slot)
+        self._stores[tf_index].write(slot, bar)
+        timeframe = self.timeframes[tf_index]
+        for callback in self._listeners:
+            callback(timeframe, slot, bar)
+        for queue, loop in self._queues:
+            loop.call_soon_threadsafe(self._put_nowait, queue, (timeframe, slot, bar))
+
+    # --- Tick path -------------------------------------------------------------------
+
+    def on_tick(self, slot: int):
+        """Tick listener for MarketDataManager: folds the slot's latest tick into its bars."""
+        store = self.market_data.store
+        count = store.counts[slot]
+        if count == 1:
+            # First tick since the slot was (re)assigned to an instrument.
+            self.reset_slot(slot)
+        i = (count - 1) % store.capacity
+        row = store.data[:, slot, i]
+        self.add_tick(slot, int(row[F_TIMESTAMP]), float(row[F_LTP]), float(row[F_VOLUME]), float(row[F_LTQ]))
+
+    def add_tick(self, slot: int, timestamp_ms: int, price: float, cumulative_volume: float = 0.0,
+                 last_quantity: float = 0.0):
+        """
+        Folds one trade into the open bar of every timeframe.
+        Args:
+            slot (int): Instrument slot.
+            timestamp_ms (int): Exchange timestamp, epoch milliseconds.
+            price (float): Last traded price.
+            cumulative_volume (float): Day volume so far (0 if the feed does not provide it).
+            last_quantity (float): Quantity of this trade, used when cumulative volume is unavailable.
+        """
+        local_ms = timestamp_ms + IST_OFFSET_MS
+        day = local_ms // DAY_MS
+        offset = local_ms - day * DAY_MS - self.session_open_ms
+        if offset < 0 or local_ms - day * DAY_MS >= self.session_close_ms:
+            self.out_of_session_ticks += 1
+            return
+
+        if day != self._session_day[slot]:
+            if day < self._session_day[slot]:
+                self.late_ticks += 1  # Straggler from a session that is already closed.
+                return
+            self._new_session(slot, day)
+        if cumulative_volume <= 0:
+            self._synthetic_volume[slot] += last_quantity
+            cumulative_volume = self._synthetic_volume[slot]
+        session_start = day * DAY_MS - IST_OFFSET_MS + self.session_open_ms
+        session_end = session_start - self.session_open_ms + self.session_close_ms
+
+        for k, tf_ms in enumerate(self._tf_ms):
+            start = session_start + (offset // tf_ms) * tf_ms
+            current = self._start[k][slot]
+            if start == current:
+                if price > self._high[k][slot]:
+                    self._high[k][slot] = price
+                elif price < self._low[k][slot]:
+                    self._low[k][slot] = price
+                if timestamp_ms >= self._close_ts[k][slot]:
+                    self._close[k][slot] = price
+                    self._close_ts[k][slot] = timestamp_ms
+                if cumulative_volume > self._last_volume[k][slot]:
+                    self._last_volume[k][slot] = cumulative_volume
+            elif start > current:
+                if current != _NO_BAR:
+                    self._complete(k, slot)
+                elif start <= self._last_start[k][slot]:
+                    # The bar was already completed (by on_time()); it must not be opened again.
+                    self._late_tick(k, slot, start, price)
+                    continue
+                self._start[k][slot] = start
+                self._end[k][slot] = min(start + tf_ms, session_end)
+                self._open[k][slot] = self._high[k][slot] = self._low[k][slot] = self._close[k][slot] = price
+                self._close_ts[k][slot] = timestamp_ms
+                if cumulative_volume > self._last_volume[k][slot]:
+                    self._last_volume[k][slot] = cumulative_volume
+            else:
+                self._late_tick(k, slot, start, price)
+
+    def _new_session(self, slot, day):
+        """Completes bars left over from the previous session and resets day volume."""
+        for k in range(len(self._tf_ms)):
+            if self._start[k][slot] != _NO_BAR:
+                self._complete(k, slot)
+            self._start[k][slot] = _NO_BAR
+            self._base_volume[k][slot] = 0.0
+            self._last_volume[k][slot] = 0.0
+        self._session_day[slot] = day
+        self._synthetic_volume[slot] = 0.0
+
+    def _complete(self, k, slot):
+        volume = self._last_volume[k][slot] - self._base_volume[k][slot]
+        bar = (self._start[k][slot], self._open[k][slot], self._high[k][slot],
+               self._low[k][slot], self._close[k][slot], volume if volume > 0 else 0.0)
+        self._base_volume[k][slot] = self._last_volume[k][slot]
+        self._last_start[k][slot] = self._start[k][slot]
+        self._start[k][slot] = _NO_BAR
+        self._emit(k, slot, bar)
+
+    def _late_tick(self, k, slot, start, price):
+        self.late_ticks += 1
+        store = self._stores[k]
+        latest = store.latest(slot)
+        if latest is None or latest[B_START] != start:
+            return
+        if price > latest[B_HIGH]:
+            store.set_latest(slot, B_HIGH, price)
+        elif price < latest[B_LOW]:
+            store.set_latest(slot, B_LOW, price)
+
+    # --- Time-driven completion --------------------------------------------------------
+
+    def on_time(self, now_ms: int, grace_ms: int = 1000):
+        """
+        Completes open bars whose end is at least grace_ms in the past, so bars of
+        illiquid instruments close on time even without a following tick.
+        Intended to be called periodically by the scheduler.
+        """
+        cutoff = now_ms - grace_ms
+        for k in range(len(self._tf_ms)):
+            starts = self._start[k]
+            ends = self._end[k]
+            for slot, start in enumerate(starts):
+                if start != _NO_BAR and ends[slot] <= cutoff:
+                    self._complete(k, slot)
+
+    def flush(self):
+        """Completes every open bar, e.g. at the end of the session."""
+        for k in range(len(self._tf_ms)):
+            for slot, start in enumerate(self._start[k]):
+                if start != _NO_BAR:
+                    self._complete(k, slot)
+
+    def reset_slot(self, slot: int):
+        """Forgets all bar state for a slot, e.g. when it is reassigned to another instrument."""
+        for k, store in enumerate(self._stores):
+            self._start[k][slot] = _NO_BAR
+            self._last_start[k][slot] = _NO_BAR
+            self._base_volume[k][slot] = 0.0
+            self._last_volume[k][slot] = 0.0
+            store.reset(slot)
+        self._session_day[slot] = _NO_BAR
+        self._synthetic_volume[slot] = 0.0
+
+    def slot_state(self, slot: int) -> tuple:
+        """A slot's open bar and session state, picklable, for restore_slot() in another aggregator."""
+        open_bars = [(self._start[k][slot], self._end[k][slot], self._open[k][slot], self._high[k][slot],
+                      self._low[k][slot], self._close[k][slot], self._close_ts[k][slot],
+                      self._base_volume[k][slot], self._last_volume[k][slot], self._last_start[k][slot])
+                     for k in range(len(self._tf_ms))]
+        return open_bars, self._session_day[slot], self._synthetic_volume[slot]
+
+    def restore_slot(self, slot: int, state: tuple):
+        """Continues a slot from slot_state() of an aggregator with the same timeframes."""
+        open_bars, self._session_day[slot], self._synthetic_volume[slot] = state
+        for k, open_bar in enumerate(open_bars):
+            (self._start[k][slot], self._end[k][slot], self._open[k][slot], self._high[k][slot],
+             self._low[k][slot], self._close[k][slot], self._close_ts[k][slot],
+             self._base_volume[k][slot], self._last_volume[k][slot], self._last_start[k][slot]) = open_bar
+
+    # --- Readers ---------------------------------------------------------------------
+
+    def open_bar(self, timeframe: int, slot: int):
+        """The bar currently being built for a slot as a BAR_FIELDS tuple, or None."""
+        k = self.timeframes.index(timeframe)
+        if self._start[k][slot] == _NO_BAR:
+            return None
+        return (self._start[k][slot], self._open[k][slot], self._high[k][slot], self._low[k][slot],
+                self._close[k][slot], max(self._last_volume[k][slot] - self._base_volume[k][slot], 0.0))
+
+    def window(self, timeframe: int, slot: int, n: int, field: int = None):
+        """View of the last n completed bars for a slot (see RingStore.window)."""
+        return self.bars[timeframe].window(slot, n, field)
@@ -0,0 +1,38 @@
+# src/clock.py
+import time
+
+
+class SystemClock:
+    """Wall-clock time source used by the live bot."""
+
+    def now_ms(self) -> int:
+        """Current time as epoch milliseconds."""
+        return time.time_ns() // 1_000_000
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+
+class SimulatedClock:
+    """
+    Manually driven time source for backtests and replays. Time only moves when the
+    driver calls set() or advance(), so a replay runs as fast as the CPU allows and
+    every component sees the same, deterministic "now".
+    """
+
+    def __init__(self, start_ms: int = 0):
+        self._now_ms = int(start_ms)
+
+    def now_ms(self) -> int:
+        return self._now_ms
+
+    def monotonic(self) -> float:
+        return self._now_ms / 1000.0
+
+    def set(self, now_ms: int):
+        """Moves the clock to now_ms; never moves it backwards."""
+        if now_ms > self._now_ms:
+            self._now_ms = int(now_ms)
+
+    def advance(self, ms: int):
+        self._now_ms += int(ms)
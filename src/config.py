@@ -28,19 +28,70 @@ class ConfigManager:
         # --- Path to Scrip Master File ---
         # Ensure you have SCRIP_MASTER_PATH in your .env or adjust the default.
         self.scrip_master_path = get_env_var("SCRIP_MASTER_PATH", "OpenAPIScripMaster.json")
+        # Memory-mapped index built from the scrip master; rebuilt automatically when the JSON changes.
+        self.scrip_index_path = get_env_var("SCRIP_INDEX_PATH", os.path.splitext(self.scrip_master_path)[0] + ".idx")
 
 
+        # --- Market Data Request Settings ---
+        # SmartAPI accepts up to 50 tokens per exchange in one quote request and
+        # allows about 10 quote requests per second.
+        self.quote_batch_size = int(get_env_var("QUOTE_BATCH_SIZE", "50"))
+        self.quote_rate_limit = float(get_env_var("QUOTE_RATE_LIMIT", "10"))
+        self.quote_max_workers = int(get_env_var("QUOTE_MAX_WORKERS", "4"))
+        # Historical candle API allows about 3 requests per second.
+        self.historical_rate_limit = float(get_env_var("HISTORICAL_RATE_LIMIT", "3"))
+
+        # --- Runtime Settings ---
+        # Threads for blocking SmartAPI calls made from the asyncio runtime.
+        self.api_max_workers = int(get_env_var("API_MAX_WORKERS", "4"))
+        # Bound of the bar and signal queues between the feed, strategy and order tasks.
+        self.event_queue_size = int(get_env_var("EVENT_QUEUE_SIZE", "1000"))
+        self.rescan_interval_minutes = int(get_env_var("RESCAN_INTERVAL_MINUTES", "15"))
+        # Processes running bars, indicators and the strategy (sharded by instrument); 0 keeps them in the loop.
+        self.strategy_workers = int(get_env_var("STRATEGY_WORKERS", "0"))
+        # Market data slots (simultaneously subscribed instruments) and ticks kept per instrument.
+        self.market_data_slots = int(get_env_var("MARKET_DATA_SLOTS", "512"))
+        self.tick_history = int(get_env_var("TICK_HISTORY", "1024"))
+
+        # --- Local Data Cache ---
+        self.candle_cache_dir = get_env_var("CANDLE_CACHE_DIR", "data/candles")
+        # Encrypted SmartAPI session tokens, reused on restart until they expire.
+        self.session_cache_path = get_env_var("SESSION_CACHE_PATH", "data/session.bin")
+        self.session_cache_key = get_env_var("SESSION_CACHE_KEY")
+        # Keep the broker session alive on a normal exit so a restart can reuse it.
+        self.keep_session_on_exit = (get_env_var("KEEP_SESSION_ON_EXIT", "true") or "").lower() in ("1", "true", "yes")
+
         # --- Paper Trading Settings ---
         self.funds_available = float(get_env_var("DEMO_FUNDS", "60000.0")) # Default 60k
         self.paper_trading_mode = True # Set to False for live trading later
+        # Fraction of an intraday position's value blocked as margin (0.2 = 5x leverage).
+        self.intraday_margin_rate = float(get_env_var("INTRADAY_MARGIN_RATE", "0.2"))
 
         # --- Data Logging Settings ---
         self.trade_logs_file = "trade_logs.csv" # Or JSON, etc.
+        # Journal of orders, fills and P&L snapshots (SQLite) and raw ticks (binary segments).
+        self.journal_enabled = (get_env_var("JOURNAL_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+        self.journal_dir = get_env_var("JOURNAL_DIR", "data/journal")
+        self.journal_ticks = (get_env_var("JOURNAL_TICKS", "true") or "").lower() in ("1", "true", "yes")
+        # What a power loss may cost: off, normal or full (see src.database_manager.FSYNC_POLICIES).
+        self.journal_fsync = get_env_var("JOURNAL_FSYNC", "normal")
+        # Application logs go to <log_dir>/YYYY-MM-DD/bot.log as JSON lines.
+        self.log_dir = get_env_var("LOG_DIR", "logs")
+        self.log_level = get_env_var("LOG_LEVEL", "INFO")
+        # Per-component levels, e.g. "src.api=DEBUG,src.market_data_manager=WARNING".
+        self.log_levels = get_env_var("LOG_LEVELS", "")
+        # Stage latency histograms and API call counters (src.metrics), served for Prometheus on
+        # localhost:METRICS_PORT (0 = no endpoint) and dumped to <log_dir>/YYYY-MM-DD/metrics.jsonl.
+        self.metrics_enabled = (get_env_var("METRICS_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+        self.metrics_port = int(get_env_var("METRICS_PORT", "9108"))
+        self.metrics_dump_seconds = float(get_env_var("METRICS_DUMP_SECONDS", "60"))
 
         # Add other configurations here as needed
         if not all([self.api_key, self.client_secret, self.redirect_uri,
                     self.username, self.pin, self.totp_secret]):
             raise ValueError("Missing one or more Angel One API/Login credentials in .env file. Please check ANGELONE_CLIENT_ID, ANGELONE_CLIENT_SECRET, ANGELONE_USERNAME, ANGELONE_PIN, ANGELONE_TOTP_SECRET, ANGELONE_REDIRECT_URI.")
+        if self.quote_rate_limit <= 0 or self.historical_rate_limit <= 0:
+            raise ValueError("QUOTE_RATE_LIMIT and HISTORICAL_RATE_LIMIT must be positive (requests per second).")
 
     def is_paper_trading(self):
         return self.paper_trading_mode
\ No newline at end of file
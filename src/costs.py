@@ -0,0 +1,73 @@
+# src/costs.py
+from src.models.enums import Side
+
+
+class FixedBpsSlippage:
+    """Fills buys `bps` basis points above and sells `bps` below the reference price."""
+
+    def __init__(self, bps: float = 2.0):
+        self.bps = bps
+
+    def __call__(self, side: Side, price: float, quantity: int = 0) -> float:
+        shift = price * self.bps / 10000.0
+        return price + shift if side == Side.BUY else price - shift
+
+
+class TickSlippage:
+    """Fills a fixed number of price ticks (tick_size) against the order."""
+
+    def __init__(self, ticks: int = 1, tick_size: float = 0.05):
+        self.ticks = ticks
+        self.tick_size = tick_size
+
+    def __call__(self, side: Side, price: float, quantity: int = 0) -> float:
+        shift = self.ticks * self.tick_size
+        return price + shift if side == Side.BUY else price - shift
+
+
+class NoSlippage:
+    def __call__(self, side: Side, price: float, quantity: int = 0) -> float:
+        return price
+
+
+class FlatBrokerage:
+    """A fixed charge per executed order."""
+
+    def __init__(self, per_order: float = 20.0):
+        self.per_order = per_order
+
+    def __call__(self, side: Side, price: float, quantity: int) -> float:
+        return self.per_order
+
+
+class IntradayEquityCharges:
+    """
+    Approximate Indian intraday (MIS) equity charges per executed order:
+    brokerage (lower of a flat fee and a percentage of turnover), STT on the sell side,
+    exchange transaction charges, SEBI fees, stamp duty on the buy side and GST on
+    brokerage plus exchange/SEBI charges. Rates are constructor arguments so they can be
+    kept in line with the broker's current schedule.
+    """
+
+    def __init__(self, brokerage_flat: float = 20.0, brokerage_pct: float = 0.0003,
+                 stt_sell_pct: float = 0.00025, exchange_pct: float = 0.0000297,
+                 sebi_pct: float = 0.000001, stamp_buy_pct: float = 0.00003, gst_pct: float = 0.18):
+        self.brokerage_flat = brokerage_flat
+        self.brokerage_pct = brokerage_pct
+        self.stt_sell_pct = stt_sell_pct
+        self.exchange_pct = exchange_pct
+        self.sebi_pct = sebi_pct
+        self.stamp_buy_pct = stamp_buy_pct
+        self.gst_pct = gst_pct
+
+    def __call__(self, side: Side, price: float, quantity: int) -> float:
+        turnover = price * quantity
+        brokerage = min(self.brokerage_flat, turnover * self.brokerage_pct)
+        exchange = turnover * self.exchange_pct
+        sebi = turnover * self.sebi_pct
+        charges = brokerage + exchange + sebi + (brokerage + exchange + sebi) * self.gst_pct
+        if side == Side.BUY:
+            charges += turnover * self.stamp_buy_pct
+        else:
+            charges += turnover * self.stt_sell_pct
+        return charges
@@ -0,0 +1,767 @@
+# src/database_manager.py
+import csv
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from enum import IntEnum
+
+import numpy as np
+
+from src.clock import SystemClock
+from src.market_data_manager import (EXCHANGE_TYPES, F_ASK, F_ASK_QTY, F_BID, F_BID_QTY, F_LTP, F_LTQ,
+                                     F_TIMESTAMP, F_VOLUME, SNAP_QUOTE, encode_tick)
+
+logger = logging.getLogger(__name__)
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+# One fixed-size little-endian record per candle; field order matches BAR_FIELDS.
+CANDLE_DTYPE = np.dtype([('start', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                         ('close', '<f8'), ('volume', '<f8')])
+
+# SmartAPI historical intervals: length in seconds and the longest range (days) one request may span.
+INTERVALS = {
+    'ONE_MINUTE': (60, 30),
+    'THREE_MINUTE': (180, 60),
+    'FIVE_MINUTE': (300, 100),
+    'TEN_MINUTE': (600, 100),
+    'FIFTEEN_MINUTE': (900, 200),
+    'THIRTY_MINUTE': (1800, 200),
+    'ONE_HOUR': (3600, 400),
+    'ONE_DAY': (86400, 2000),
+}
+
+
+def to_epoch_ms(value) -> int:
+    """Epoch milliseconds for a datetime (naive values are taken as IST), date, or number."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=IST)
+        return int(value.timestamp() * 1000)
+    if isinstance(value, datetime.date):
+        return to_epoch_ms(datetime.datetime.combine(value, datetime.time()))
+    return int(value)
+
+
+def from_epoch_ms(value: int) -> datetime.datetime:
+    """Naive IST datetime for epoch milliseconds (the form the SmartAPI expects)."""
+    return datetime.datetime.fromtimestamp(value / 1000, IST).replace(tzinfo=None)
+
+
+def parse_candles(rows) -> np.ndarray:
+    """
+    Converts SmartAPI candle rows ([timestamp, open, high, low, close, volume]) into an
+    (n, 6) float64 array with the timestamp as epoch milliseconds.
+    """
+    out = np.empty((len(rows), 6), dtype=np.float64)
+    for i, row in enumerate(rows):
+        stamp = row[0]
+        if isinstance(stamp, str):
+            stamp = datetime.datetime.fromisoformat(stamp).timestamp() * 1000.0
+        out[i] = (stamp, row[1], row[2], row[3], row[4], row[5])
+    return out
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class CandleStore:
+    """
+    Persistent local cache of historical candles, keyed by (exchange, token, interval).
+
+    Each instrument/interval is one append-only file of fixed-size CANDLE_DTYPE records
+    sorted by start time, read through np.memmap so range reads are a binary search plus
+    a zero-copy slice. A small JSON sidecar records which time ranges have already been
+    fetched (including ranges that legitimately had no candles, like holidays), so the
+    fetch planner only asks the broker for what is missing.
+
+    Fetches go through AngelOneAPI.get_candle_data, which is paced by the API's
+    historical-data rate limiter; several instruments can be fetched concurrently.
+    """
+
+    def __init__(self, angel_api=None, root: str = None, max_workers: int = 3):
+        """
+        Args:
+            angel_api (AngelOneAPI): Used to fetch missing ranges; may be None for read-only use.
+            root (str): Cache directory; defaults to config.candle_cache_dir.
+            max_workers (int): Concurrent fetches (they still share the API's rate limiter).
+        """
+        self.angel_api = angel_api
+        if root is None:
+            root = angel_api.config.candle_cache_dir if angel_api is not None else "data/candles"
+        self.root = root
+        self.max_workers = max_workers
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._maps = {}  # path -> (size, memmap), reopened when the file grows
+
+    # --- Paths and locking -----------------------------------------------------------
+
+    def _paths(self, exchange, token, interval):
+        base = os.path.join(self.root, exchange, interval, str(token))
+        return base + '.bin', base + '.cov'
+
+    def _lock(self, key):
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    # --- Reading ---------------------------------------------------------------------
+
+    def _records(self, path):
+        """Memory map of a candle file (cached until the file changes size)."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        size -= size % CANDLE_DTYPE.itemsize  # Ignore a torn trailing record from a crash.
+        if not size:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        cached = self._maps.get(path)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        records = np.memmap(path, dtype=CANDLE_DTYPE, mode='r', shape=(size // CANDLE_DTYPE.itemsize,))
+        self._maps[path] = (size, records)
+        return records
+
+    def read(self, exchange: str, token, interval: str, start=None, end=None) -> np.ndarray:
+        """
+        Cached candles with start time in [start, end] as a read-only CANDLE_DTYPE view.
+        start/end accept datetimes (naive = IST), dates or epoch milliseconds; None means open-ended.
+        """
+        records = self._records(self._paths(exchange, token, interval)[0])
+        lo = 0 if start is None else int(np.searchsorted(records['start'], to_epoch_ms(start), 'left'))
+        hi = len(records) if end is None else int(np.searchsorted(records['start'], to_epoch_ms(end), 'right'))
+        return records[lo:hi]
+
+    def read_bars(self, exchange: str, token, interval: str, start=None, end=None) -> np.ndarray:
+        """Cached candles as a (BAR_FIELDS, n) float64 array, e.g. for IndicatorEngine.warm_up()."""
+        records = self.read(exchange, token, interval, start, end)
+        return np.vstack([records[name].astype(np.float64) for name in CANDLE_DTYPE.names])
+
+    def coverage(self, exchange: str, token, interval: str) -> list:
+        """Fetched [start_ms, end_ms] ranges for an instrument/interval."""
+        path = self._paths(exchange, token, interval)[1]
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    # --- Writing ---------------------------------------------------------------------
+
+    def write(self, exchange: str, token, interval: str, candles: np.ndarray, covered=None):
+        """
+        Stores candles ((n, 6) array as from parse_candles) and marks `covered` (start_ms, end_ms) fetched.
+        Candles after the last stored one are appended; anything else triggers a merge rewrite.
+        """
+        data_path, cov_path = self._paths(exchange, token, interval)
+        with self._lock((exchange, str(token), interval)):
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            new = np.empty(len(candles), dtype=CANDLE_DTYPE)
+            if len(candles):
+                candles = np.asarray(candles, dtype=np.float64)
+                candles = candles[np.argsort(candles[:, 0], kind='stable')]
+                new['start'] = candles[:, 0].astype(np.int64)
+                for column, name in enumerate(CANDLE_DTYPE.names[1:], start=1):
+                    new[name] = candles[:, column]
+            existing = self._records(data_path)
+            if len(new):
+                if not len(existing) or new['start'][0] > existing['start'][-1]:
+                    with open(data_path, 'ab') as f:
+                        f.truncate(len(existing) * CANDLE_DTYPE.itemsize)  # Drop any torn record first.
+                        f.write(new.tobytes())
+                else:
+                    self._rewrite(data_path, existing, new)
+            if covered is not None:
+                ranges = _merge_ranges(self.coverage(exchange, token, interval) + [list(covered)])
+                tmp_path = cov_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(ranges, f)
+                os.replace(tmp_path, cov_path)
+
+    def _rewrite(self, path, existing, new):
+        combined = np.concatenate([np.asarray(existing), new])
+        # Keep the newest copy of each candle: reverse, unique (first occurrence), then sort.
+        _, keep = np.unique(combined['start'][::-1], return_index=True)
+        merged = combined[::-1][keep]
+        tmp_path = path + '.tmp'
+        merged.tofile(tmp_path)
+        self._maps.pop(path, None)
+        os.replace(tmp_path, path)
+
+    # --- Fetch planning --------------------------------------------------------------
+
+    def missing_ranges(self, exchange: str, token, interval: str, start, end) -> list:
+        """
+        [start_ms, end_ms] pieces of the requested range not yet fetched, split so that
+        each piece fits in one SmartAPI historical request for the interval.
+        """
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        gaps = []
+        cursor = start_ms
+        for lo, hi in self.coverage(exchange, token, interval):
+            if hi < cursor:
+                continue
+            if lo > end_ms:
+                break
+            if lo > cursor:
+                gaps.append((cursor, lo - 1))
+            cursor = max(cursor, hi + 1)
+        if cursor <= end_ms:
+            gaps.append((cursor, end_ms))
+
+        max_span = INTERVALS[interval][1] * 86400 * 1000
+        pieces = []
+        for lo, hi in gaps:
+            while lo <= hi:
+                piece_end = min(hi, lo + max_span - 1)
+                pieces.append((lo, piece_end))
+                lo = piece_end + 1
+        return pieces
+
+    def _fetch_piece(self, instrument, interval, piece):
+        lo, hi = piece
+        exchange, token = instrument['exchange'], instrument['token']
+        fetched_at = int(time.time() * 1000)
+        rows = self.angel_api.get_candle_data(exchange, token, interval, from_epoch_ms(lo), from_epoch_ms(hi))
+        if rows is None:
+            return False
+        candles = parse_candles(rows)
+        bar_ms = INTERVALS[interval][0] * 1000
+        if len(candles):
+            # Never cache a candle that was still forming when it was fetched.
+            candles = candles[(candles[:, 0] >= lo) & (candles[:, 0] + bar_ms <= fetched_at)]
+        # Nor mark its start as fetched, or the next fetch would start after it and the candle
+        # would never be stored. Every candle starting at or before this point had completed.
+        covered_end = min(hi, fetched_at - bar_ms)
+        self.write(exchange, token, interval, candles, covered=(lo, covered_end) if covered_end >= lo else None)
+        return True
+
+    def ensure(self, instruments: list, interval: str, start, end) -> int:
+        """
+        Makes sure [start, end] is cached for every instrument, fetching only the missing
+        pieces. Pieces for all instruments are fetched concurrently.
+        Returns:
+            int: Number of requests that failed (0 when everything is cached).
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval '{interval}'. Expected one of {sorted(INTERVALS)}.")
+        work = [(instrument, piece) for instrument in instruments
+                for piece in self.missing_ranges(instrument['exchange'], instrument['token'], interval, start, end)]
+        if not work:
+            return 0
+        if self.angel_api is None:
+            raise RuntimeError("CandleStore has no AngelOneAPI to fetch missing candles with.")
+        logger.info(f"Fetching {len(work)} missing {interval} ranges for {len(instruments)} instruments.")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="candles") as pool:
+            results = list(pool.map(lambda item: self._fetch_piece(item[0], interval, item[1]), work))
+        failed = results.count(False)
+        if failed:
+            logger.warning(f"{failed} of {len(work)} {interval} candle requests failed; they will be retried next time.")
+        return failed
+
+    def load(self, instrument: dict, interval: str, start, end) -> np.ndarray:
+        """Ensures the range is cached, then returns it as an (n, 6) float64 array (parse_candles layout)."""
+        self.ensure([instrument], interval, start, end)
+        return self.read_bars(instrument['exchange'], instrument['token'], interval, start, end).T
+
+    def loader(self, interval: str = 'ONE_DAY'):
+        """A candle_loader(instrument, from_dt, to_dt) backed by this cache, for StockScanner."""
+        return lambda instrument, from_dt, to_dt: self.load(instrument, interval, from_dt, to_dt)
+
+
+# --- Trading journal ---------------------------------------------------------------------
+
+# Tick segment files: a fixed header, then fixed-size little-endian records.
+TICK_SEGMENT_MAGIC = b'TICKSEG\x01'
+_SEGMENT_HEADER = struct.Struct('<8sII')  # magic, format version, record size
+_SEGMENT_VERSION = 1
+_TICK_RECORD = struct.Struct('<qqqBdqqddqq')
+TICK_RECORD_DTYPE = np.dtype([('received_ms', '<i8'), ('timestamp', '<i8'), ('token', '<i8'),
+                              ('exchange_type', 'u1'), ('ltp', '<f8'), ('volume', '<i8'), ('ltq', '<i8'),
+                              ('bid', '<f8'), ('ask', '<f8'), ('bid_qty', '<i8'), ('ask_qty', '<i8')])
+
+# fsync policies: what a power loss (not just a process crash) may cost.
+#   off     never fsync; the OS decides when data reaches disk
+#   normal  SQLite synchronous=NORMAL (WAL: the last commits may roll back), tick segments
+#           fsynced every fsync_interval seconds and when a segment is closed
+#   full    every group commit and every tick write is fsynced before the next batch
+FSYNC_POLICIES = {'off': 'OFF', 'normal': 'NORMAL', 'full': 'FULL'}
+
+_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY, started_ms INTEGER, ended_ms INTEGER,
+    clean INTEGER DEFAULT 0);  -- 0 running or crashed, 1 closed, 2 recovered after a crash
+CREATE TABLE IF NOT EXISTS orders (
+    session TEXT, order_id TEXT, symbol TEXT, token TEXT, exchange TEXT, side TEXT, order_type TEXT,
+    product TEXT, quantity INTEGER, price REAL, trigger_price REAL, status TEXT, filled_quantity INTEGER,
+    average_price REAL, created_ms INTEGER, updated_ms INTEGER, tag TEXT, reason TEXT,
+    PRIMARY KEY (session, order_id));
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, order_id TEXT, symbol TEXT, side TEXT,
+    quantity INTEGER, price REAL, fees REAL, timestamp_ms INTEGER);
+CREATE INDEX IF NOT EXISTS fills_by_time ON fills (timestamp_ms);
+CREATE TABLE IF NOT EXISTS pnl_snapshots (
+    timestamp_ms INTEGER, session TEXT, funds REAL, realized_pnl REAL, unrealized_pnl REAL, fees REAL,
+    margin_used REAL, equity REAL, open_positions INTEGER);
+CREATE INDEX IF NOT EXISTS pnl_by_time ON pnl_snapshots (timestamp_ms);
+"""
+_ORDER_COLUMNS = ('order_id', 'symbol', 'token', 'exchange', 'side', 'order_type', 'product', 'quantity', 'price',
+                  'trigger_price', 'status', 'filled_quantity', 'average_price', 'created_ms', 'updated_ms', 'tag',
+                  'reason')
+_FILL_COLUMNS = ('order_id', 'symbol', 'side', 'quantity', 'price', 'fees', 'timestamp_ms')
+_PNL_COLUMNS = ('funds', 'realized_pnl', 'unrealized_pnl', 'fees', 'margin_used', 'equity', 'open_positions')
+_INSERT_ORDER = (f"INSERT OR REPLACE INTO orders (session, {', '.join(_ORDER_COLUMNS)}) "
+                 f"VALUES (?, {', '.join('?' * len(_ORDER_COLUMNS))})")
+_INSERT_FILL = (f"INSERT INTO fills (session, {', '.join(_FILL_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(_FILL_COLUMNS))})")
+_INSERT_PNL = (f"INSERT INTO pnl_snapshots (timestamp_ms, session, {', '.join(_PNL_COLUMNS)}) "
+               f"VALUES (?, ?, {', '.join('?' * len(_PNL_COLUMNS))})")
+
+
+def _day_bounds(day):
+    """[start_ms, end_ms) of an IST calendar day (date, datetime or 'YYYY-MM-DD')."""
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    elif isinstance(day, datetime.datetime):
+        day = day.date()
+    start = to_epoch_ms(day)
+    return start, start + 86400 * 1000
+
+
+def _ist_date(epoch_ms: int) -> str:
+    return from_epoch_ms(epoch_ms).date().isoformat()
+
+
+class TradeJournal:
+    """
+    Durable record of a trading day: orders, fills and P&L snapshots in SQLite (WAL
+    mode), and every tick in append-only binary segment files.
+
+    Nothing is written on the caller's thread. Order, fill and snapshot events are
+    copied into a bounded queue; ticks are packed into an in-memory batch (one
+    struct.pack_into per tick). A single background writer drains both every
+    `flush_interval` seconds, committing each batch in one SQLite transaction and one
+    segment write (group commit). If the writer falls behind, events are dropped and
+    counted (`dropped`) instead of slowing the feed or the order path.
+
+    Each run is a `session`. On start the journal recovers from an unclean exit: SQLite
+    rolls its WAL forward on open, orders a crashed paper session left active are
+    closed as cancelled, and torn records at the end of tick segments are cut off.
+    """
+
+    def __init__(self, root: str = "data/journal", fsync: str = 'normal', flush_interval: float = 0.2,
+                 fsync_interval: float = 5.0, queue_size: int = 100000, tick_batch: int = 8192,
+                 segment_bytes: int = 256 * 1024 * 1024, market_data=None, clock=None):
+        """
+        Args:
+            root (str): Journal directory (journal.db and ticks/YYYY-MM-DD/*.seg).
+            fsync (str): 'off', 'normal' or 'full' (see FSYNC_POLICIES).
+            flush_interval (float): Longest time (seconds) an event waits before it is written.
+            fsync_interval (float): Tick segment fsync period under the 'normal' policy.
+            queue_size (int): Order/fill/snapshot events buffered before new ones are dropped.
+            tick_batch (int): Ticks held in memory before the batch is handed to the writer.
+            segment_bytes (int): Size at which a tick segment is closed and a new one started.
+            market_data (MarketDataManager): If given, every tick it receives is journaled.
+            clock: Time source for receive stamps and snapshots (SystemClock by default).
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}'. Expected one of {sorted(FSYNC_POLICIES)}.")
+        self.root = root
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.clock = clock or SystemClock()
+        self.db_path = os.path.join(root, "journal.db")
+        self.session = None
+        self.dropped = 0
+        self.ticks_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._tick_batch = tick_batch
+        self._ticks = bytearray(tick_batch * _TICK_RECORD.size)
+        self._tick_count = 0
+        self._full_batches = deque()
+        self._tick_lock = threading.Lock()
+        self._tick_keys = {}  # slot -> (instrument dict, token, exchange type)
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._segment = None
+        self._segment_day = None
+        self._segment_number = 0
+        self._last_fsync = 0.0
+        self.market_data = market_data
+        if market_data is not None:
+            market_data.add_tick_listener(self.record_tick)
+
+    # --- Lifecycle -------------------------------------------------------------------
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={FSYNC_POLICIES[self.fsync]}")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def start(self):
+        """Recovers from any unclean previous run, opens a new session and starts the writer."""
+        if self._thread is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        now = self.clock.now_ms()
+        self.session = f"{from_epoch_ms(now):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        with closing(self._connect()) as db:
+            db.executescript(_JOURNAL_SCHEMA)
+            self._recover(db, now)
+            db.execute("INSERT OR REPLACE INTO sessions (session, started_ms) VALUES (?, ?)", (self.session, now))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Journal session {self.session} started in {self.root} (fsync={self.fsync}).")
+
+    def _recover(self, db, now):
+        unclean = [row['session'] for row in db.execute("SELECT session FROM sessions WHERE clean = 0")]
+        for session in unclean:
+            cancelled = db.execute(
+                "UPDATE orders SET status = 'cancelled', reason = 'journal: process exited', updated_ms = ? "
+                "WHERE session = ? AND status IN ('open', 'trigger pending')", (now, session)).rowcount
+            # clean = 2: recovered after an unclean exit, so later starts leave it alone.
+            db.execute("UPDATE sessions SET ended_ms = COALESCE(ended_ms, ?), clean = 2 WHERE session = ?",
+                       (now, session))
+            logger.warning(f"Journal session {session} did not close cleanly; "
+                           f"{cancelled} orders it left active were marked cancelled.")
+        repaired = 0
+        for path in self._segment_paths():
+            repaired += self._repair_segment(path)
+        if repaired:
+            logger.warning(f"Journal: cut torn records off {repaired} tick segments.")
+
+    @staticmethod
+    def _repair_segment(path) -> int:
+        size = os.path.getsize(path)
+        if size < _SEGMENT_HEADER.size:
+            os.remove(path)
+            return 1
+        torn = (size - _SEGMENT_HEADER.size) % _TICK_RECORD.size
+        if torn:
+            with open(path, 'r+b') as f:
+                f.truncate(size - torn)
+            return 1
+        return 0
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Writes everything recorded so far and waits for it to be committed. Returns False on timeout."""
+        if self._thread is None:
+            return False
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        self._wake.set()
+        return done.wait(timeout)
+
+    def close(self):
+        """Writes what is pending, fsyncs, stops the writer and marks the session clean."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        with closing(self._connect()) as db:
+            db.execute("UPDATE sessions SET ended_ms = ?, clean = 1 WHERE session = ?",
+                       (self.clock.now_ms(), self.session))
+        if self.dropped:
+            logger.warning(f"Journal dropped {self.dropped} events because the writer fell behind.")
+        logger.info(f"Journal session {self.session} closed ({self.ticks_written} ticks).")
+
+    # --- Recording (any thread, never blocks) ----------------------------------------
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_order(self, order):
+        """Order listener (PaperTradingEngine.add_order_listener): journals the order's current state."""
+        self._put(('order', tuple(str(value) if isinstance(value, IntEnum) else value
+                                  for value in (getattr(order, name) for name in _ORDER_COLUMNS))))
+
+    def record_fill(self, fill, position=None):
+        """Fill listener (PaperTradingEngine or Portfolio.add_fill_listener)."""
+        self._put(('fill', (fill.order_id, fill.symbol, str(fill.side), fill.quantity, fill.price, fill.fees,
+                            fill.timestamp_ms)))
+
+    def record_snapshot(self, portfolio):
+        """Journals Portfolio.snapshot() at the current time."""
+        snapshot = portfolio.snapshot()
+        self._put(('pnl', (self.clock.now_ms(), *(snapshot[name] for name in _PNL_COLUMNS))))
+
+    def record_tick(self, slot: int):
+        """MarketDataManager tick listener: appends the slot's latest tick to the in-memory batch."""
+        instrument = self.market_data.instrument(slot)
+        key = self._tick_keys.get(slot)
+        if key is None or key[0] is not instrument:
+            try:
+                key = (instrument, int(instrument['token']), EXCHANGE_TYPES.get(instrument['exchange'], 0))
+            except (TypeError, ValueError):
+                return  # not subscribed (any more), or a token that is not numeric
+            self._tick_keys[slot] = key
+        tick = self.market_data.store.latest(slot).tolist()
+        with self._tick_lock:
+            _TICK_RECORD.pack_into(self._ticks, self._tick_count * _TICK_RECORD.size, self.clock.now_ms(),
+                                   int(tick[F_TIMESTAMP]), key[1], key[2], tick[F_LTP], int(tick[F_VOLUME]),
+                                   int(tick[F_LTQ]), tick[F_BID], tick[F_ASK], int(tick[F_BID_QTY]),
+                                   int(tick[F_ASK_QTY]))
+            self._tick_count += 1
+            if self._tick_count == self._tick_batch:
+                if len(self._full_batches) >= 64:  # about 40 MB of unwritten ticks: the disk cannot keep up
+                    self.dropped += self._tick_count
+                else:
+                    self._full_batches.append(self._ticks)
+                    self._ticks = bytearray(len(self._ticks))
+                self._tick_count = 0
+                self._wake.set()
+
+    # --- Writer thread ---------------------------------------------------------------
+
+    def _run(self):
+        db = self._connect()
+        try:
+            while True:
+                stopping = self._stop.is_set()
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self._write_batch(db)
+                except Exception as e:
+                    logger.error(f"Journal write failed: {e}", exc_info=True)
+                if stopping and self._queue.empty():
+                    break
+        finally:
+            self._close_segment()
+            db.close()
+
+    def _write_batch(self, db):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._tick_lock:
+            batches = list(self._full_batches)
+            self._full_batches.clear()
+            if self._tick_count:
+                batches.append(bytes(memoryview(self._ticks)[:self._tick_count * _TICK_RECORD.size]))
+                self._tick_count = 0
+
+        waiters = []
+        orders, fills, snapshots = [], [], []
+        for kind, data in events:
+            if kind == 'order':
+                orders.append((self.session, *data))
+            elif kind == 'fill':
+                fills.append((self.session, *data))
+            elif kind == 'pnl':
+                snapshots.append((data[0], self.session, *data[1:]))
+            else:
+                waiters.append(data)
+        try:
+            if batches:
+                self._write_ticks(batches)
+            if orders or fills or snapshots:
+                db.execute("BEGIN")
+                try:
+                    db.executemany(_INSERT_ORDER, orders)
+                    db.executemany(_INSERT_FILL, fills)
+                    db.executemany(_INSERT_PNL, snapshots)
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+        finally:
+            for done in waiters:
+                done.set()
+
+    def _write_ticks(self, batches):
+        day = _ist_date(self.clock.now_ms())
+        if self._segment is not None and (day != self._segment_day or self._segment.tell() >= self.segment_bytes):
+            self._close_segment()
+        if self._segment is None:
+            directory = os.path.join(self.root, "ticks", day)
+            os.makedirs(directory, exist_ok=True)
+            self._segment_number += 1
+            path = os.path.join(directory, f"{self.session}-{self._segment_number:04d}.seg")
+            self._segment = open(path, 'ab')
+            self._segment.write(_SEGMENT_HEADER.pack(TICK_SEGMENT_MAGIC, _SEGMENT_VERSION, _TICK_RECORD.size))
+            self._segment_day = day
+        for batch in batches:
+            self._segment.write(batch)
+            self.ticks_written += len(batch) // _TICK_RECORD.size
+        self._segment.flush()
+        now = time.monotonic()
+        if self.fsync == 'full' or (self.fsync == 'normal' and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._segment.fileno())
+            self._last_fsync = now
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._segment.flush()
+        if self.fsync != 'off':
+            os.fsync(self._segment.fileno())
+        self._segment.close()
+        self._segment = None
+
+    # --- Queries (any thread; readers do not block the writer in WAL mode) ------------
+
+    def _query(self, sql, params=()) -> list:
+        with closing(self._connect()) as db:
+            return [dict(row) for row in db.execute(sql, params)]
+
+    def orders(self, day=None, session: str = None) -> list:
+        """Final state of each order, optionally for one IST day (by creation time) or session."""
+        sql, params = "SELECT * FROM orders WHERE 1 = 1", []
+        if day is not None:
+            sql += " AND created_ms >= ? AND created_ms < ?"
+            params.extend(_day_bounds(day))
+        if session is not None:
+            sql += " AND session = ?"
+            params.append(session)
+        return self._query(sql + " ORDER BY created_ms", params)
+
+    def fills(self, day=None, symbol: str = None) -> list:
+        sql, params = "SELECT * FROM fills WHERE 1 = 1", []
+        if day is not None:
+            sql += " AND timestamp_ms >= ? AND timestamp_ms < ?"
+            params.extend(_day_bounds(day))
+        if symbol is not None:
+            sql += " AND symbol = ?"
+            params.append(symbol)
+        return self._query(sql + " ORDER BY timestamp_ms, id", params)
+
+    def pnl_curve(self, day) -> list:
+        return self._query("SELECT * FROM pnl_snapshots WHERE timestamp_ms >= ? AND timestamp_ms < ? "
+                           "ORDER BY timestamp_ms", _day_bounds(day))
+
+    def eod_report(self, day) -> dict:
+        """
+        End-of-day summary: per-symbol bought/sold quantity and value, charges and net
+        cash flow (the realised P&L for symbols that ended flat), order counts by status
+        and the day's last P&L snapshot.
+        """
+        start, end = _day_bounds(day)
+        symbols = self._query(
+            "SELECT symbol, "
+            "SUM(CASE WHEN side = 'BUY' THEN quantity ELSE 0 END) AS bought, "
+            "SUM(CASE WHEN side = 'SELL' THEN quantity ELSE 0 END) AS sold, "
+            "SUM(CASE WHEN side = 'BUY' THEN quantity * price ELSE 0 END) AS buy_value, "
+            "SUM(CASE WHEN side = 'SELL' THEN quantity * price ELSE 0 END) AS sell_value, "
+            "SUM(fees) AS fees, COUNT(*) AS fills "
+            "FROM fills WHERE timestamp_ms >= ? AND timestamp_ms < ? GROUP BY symbol ORDER BY symbol", (start, end))
+        for row in symbols:
+            row['net_quantity'] = row['bought'] - row['sold']
+            row['net_cash'] = row['sell_value'] - row['buy_value'] - row['fees']
+        statuses = self._query("SELECT status, COUNT(*) AS orders FROM orders "
+                               "WHERE created_ms >= ? AND created_ms < ? GROUP BY status", (start, end))
+        last = self._query("SELECT * FROM pnl_snapshots WHERE timestamp_ms >= ? AND timestamp_ms < ? "
+                           "ORDER BY timestamp_ms DESC LIMIT 1", (start, end))
+        return {
+            'date': _ist_date(start),
+            'symbols': symbols,
+            'fills': sum(row['fills'] for row in symbols),
+            'turnover': sum(row['buy_value'] + row['sell_value'] for row in symbols),
+            'fees': sum(row['fees'] for row in symbols),
+            'net_cash': sum(row['net_cash'] for row in symbols),
+            'orders': {row['status']: row['orders'] for row in statuses},
+            'last_snapshot': last[0] if last else None,
+        }
+
+    def _segment_paths(self, day=None) -> list:
+        base = os.path.join(self.root, "ticks")
+        days = [day] if day is not None else (sorted(os.listdir(base)) if os.path.isdir(base) else [])
+        paths = []
+        for name in days:
+            directory = os.path.join(base, name)
+            if os.path.isdir(directory):
+                paths.extend(os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.seg'))
+        return paths
+
+    def read_ticks(self, day, token=None) -> np.ndarray:
+        """
+        Journaled ticks of one IST day ('YYYY-MM-DD' or date) as a TICK_RECORD_DTYPE array
+        in receive order, optionally for one token. Segments are memory-mapped; a torn
+        trailing record (from a crash) is ignored.
+        """
+        if not isinstance(day, str):
+            day = day.isoformat()
+        parts = []
+        for path in self._segment_paths(day):
+            count = (os.path.getsize(path) - _SEGMENT_HEADER.size) // _TICK_RECORD.size
+            if count <= 0:
+                continue
+            with open(path, 'rb') as f:
+                magic, version, record_size = _SEGMENT_HEADER.unpack(f.read(_SEGMENT_HEADER.size))
+            if magic != TICK_SEGMENT_MAGIC or record_size != _TICK_RECORD.size:
+                logger.warning(f"Skipping {path}: not a version {_SEGMENT_VERSION} tick segment.")
+                continue
+            records = np.memmap(path, dtype=TICK_RECORD_DTYPE, mode='r', offset=_SEGMENT_HEADER.size,
+                                shape=(count,))
+            parts.append(records[records['token'] == int(token)] if token is not None else np.array(records))
+        if not parts:
+            return np.empty(0, dtype=TICK_RECORD_DTYPE)
+        ticks = np.concatenate(parts)
+        return ticks[np.argsort(ticks['received_ms'], kind='stable')]
+
+    def replay_packets(self, day, token=None, timed: bool = False):
+        """
+        Yields a day's journaled ticks as SmartAPI binary packets for ReplayFeed, as
+        (receive_time_seconds, packet) pairs if timed (for ReplayFeed(speed=...)).
+        """
+        for tick in self.read_ticks(day, token):
+            packet = bytes(encode_tick(int(tick['token']), int(tick['exchange_type']), SNAP_QUOTE,
+                                       timestamp_ms=int(tick['timestamp']), ltp=float(tick['ltp']),
+                                       ltq=int(tick['ltq']), volume=int(tick['volume']), bid=float(tick['bid']),
+                                       ask=float(tick['ask']), bid_qty=int(tick['bid_qty']),
+                                       ask_qty=int(tick['ask_qty'])))
+            yield (tick['received_ms'] / 1000.0, packet) if timed else packet
+
+    def export_trades_csv(self, path: str, day=None) -> int:
+        """
+        Writes fills (all, or one IST day) to a CSV trade log (ConfigManager.trade_logs_file),
+        replacing the file atomically. Returns the number of fills written.
+        """
+        fills = self.fills(day)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('time', 'session') + _FILL_COLUMNS)
+            for fill in fills:
+                writer.writerow((from_epoch_ms(fill['timestamp_ms']).isoformat(timespec='milliseconds'),
+                                 fill['session']) + tuple(fill[name] for name in _FILL_COLUMNS))
+        os.replace(tmp_path, path)
+        return len(fills)
@@ -0,0 +1,324 @@
+# src/fake_broker.py
+import base64
+import datetime
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from src.database_manager import INTERVALS, IST
+from src.market_data_manager import SNAP_QUOTE, encode_tick
+from src.models.enums import Exchange
+
+logger = logging.getLogger(__name__)
+
+# Requests per second the broker accepts per endpoint (SmartAPI's published limits).
+DEFAULT_RATE_LIMITS = {
+    'generateSession': 1, 'generateToken': 1, 'getProfile': 3, 'getMarketData': 10, 'getCandleData': 3,
+}
+RATE_LIMITED = {'status': False, 'message': 'Access denied because of exceeding access rate', 'errorcode': '',
+                'data': None}
+BROKER_ERROR = {'status': False, 'message': 'Something Went Wrong, Please Try After Sometime',
+                'errorcode': 'AB1004', 'data': None}
+MAX_QUOTE_TOKENS = 50  # per exchange in one getMarketData request
+
+
+def write_scrip_master(path: str, rows: int = 150_000, equities: int = 2500, seed: int = 7) -> list:
+    """
+    Writes a synthetic OpenAPIScripMaster.json with the real file's fields and mix:
+    NSE and BSE equities (SYMBOL-EQ), then NFO futures and options on them until
+    `rows` entries. Tokens are numeric and unique per exchange segment.
+    Returns:
+        list: The NSE equity base symbols (e.g. for basket and lookup benchmarks).
+    """
+    rng = random.Random(seed)
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    names = set()
+    while len(names) < equities:
+        names.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    names = sorted(names)
+
+    def scrip(token, symbol, name, exch_seg, instrument_type='', expiry='', strike=-1.0, lot_size=1):
+        return {'token': str(token), 'symbol': symbol, 'name': name, 'expiry': expiry, 'strike': f"{strike:.6f}",
+                'lotsize': str(lot_size), 'instrumenttype': instrument_type, 'exch_seg': exch_seg,
+                'tick_size': '5.000000'}
+
+    master = []
+    for i, name in enumerate(names):
+        master.append(scrip(1000 + i, f"{name}-EQ", name, 'NSE'))
+        master.append(scrip(500000 + i, name, name, 'BSE'))
+    expiries = ('27JUN2024', '25JUL2024', '29AUG2024')
+    token = 35000
+    while len(master) < rows:
+        name = rng.choice(names)
+        expiry = rng.choice(expiries)
+        lot_size = rng.choice((25, 50, 75, 100, 250, 500, 1000))
+        if rng.random() < 0.05:
+            master.append(scrip(token, f"{name}{expiry[:2]}{expiry[2:5]}{expiry[-2:]}FUT", name, 'NFO', 'FUTSTK',
+                                expiry, -1.0, lot_size))
+        else:
+            strike = rng.randrange(10, 5000) * 10
+            option = rng.choice(('CE', 'PE'))
+            master.append(scrip(token, f"{name}{expiry[:2]}{expiry[2:5]}{expiry[-2:]}{strike}{option}", name, 'NFO',
+                                'OPTSTK', expiry, strike * 100.0, lot_size))
+        token += 1
+    with open(path, 'w') as f:
+        json.dump(master[:rows], f)
+    return names
+
+
+def fake_jwt(expires: datetime.datetime) -> str:
+    """An unsigned JWT-shaped token carrying an 'exp' claim (what AngelOneAPI reads of it)."""
+    def part(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b'=').decode()
+    return f"{part({'alg': 'none'})}.{part({'exp': int(expires.timestamp())})}.fake"
+
+
+class FakeBroker:
+    """
+    Local stand-in for the Angel One SmartAPI, for benchmarks and offline runs.
+
+    connect() has SmartConnect's constructor signature and returns a FakeSmartConnect,
+    so it can be passed as AngelOneAPI(config, smart_connect=broker.connect); feed()
+    returns a FakeTickFeed for MarketDataManager(feed=...). Every REST call sleeps a
+    configurable latency (a fixed part plus an exponential tail), is refused when it
+    exceeds its endpoint's requests per second, and fails with `error_rate`
+    probability. Prices are seeded random walks per token, shared by quotes and ticks.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limits: dict = None, session_hours: float = 24.0, seed: int = 1, sleep=time.sleep):
+        """
+        Args:
+            latency_ms (float): Fixed latency of every REST call.
+            jitter_ms (float): Mean of an extra exponentially distributed latency (the tail).
+            error_rate (float): Probability a call fails with a broker error.
+            rate_limits (dict): Requests per second per endpoint; None for DEFAULT_RATE_LIMITS,
+                {} for no limits.
+            session_hours (float): Lifetime of the issued JWTs.
+            seed (int): Seed of the latency, error and price generators.
+            sleep (callable): Used to wait out latency; overridable for simulations.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.session_hours = session_hours
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._recent = {}    # endpoint -> monotonic times of the calls in the last second
+        self._prices = {}    # (exchange, token) -> last price
+        self.calls = {}
+        self.rate_limited = {}
+        self.errors = {}
+
+    def connect(self, api_key=None, access_token=None, refresh_token=None, feed_token=None, **kwargs):
+        return FakeSmartConnect(self, api_key, access_token, refresh_token, feed_token)
+
+    def feed(self, **kwargs):
+        return FakeTickFeed(self, **kwargs)
+
+    # --- Call model ------------------------------------------------------------------
+
+    def _call(self, endpoint: str):
+        """Books a call and waits its latency. Returns a failure response, or None to go ahead."""
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            delay = self.latency_ms + (self._rng.expovariate(1.0 / self.jitter_ms) if self.jitter_ms else 0.0)
+            failed = self.error_rate and self._rng.random() < self.error_rate
+            limit = self.rate_limits.get(endpoint)
+            limited = False
+            if limit:
+                now = time.monotonic()
+                recent = self._recent.setdefault(endpoint, deque())
+                while recent and recent[0] <= now - 1.0:
+                    recent.popleft()
+                limited = len(recent) >= limit
+                if not limited:
+                    recent.append(now)
+        if delay:
+            self._sleep(delay / 1000.0)
+        if limited:
+            self.rate_limited[endpoint] = self.rate_limited.get(endpoint, 0) + 1
+            return RATE_LIMITED
+        if failed:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return BROKER_ERROR
+        return None
+
+    def price(self, exchange: str, token: str, step: bool = True) -> float:
+        """Current price of an instrument, advanced one random-walk step unless step is False."""
+        key = (exchange, str(token))
+        with self._lock:
+            price = self._prices.get(key)
+            if price is None:
+                price = random.Random(f"{self._seed}:{exchange}:{token}").uniform(20.0, 3000.0)
+            elif step:
+                price = max(price * (1.0 + self._rng.gauss(0.0, 0.0005)), 0.05)
+            price = round(price * 20) / 20  # 5 paise ticks
+            self._prices[key] = price
+        return price
+
+    def reset_stats(self):
+        self.calls, self.rate_limited, self.errors = {}, {}, {}
+
+    def _session(self):
+        expires = datetime.datetime.now() + datetime.timedelta(hours=self.session_hours)
+        return {'jwtToken': f"Bearer {fake_jwt(expires)}", 'refreshToken': f"refresh-{self._rng.getrandbits(64):x}",
+                'feedToken': f"feed-{self._rng.getrandbits(64):x}"}
+
+
+class FakeSmartConnect:
+    """The subset of SmartApi.SmartConnect the bot uses, answered by a FakeBroker."""
+
+    def __init__(self, broker: FakeBroker, api_key=None, access_token=None, refresh_token=None, feed_token=None):
+        self.broker = broker
+        self.api_key = api_key
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.feed_token = feed_token
+
+    @staticmethod
+    def _ok(data):
+        return {'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': data}
+
+    def generateSession(self, client_code, password, totp):
+        failure = self.broker._call('generateSession')
+        if failure:
+            return failure
+        session = self.broker._session()
+        self.access_token, self.refresh_token = session['jwtToken'], session['refreshToken']
+        self.feed_token = session['feedToken']
+        return self._ok(session)
+
+    def generateToken(self, refresh_token):
+        failure = self.broker._call('generateToken')
+        return failure or self._ok(self.broker._session())
+
+    def getProfile(self, refresh_token):
+        failure = self.broker._call('getProfile')
+        return failure or self._ok({'clientcode': 'FAKE', 'name': 'Fake Broker'})
+
+    def terminateSession(self, client_code):
+        failure = self.broker._call('terminateSession')
+        return failure or self._ok("Logout Successfully")
+
+    def getMarketData(self, mode, exchangeTokens):
+        failure = self.broker._call('getMarketData')
+        if failure:
+            return failure
+        fetched = []
+        for exchange, tokens in exchangeTokens.items():
+            if len(tokens) > MAX_QUOTE_TOKENS:
+                return {'status': False, 'message': f"Maximum {MAX_QUOTE_TOKENS} tokens per exchange allowed",
+                        'errorcode': 'AB4001', 'data': None}
+            for token in tokens:
+                fetched.append(self._quote(mode, exchange, str(token)))
+        return self._ok({'fetched': fetched, 'unfetched': []})
+
+    def _quote(self, mode, exchange, token):
+        ltp = self.broker.price(exchange, token)
+        quote = {'exchange': exchange, 'tradingSymbol': token, 'symbolToken': token, 'ltp': ltp}
+        if mode == 'LTP':
+            return quote
+        close = self.broker.price(exchange, token, step=False)
+        quote.update({'open': close, 'high': max(ltp, close), 'low': min(ltp, close), 'close': close})
+        if mode == 'OHLC':
+            return quote
+        quote.update({'lastTradeQty': 10, 'netChange': 0.0, 'percentChange': 0.0, 'avgPrice': ltp,
+                      'tradeVolume': 100000, 'opnInterest': 0, 'lowerCircuit': round(close * 0.8, 2),
+                      'upperCircuit': round(close * 1.2, 2), 'totBuyQuan': 5000, 'totSellQuan': 5000,
+                      '52WeekLow': round(close * 0.6, 2), '52WeekHigh': round(close * 1.4, 2),
+                      'depth': {'buy': [{'price': ltp - 0.05, 'quantity': 500, 'orders': 3}],
+                                'sell': [{'price': ltp + 0.05, 'quantity': 500, 'orders': 3}]}})
+        return quote
+
+    def getCandleData(self, historicDataParams):
+        failure = self.broker._call('getCandleData')
+        if failure:
+            return failure
+        params = historicDataParams
+        seconds = INTERVALS[params['interval']][0]
+        start = datetime.datetime.strptime(params['fromdate'], "%Y-%m-%d %H:%M").replace(tzinfo=IST)
+        end = datetime.datetime.strptime(params['todate'], "%Y-%m-%d %H:%M").replace(tzinfo=IST)
+        candles = []
+        stamp = start
+        while stamp <= end:
+            in_session = datetime.time(9, 15) <= stamp.time() < datetime.time(15, 30)
+            if stamp.weekday() < 5 and (seconds >= 86400 or in_session):
+                open_ = self.broker.price(params['exchange'], params['symboltoken'], step=False)
+                close = self.broker.price(params['exchange'], params['symboltoken'])
+                candles.append([stamp.isoformat(), open_, max(open_, close), min(open_, close), close, 1000])
+            stamp += datetime.timedelta(seconds=seconds)
+        return self._ok(candles)
+
+
+class FakeTickFeed:
+    """
+    Feed transport (like ReplayFeed) generating SnapQuote packets for every subscribed
+    token from the broker's price walks, on a background thread.
+    """
+
+    def __init__(self, broker: FakeBroker, ticks_per_second: float = 1.0, max_ticks: int = None,
+                 clock=None):
+        """
+        Args:
+            broker (FakeBroker): Price source.
+            ticks_per_second (float): Ticks per subscribed token per second; None for as fast as possible.
+            max_ticks (int): Stop after this many packets in total; None to run until stop().
+            clock: Source of packet timestamps (now_ms()); wall time by default.
+        """
+        self.broker = broker
+        self.ticks_per_second = ticks_per_second
+        self.max_ticks = max_ticks
+        self.clock = clock
+        self.subscriptions = {}  # exchange type -> set of tokens
+        self.sent = 0
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, on_packet):
+        self._thread = threading.Thread(target=self._run, args=(on_packet,), name="fake-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self, on_packet):
+        volumes = {}
+        sequence = 0
+        while not self._stop.is_set():
+            started = time.monotonic()
+            tokens = [(exchange_type, token) for exchange_type, group in list(self.subscriptions.items())
+                      for token in list(group)]
+            for exchange_type, token in tokens:
+                if self._stop.is_set() or (self.max_ticks is not None and self.sent >= self.max_ticks):
+                    self.done.set()
+                    return
+                price = self.broker.price(str(Exchange(exchange_type)), token)
+                volume = volumes[token] = volumes.get(token, 0) + 10
+                now = self.clock.now_ms() if self.clock is not None else int(time.time() * 1000)
+                sequence += 1
+                on_packet(encode_tick(int(token), exchange_type, SNAP_QUOTE, sequence, now, price, 10, volume,
+                                      price - 0.05, price + 0.05, 500, 500))
+                self.sent += 1
+            if not tokens:
+                time.sleep(0.01)
+            elif self.ticks_per_second:
+                delay = 1.0 / self.ticks_per_second - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+        self.done.set()
+
+    def subscribe(self, mode, token_list):
+        for group in token_list:
+            self.subscriptions.setdefault(group['exchangeType'], set()).update(group['tokens'])
+
+    def unsubscribe(self, mode, token_list):
+        for group in token_list:
+            self.subscriptions.get(group['exchangeType'], set()).difference_update(group['tokens'])
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,253 @@
+# src/logger.py
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+from src.rate_limiter import TokenBucket
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is written as a field.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Loggers on the tick path, limited to a few records per second per call site.
+DEFAULT_RATE_LIMITED = {
+    'src.market_data_manager': (1.0, 5),
+    'src.bar_aggregator': (1.0, 5),
+    'src.orders': (5.0, 20),
+    'src.risk_manager': (5.0, 20),
+    'src.scheduler': (5.0, 20),
+}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Writes to <root>/YYYY-MM-DD/<filename>, moving to a new directory when the date
+    changes and rolling over to <filename>.1, .2, ... when a file reaches max_bytes.
+    """
+
+    def __init__(self, root: str = "logs", filename: str = "bot.log", max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 10):
+        self.root = root
+        self.filename = filename
+        self._date = datetime.date.today().isoformat()
+        super().__init__(self._path(), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+
+    def _path(self):
+        directory = os.path.join(self.root, self._date)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.abspath(os.path.join(directory, self.filename))
+
+    def emit(self, record):
+        date = datetime.date.fromtimestamp(record.created).isoformat()
+        if date != self._date:
+            self._date = date
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = self._path()
+        super().emit(record)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `rate` records per second (bursts of `burst`) per call site,
+    so per-tick messages cannot flood the log. The next record from a call site that
+    passes carries a `suppressed` count of the ones dropped since the last one.
+    Warnings and errors are never suppressed.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._suppressed = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        if not bucket.try_acquire():
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller: formatting is left to the listener thread
+    (only a traceback, which cannot outlive the except block, is rendered here) and
+    records are dropped, and counted, if the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _ForwardingHandler(logging.handlers.QueueHandler):
+    """Hands each record, with its message and traceback rendered (so it pickles), to send(record)."""
+
+    def __init__(self, send):
+        super().__init__(None)
+        self._send = send
+
+    def enqueue(self, record):
+        self._send(record)
+
+
+def parse_levels(spec: str) -> dict:
+    """Parses per-component levels such as "src.api=DEBUG,src.market_data_manager=WARNING"."""
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, level = part.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(log_dir: str = "logs", level: str = "INFO", component_levels: dict = None,
+                  console: bool = True, queue_size: int = 10000, max_bytes: int = 50 * 1024 * 1024,
+                  backup_count: int = 10, rate_limited: dict = None):
+    """
+    Installs the logging pipeline for the whole process: every logger writes into a
+    bounded in-memory queue, and one background thread formats the records and writes
+    JSON lines to logs/YYYY-MM-DD/bot.log (and plain lines to the console). The SmartAPI
+    library keeps writing its own app.log in the same directories.
+    Calling it again replaces the previous setup.
+    Args:
+        log_dir (str): Root of the dated log directories.
+        level (str): Root level.
+        component_levels (dict): Logger name -> level, e.g. {'src.market_data_manager': 'WARNING'}.
+        console (bool): Also write human-readable lines to stderr.
+        queue_size (int): Records buffered before new ones are dropped.
+        max_bytes (int): Size at which a day's log file is rolled over.
+        backup_count (int): Rolled-over files kept per day.
+        rate_limited (dict): Logger name -> (records per second, burst); defaults to DEFAULT_RATE_LIMITED.
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    global _listener
+    with _setup_lock:
+        shutdown_logging()
+
+        file_handler = DailyRotatingFileHandler(log_dir, "bot.log", max_bytes, backup_count)
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+            handlers.append(console_handler)
+
+        # Skip record attributes nothing here reads, to make record creation cheaper.
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        queue_handler = _NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        for name, component_level in (component_levels or {}).items():
+            logging.getLogger(name).setLevel(component_level)
+        for name, (rate, burst) in (DEFAULT_RATE_LIMITED if rate_limited is None else rate_limited).items():
+            component = logging.getLogger(name)
+            for old in [f for f in component.filters if isinstance(f, RateLimitFilter)]:
+                component.removeFilter(old)
+            component.addFilter(RateLimitFilter(rate, burst))
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def logger_levels() -> dict:
+    """Levels set on the root ('') and on individual loggers, for setup_worker_logging()."""
+    levels = {'': logging.getLogger().level}
+    for name, component in logging.Logger.manager.loggerDict.items():
+        if isinstance(component, logging.Logger) and component.level:
+            levels[name] = component.level
+    return levels
+
+
+def setup_worker_logging(send, levels: dict = None):
+    """
+    Logging for a worker process: instead of writing anywhere itself, every record is
+    passed to send(record) (e.g. a multiprocessing queue's put) for the parent process
+    to write with handle_forwarded(), so worker logs end up in the parent's pipeline.
+    Args:
+        send (callable): Receives each record; must not block.
+        levels (dict): Logger name -> level, as returned by logger_levels() in the parent.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_ForwardingHandler(send))
+    for name, level in (levels or {}).items():
+        logging.getLogger(name or None).setLevel(level)
+
+
+def handle_forwarded(record):
+    """Logs a record from a setup_worker_logging() process through this process's loggers and handlers."""
+    component = logging.getLogger(record.name)
+    if component.isEnabledFor(record.levelno):
+        component.handle(record)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
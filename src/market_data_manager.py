@@ -0,0 +1,499 @@
+# src/market_data_manager.py
+import logging
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from src.metrics import METRICS
+from src.models.enums import Exchange
+
+logger = logging.getLogger(__name__)
+
+# --- SmartAPI WebSocket 2.0 constants ---
+LTP_MODE = 1
+QUOTE = 2
+SNAP_QUOTE = 3
+
+# exch_seg (as used in the scrip master / REST API) -> WebSocket exchangeType
+EXCHANGE_TYPES = {exchange.name: int(exchange) for exchange in Exchange}
+# Prices arrive as integers; currency derivatives are scaled by 1e7, everything else is in paise.
+_PRICE_DIVISORS = {13: 10000000.0}
+_DEFAULT_PRICE_DIVISOR = 100.0
+
+# Binary packet layout (little endian), see SmartWebSocketV2._parse_binary_data.
+_SLOT_KEY_FIELD = slice(1, 27)  # exchange type and token: tokens are only unique within a segment
+_HEADER = struct.Struct('<BB25sqqq')         # mode, exchange type, token, sequence, exchange ts (ms), ltp
+_QUOTE = struct.Struct('<qqqddqqqq')         # ltq, avg price, day volume, total buy/sell qty, open, high, low, close
+_DEPTH_ENTRY = struct.Struct('<Hqqh')        # flag (0 = buy), quantity, price, number of orders
+_QUOTE_OFFSET = 51
+_DEPTH_OFFSET = 147
+_DEPTH_ENTRIES = 10
+LTP_PACKET_SIZE = 51
+QUOTE_PACKET_SIZE = 123
+SNAP_QUOTE_PACKET_SIZE = 379
+
+# Fields held for every tick, in storage order.
+TICK_FIELDS = ('timestamp', 'ltp', 'volume', 'ltq', 'bid', 'ask', 'bid_qty', 'ask_qty')
+(F_TIMESTAMP, F_LTP, F_VOLUME, F_LTQ, F_BID, F_ASK, F_BID_QTY, F_ASK_QTY) = range(len(TICK_FIELDS))
+
+
+def token_key(token) -> bytes:
+    """The raw, NUL-padded 25 byte token field as it appears in feed packets."""
+    return str(token).encode('ascii').ljust(25, b'\0')
+
+
+def slot_key(exchange, token) -> bytes:
+    """Exchange type byte plus token field, as they appear together in feed packets (bytes 1..26)."""
+    exchange_type = exchange if isinstance(exchange, int) else EXCHANGE_TYPES[exchange]
+    return bytes((exchange_type,)) + token_key(token)
+
+
+def encode_tick(token, exchange_type=1, mode=SNAP_QUOTE, sequence=0, timestamp_ms=0, ltp=0.0,
+                ltq=0, volume=0, bid=0.0, ask=0.0, bid_qty=0, ask_qty=0):
+    """
+    Builds a binary feed packet in the SmartAPI WebSocket 2.0 format.
+    Used by ReplayFeed recordings and by fakes standing in for the broker feed.
+    """
+    divisor = _PRICE_DIVISORS.get(exchange_type, _DEFAULT_PRICE_DIVISOR)
+    packet = bytearray(_HEADER.pack(mode, exchange_type, token_key(token), sequence, timestamp_ms,
+                                    round(ltp * divisor)))
+    if mode >= QUOTE:
+        packet += _QUOTE.pack(ltq, round(ltp * divisor), volume, float(bid_qty), float(ask_qty),
+                              0, 0, 0, 0)
+    if mode >= SNAP_QUOTE:
+        packet += bytes(_DEPTH_OFFSET - len(packet))
+        packet += _DEPTH_ENTRY.pack(0, bid_qty, round(bid * divisor), 1)
+        packet += bytes(4 * _DEPTH_ENTRY.size)
+        packet += _DEPTH_ENTRY.pack(1, ask_qty, round(ask * divisor), 1)
+        packet += bytes(4 * _DEPTH_ENTRY.size)
+        packet += bytes(SNAP_QUOTE_PACKET_SIZE - len(packet))
+    return bytes(packet)
+
+
+def packet_timestamp(packet) -> int:
+    """Exchange timestamp (ms) of a binary feed packet, without decoding the rest."""
+    return _HEADER.unpack_from(packet, 0)[4]
+
+
+class RingStore:
+    """
+    Preallocated per-slot ring buffers for a fixed set of float64 fields.
+
+    All fields live in one float64 block of shape (fields, slots, 2 * capacity). Every
+    row is written twice, at i and i + capacity, so the most recent `n <= capacity`
+    rows of a slot are always a contiguous slice and window() can hand out views
+    instead of copies. There is a single writer; readers check `counts` to know how
+    many rows are valid.
+
+    The block can be placed on a caller-supplied buffer (e.g. shared memory).
+    """
+
+    def __init__(self, fields: tuple, max_slots: int, capacity: int, buffer=None):
+        self.fields = fields
+        self.max_slots = max_slots
+        self.capacity = capacity
+        shape = (len(fields), max_slots, 2 * capacity)
+        if buffer is None:
+            self.data = np.zeros(shape, dtype=np.float64)
+            self.counts = np.zeros(max_slots, dtype=np.int64)
+        else:
+            data_size = int(np.prod(shape)) * 8
+            self.data = np.ndarray(shape, dtype=np.float64, buffer=buffer)
+            self.counts = np.ndarray((max_slots,), dtype=np.int64, buffer=buffer, offset=data_size)
+        for index, field in enumerate(fields):
+            setattr(self, field, self.data[index])
+
+    @staticmethod
+    def nbytes(field_count: int, max_slots: int, capacity: int) -> int:
+        """Size of the buffer needed to back a RingStore of this shape."""
+        return field_count * max_slots * 2 * capacity * 8 + max_slots * 8
+
+    def write(self, slot: int, row: tuple):
+        """Appends one row (values in field order) to a slot."""
+        count = self.counts[slot]
+        i = count % self.capacity
+        self.data[:, slot, i] = row
+        self.data[:, slot, i + self.capacity] = row
+        self.counts[slot] = count + 1
+
+    def set_latest(self, slot: int, field: int, value: float):
+        """Overwrites one field of the latest row of a slot (both copies)."""
+        i = (self.counts[slot] - 1) % self.capacity
+        self.data[field, slot, i] = value
+        self.data[field, slot, i + self.capacity] = value
+
+    def reset(self, slot: int):
+        self.counts[slot] = 0
+
+    def latest(self, slot: int):
+        """View of the latest row for a slot (field order), or None if it has none."""
+        count = self.counts[slot]
+        if not count:
+            return None
+        return self.data[:, slot, (count - 1) % self.capacity]
+
+    def window(self, slot: int, n: int, field: int = None):
+        """
+        View of the last n rows for a slot, oldest first, without copying.
+        Args:
+            slot (int): Slot index.
+            n (int): Number of rows; clamped to what is available and to capacity.
+            field (int): Field index (e.g. one of the F_* constants) for a 1-D view, or None for all fields.
+        """
+        count = int(self.counts[slot])
+        n = min(n, count, self.capacity)
+        end = (count - 1) % self.capacity + 1 + self.capacity if count else self.capacity
+        if field is None:
+            return self.data[:, slot, end - n:end]
+        return self.data[field, slot, end - n:end]
+
+
+class TickStore(RingStore):
+    """RingStore holding TICK_FIELDS for every subscribed instrument."""
+
+    def __init__(self, max_slots: int, capacity: int, buffer=None):
+        super().__init__(TICK_FIELDS, max_slots, capacity, buffer)
+
+    @staticmethod
+    def nbytes(max_slots: int, capacity: int) -> int:
+        return RingStore.nbytes(len(TICK_FIELDS), max_slots, capacity)
+
+
+class SmartWebSocketFeed:
+    """
+    Feed transport over the SmartAPI WebSocket 2.0 stream.
+    Raw binary frames are handed to the manager without building the SDK's per-tick dicts.
+    """
+
+    def __init__(self, auth_token, api_key, client_code, feed_token):
+        from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+
+        feed = self
+
+        class _RawSocket(SmartWebSocketV2):
+            def _on_data(self, wsapp, data, data_type, continue_flag):
+                if data_type == 2 and feed._on_packet is not None:
+                    feed._on_packet(data)
+
+            def on_open(self, wsapp):
+                logger.info("Market data WebSocket connected.")
+                feed._connected.set()
+                feed._flush_pending()
+
+            def on_error(self, *args):
+                logger.error(f"Market data WebSocket error: {args}")
+
+            def on_close(self, wsapp):
+                logger.info("Market data WebSocket closed.")
+
+        self._socket = _RawSocket(auth_token, api_key, client_code, feed_token)
+        self._on_packet = None
+        self._connected = threading.Event()
+        self._pending = []  # Subscriptions requested before the socket opened
+        self._thread = None
+        self._correlation = 0
+
+    def start(self, on_packet):
+        self._on_packet = on_packet
+        self._thread = threading.Thread(target=self._socket.connect, name="market-feed", daemon=True)
+        self._thread.start()
+        if not self._connected.wait(timeout=10):
+            logger.warning("Market data WebSocket did not confirm connection within 10s.")
+
+    def _next_correlation_id(self):
+        self._correlation += 1
+        return f"mdm{self._correlation:07d}"
+
+    def subscribe(self, mode, token_list):
+        if not self._connected.is_set():
+            self._pending.append((mode, token_list))
+            return
+        self._socket.subscribe(self._next_correlation_id(), mode, token_list)
+
+    def unsubscribe(self, mode, token_list):
+        if self._connected.is_set():
+            self._socket.unsubscribe(self._next_correlation_id(), mode, token_list)
+
+    def _flush_pending(self):
+        pending, self._pending = self._pending, []
+        for mode, token_list in pending:
+            self._socket.subscribe(self._next_correlation_id(), mode, token_list)
+
+    def stop(self):
+        self._socket.close_connection()
+
+
+class ReplayFeed:
+    """
+    Feed transport that replays recorded binary packets, for tests and backtests.
+    Subscriptions are recorded but not used for filtering; the manager ignores
+    packets for tokens it has not subscribed.
+    """
+
+    def __init__(self, packets, speed: float = None, threaded: bool = False):
+        """
+        Args:
+            packets (iterable): Binary packets, or (receive_time_seconds, packet) pairs when speed is set.
+            speed (float): Replay speed multiplier relative to recorded time; None replays as fast as possible.
+            threaded (bool): Replay on a background thread instead of inside start().
+        """
+        self.packets = packets
+        self.speed = speed
+        self.threaded = threaded
+        self.subscriptions = {}
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, on_packet):
+        if self.threaded:
+            self._thread = threading.Thread(target=self._run, args=(on_packet,), name="replay-feed", daemon=True)
+            self._thread.start()
+        else:
+            self._run(on_packet)
+
+    def _run(self, on_packet):
+        if self.speed is None:
+            for packet in self.packets:
+                if self._stop.is_set():
+                    break
+                on_packet(packet)
+        else:
+            started = time.monotonic()
+            first = None
+            for received, packet in self.packets:
+                if self._stop.is_set():
+                    break
+                first = received if first is None else first
+                delay = (received - first) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                on_packet(packet)
+        self.done.set()
+
+    def subscribe(self, mode, token_list):
+        for group in token_list:
+            self.subscriptions.setdefault(group['exchangeType'], set()).update(group['tokens'])
+
+    def unsubscribe(self, mode, token_list):
+        for group in token_list:
+            self.subscriptions.get(group['exchangeType'], set()).difference_update(group['tokens'])
+
+    def stop(self):
+        self._stop.set()
+
+
+class MarketDataManager:
+    """
+    Streaming market data: decodes feed packets straight into a TickStore and notifies
+    tick listeners with the slot that changed.
+
+    Each subscribed instrument gets a fixed slot in the store. Decoding works on the
+    raw packet with precompiled structs and a bytes -> slot lookup keyed by exchange
+    type and token (tokens repeat across segments), so the hot path does not allocate
+    dicts per tick.
+    """
+
+    def __init__(self, angel_api=None, feed=None, max_tokens: int = 512, capacity: int = 1024,
+                 mode: int = SNAP_QUOTE, store=None):
+        """
+        Args:
+            angel_api (AngelOneAPI): Logged-in API instance; used to open the live feed when no feed is given.
+            feed: Feed transport (SmartWebSocketFeed, ReplayFeed, or any object with
+                  start/subscribe/unsubscribe/stop). Defaults to the live SmartAPI WebSocket.
+            max_tokens (int): Maximum number of simultaneously subscribed instruments.
+            capacity (int): Ticks kept per instrument.
+            mode (int): Subscription mode (LTP_MODE, QUOTE or SNAP_QUOTE).
+            store (TickStore): Prebuilt store (e.g. a SharedTickStore); overrides max_tokens and capacity.
+        """
+        self.angel_api = angel_api
+        self.feed = feed
+        self.mode = mode
+        self.store = store if store is not None else TickStore(max_tokens, capacity)
+        max_tokens = self.store.max_slots
+        self._slots = {}                       # slot_key (exchange type + raw token field) -> slot
+        self._instruments = [None] * max_tokens  # slot -> instrument dict
+        # Freed slots go to the back of the queue, so a slot is reused as late as possible
+        # and per-slot state downstream (bars, indicators, positions) is not handed
+        # straight to the next instrument.
+        self._free_slots = deque(range(max_tokens))
+        self._tick_listeners = []
+        METRICS.ensure_slots(max_tokens)
+        self._lock = threading.Lock()  # guards subscription changes, not the tick path
+        self._started = False
+        self.ticks_received = 0
+        self.ticks_dropped = 0
+
+    # --- Lifecycle -------------------------------------------------------------------
+
+    def start(self):
+        """Connects the feed (opening the live WebSocket if none was supplied) and subscribes current instruments."""
+        if self._started:
+            return
+        if self.feed is None:
+            if not self.angel_api or not self.angel_api.is_logged_in():
+                raise RuntimeError("MarketDataManager needs a logged-in AngelOneAPI to open the live feed.")
+            api = self.angel_api
+            self.feed = SmartWebSocketFeed(api.jwt_token, api.config.api_key, api.config.username, api.feed_token)
+        self._started = True
+        instruments = self.subscribed_instruments()
+        if instruments:
+            # Register before starting so replay feeds see them; the live socket
+            # sends subscriptions once it is open (and again after reconnects).
+            self.feed.subscribe(self.mode, self._token_list(instruments))
+        self.feed.start(self.on_packet)
+
+    def stop(self):
+        if self.feed is not None and self._started:
+            self.feed.stop()
+        self._started = False
+
+    # --- Subscriptions ---------------------------------------------------------------
+
+    @staticmethod
+    def _token_list(instruments):
+        groups = {}
+        for inst in instruments:
+            exchange_type = EXCHANGE_TYPES[inst['exchange']]
+            groups.setdefault(exchange_type, []).append(str(inst['token']))
+        return [{'exchangeType': exchange_type, 'tokens': tokens} for exchange_type, tokens in groups.items()]
+
+    def subscribe(self, instruments: list) -> list:
+        """
+        Subscribes instruments ({'symbol', 'token', 'exchange'} dicts) and assigns them slots.
+        Returns:
+            list: Instruments that were newly subscribed.
+        """
+        added = []
+        with self._lock:
+            for inst in instruments:
+                try:
+                    key = slot_key(inst['exchange'], inst['token'])
+                except KeyError:
+                    logger.error(f"Unknown exchange {inst['exchange']!r}; cannot subscribe {inst['symbol']}.")
+                    continue
+                if key in self._slots:
+                    continue
+                if not self._free_slots:
+                    logger.error(f"No free market data slots left; cannot subscribe {inst['symbol']}.")
+                    break
+                slot = self._free_slots.popleft()
+                self.store.reset(slot)
+                self._instruments[slot] = inst
+                self._slots[key] = slot
+                added.append(inst)
+        if added and self._started:
+            self.feed.subscribe(self.mode, self._token_list(added))
+        if added:
+            logger.info(f"Subscribed {len(added)} instruments to the market data feed.")
+        return added
+
+    def unsubscribe(self, instruments: list) -> list:
+        """
+        Unsubscribes instruments and frees their slots.
+        Returns:
+            list: Instruments that were actually removed.
+        """
+        removed = []
+        with self._lock:
+            for inst in instruments:
+                slot = self._slots.pop(slot_key(inst['exchange'], inst['token']), None)
+                if slot is None:
+                    continue
+                removed.append(self._instruments[slot])
+                self._instruments[slot] = None
+                self._free_slots.append(slot)
+        if removed and self._started:
+            self.feed.unsubscribe(self.mode, self._token_list(removed))
+        if removed:
+            logger.info(f"Unsubscribed {len(removed)} instruments from the market data feed.")
+        return removed
+
+    def attach_basket(self, basket_manager):
+        """
+        Keeps subscriptions in sync with a StockBasketManager: subscribes its current
+        basket now and follows every later change to it.
+        """
+        basket_manager.add_listener(self._on_basket_changed)
+        self.subscribe(basket_manager.get_basket_details())
+
+    def _on_basket_changed(self, added, removed):
+        if removed:
+            self.unsubscribe(removed)
+        if added:
+            self.subscribe(added)
+
+    def add_tick_listener(self, callback):
+        """Registers callback(slot) to run on the feed thread after each stored tick."""
+        self._tick_listeners.append(callback)
+
+    # --- Tick path -------------------------------------------------------------------
+
+    def on_packet(self, packet):
+        """Decodes one binary feed packet into the tick store."""
+        slot = self._slots.get(packet[_SLOT_KEY_FIELD])
+        if slot is None:
+            self.ticks_dropped += 1
+            return
+        if METRICS.enabled:
+            METRICS.stamp_tick(slot)
+        mode, exchange_type, _, _, timestamp, ltp = _HEADER.unpack_from(packet, 0)
+        divisor = _PRICE_DIVISORS.get(exchange_type, _DEFAULT_PRICE_DIVISOR)
+        ltp /= divisor
+        volume = ltq = bid_qty = ask_qty = 0
+        bid = ask = ltp
+        if mode >= QUOTE and len(packet) >= QUOTE_PACKET_SIZE:
+            ltq, _, volume, _, _, _, _, _, _ = _QUOTE.unpack_from(packet, _QUOTE_OFFSET)
+        if mode >= SNAP_QUOTE and len(packet) >= SNAP_QUOTE_PACKET_SIZE:
+            bid_qty, bid, ask_qty, ask = self._best_bid_ask(packet)
+            bid = bid / divisor if bid else ltp
+            ask = ask / divisor if ask else ltp
+        self.store.write(slot, (timestamp, ltp, volume, ltq, bid, ask, bid_qty, ask_qty))
+        self.ticks_received += 1
+        for callback in self._tick_listeners:
+            callback(slot)
+
+    @staticmethod
+    def _best_bid_ask(packet):
+        # Best five buy entries are normally followed by the best five sell entries.
+        buy_flag, bid_qty, bid, _ = _DEPTH_ENTRY.unpack_from(packet, _DEPTH_OFFSET)
+        sell_flag, ask_qty, ask, _ = _DEPTH_ENTRY.unpack_from(packet, _DEPTH_OFFSET + 5 * _DEPTH_ENTRY.size)
+        if buy_flag == 0 and sell_flag != 0:
+            return bid_qty, bid, ask_qty, ask
+        bid_qty = bid = ask_qty = ask = 0
+        for i in range(_DEPTH_ENTRIES):
+            flag, quantity, price, _ = _DEPTH_ENTRY.unpack_from(packet, _DEPTH_OFFSET + i * _DEPTH_ENTRY.size)
+            if flag == 0 and not bid:
+                bid_qty, bid = quantity, price
+            elif flag != 0 and not ask:
+                ask_qty, ask = quantity, price
+        return bid_qty, bid, ask_qty, ask
+
+    # --- Readers ---------------------------------------------------------------------
+
+    def slot_for(self, exchange, token):
+        """Slot index of a subscribed instrument (exchange segment name and token), or None."""
+        try:
+            return self._slots.get(slot_key(exchange, token))
+        except KeyError:
+            return None
+
+    def instrument(self, slot: int):
+        """Instrument dict subscribed on a slot, or None."""
+        return self._instruments[slot]
+
+    def subscribed_instruments(self) -> list:
+        return [inst for inst in self._instruments if inst is not None]
+
+    def latest(self, exchange, token):
+        """Latest tick for an instrument as a view in TICK_FIELDS order, or None."""
+        slot = self.slot_for(exchange, token)
+        return self.store.latest(slot) if slot is not None else None
+
+    def window(self, exchange, token, n: int, field: int = None):
+        """View of the last n ticks for an instrument (see TickStore.window), or None if not subscribed."""
+        slot = self.slot_for(exchange, token)
+        return self.store.window(slot, n, field) if slot is not None else None
@@ -0,0 +1,412 @@
+# src/metrics.py
+import array
+import datetime
+import functools
+import http.server
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in order. Each stage's latency is measured from the previous one on the same slot.
+STAGES = ('tick', 'bar_close', 'signal', 'risk_check', 'order_send', 'ack')
+TICK, BAR_CLOSE, SIGNAL, RISK_CHECK, ORDER_SEND, ACK = range(len(STAGES))
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_SUB_BITS = 7                    # 2**7 linear sub-buckets per power of two: values within ~1.6%
+_SUB = 1 << _SUB_BITS
+_HALF = _SUB >> 1
+_MAX_BITS = 42                   # nanoseconds: up to about 73 minutes; larger values land in the last bucket
+_BUCKETS = (_MAX_BITS - _SUB_BITS + 1) * _HALF + _SUB
+
+
+class Histogram:
+    """
+    Fixed-memory log-linear histogram of non-negative integers (HdrHistogram-style):
+    exact below 128, then 64 linear buckets per power of two, so any recorded value
+    is known to within about 1.6%. About 18 KB however many values are recorded.
+
+    record() is a handful of integer operations and is called from several threads
+    without a lock; a count lost to a race is acceptable for monitoring.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array.array('q', bytes(8 * _BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        shift = value.bit_length() - _SUB_BITS
+        index = value if shift <= 0 else shift * _HALF + (value >> shift)
+        if index >= _BUCKETS:
+            index = _BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @staticmethod
+    def _bucket_value(index: int) -> int:
+        """Middle of the value range a bucket covers."""
+        if index < _SUB:
+            return index
+        shift = (index - _SUB) // _HALF + 1
+        return ((index - shift * _HALF) << shift) + (1 << (shift - 1))
+
+    def percentile(self, q: float) -> int:
+        """Value at quantile q (0..1), to the histogram's precision; 0 when empty."""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = array.array('q', bytes(8 * _BUCKETS))
+        self.count = self.total = self.max = 0
+
+    def summary(self, scale: float = 1e-3) -> dict:
+        """{'count', 'mean', 'p50', 'p90', 'p99', 'p999', 'max'}, values multiplied by scale (ns -> us by default)."""
+        if not self.count:
+            return {'count': 0}
+        summary = {'count': self.count, 'mean': round(self.total / self.count * scale, 3)}
+        for q in QUANTILES:
+            summary[f"p{str(q)[2:].ljust(2, '0')}"] = round(self.percentile(q) * scale, 3)
+        summary['max'] = round(self.max * scale, 3)
+        return summary
+
+
+class ApiStats:
+    """Calls, failures and latency of one AngelOneAPI method."""
+    __slots__ = ('calls', 'failures', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    """
+    Process-wide latency and call metrics (the module's METRICS instance).
+
+    Pipeline stages are stamped with time.monotonic_ns() per instrument slot: the tick
+    receipt in MarketDataManager, then bar close, signal, risk check, order send and
+    ack. Each stage records the time since the previous stage on the same slot, if
+    that stage happened since the last time this one did, and the ack also records
+    the whole path from the tick that closed the bar. AngelOneAPI methods count calls,
+    failures and latency, and rate limiters registered here report their waits.
+
+    Everything checks `enabled` first, so switched off the cost is one attribute read.
+    """
+
+    def __init__(self, max_slots: int = 512):
+        self.enabled = True
+        self.started = time.time()
+        self._slots = 0
+        self._stamps = [[] for _ in STAGES]
+        self._origin = []  # slot -> tick stamp of the bar close the current signal came from
+        self.ensure_slots(max_slots)
+        self.stages = {STAGES[stage]: Histogram() for stage in range(BAR_CLOSE, len(STAGES))}
+        self._stage_histograms = [None] + [self.stages[name] for name in STAGES[1:]]
+        self.tick_to_ack = Histogram()
+        self.api = {}
+        self._limiters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def ensure_slots(self, max_slots: int):
+        """Grows the per-slot stamp tables to at least max_slots (MarketDataManager calls this)."""
+        if max_slots > self._slots:
+            grow = [0] * (max_slots - self._slots)
+            for stamps in self._stamps:
+                stamps.extend(grow)
+            self._origin.extend(grow)
+            self._slots = max_slots
+
+    # --- Pipeline stages -------------------------------------------------------------
+
+    def stamp_tick(self, slot: int):
+        self._stamps[TICK][slot] = time.monotonic_ns()
+
+    def stage(self, stage: int, slot: int, now: int = None):
+        """
+        Stamps a stage for a slot and records its latency from the previous stage.
+        now is the stage's time.monotonic_ns() if it happened elsewhere (e.g. a bar closed in
+        a strategy worker process; the monotonic clock is system-wide); it is not recorded
+        if the previous stage has been stamped again since.
+        """
+        if now is None:
+            now = time.monotonic_ns()
+        stamps = self._stamps
+        previous = stamps[stage - 1][slot]
+        recorded = stamps[stage][slot] < previous <= now
+        if recorded:
+            self._stage_histograms[stage].record(now - previous)
+        if stage == BAR_CLOSE:
+            self._origin[slot] = previous if recorded else 0
+        elif stage == ACK and recorded and self._origin[slot]:
+            self.tick_to_ack.record(now - self._origin[slot])
+        stamps[stage][slot] = now
+
+    # --- API calls -------------------------------------------------------------------
+
+    def api_call(self, method: str, elapsed_ns: int, failed: bool):
+        stats = self.api.get(method)
+        if stats is None:
+            with self._lock:
+                stats = self.api.setdefault(method, ApiStats())
+        stats.calls += 1
+        if failed:
+            stats.failures += 1
+        stats.latency.record(elapsed_ns)
+
+    def register_limiter(self, method: str, limiter):
+        """Reports a rate limiter's waits (wait_count, wait_seconds) under an API method."""
+        self._limiters[method] = limiter
+
+    def register_gauge(self, name: str, function, help_text: str = ''):
+        """Exports function() (a number) as a gauge, e.g. a queue length; errors are skipped."""
+        self._gauges[name] = (function, help_text)
+
+    def reset(self):
+        for histogram in (*self.stages.values(), self.tick_to_ack):
+            histogram.reset()
+        self.api = {}
+
+    # --- Export ----------------------------------------------------------------------
+
+    def _gauge_values(self):
+        values = {}
+        for name, (function, _) in list(self._gauges.items()):
+            try:
+                values[name] = float(function())
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self) -> dict:
+        """Everything as plain data (latencies in microseconds), e.g. for a JSON dump."""
+        api = {}
+        for method, stats in list(self.api.items()):
+            api[method] = {'calls': stats.calls, 'failures': stats.failures, 'latency_us': stats.latency.summary()}
+        for method, limiter in list(self._limiters.items()):
+            entry = api.setdefault(method, {})
+            entry['rate_limit_waits'] = limiter.wait_count
+            entry['rate_limit_wait_seconds'] = round(limiter.wait_seconds, 3)
+        return {
+            'ts': datetime.datetime.now().isoformat(timespec='seconds'),
+            'stages_us': {name: histogram.summary() for name, histogram in self.stages.items()},
+            'tick_to_ack_us': self.tick_to_ack.summary(),
+            'api': api,
+            'gauges': self._gauge_values(),
+        }
+
+    @staticmethod
+    def _summary_lines(lines, name, labels, histogram):
+        prefix = f"{labels}," if labels else ""
+        for q in QUANTILES:
+            lines.append(f'{name}{{{prefix}quantile="{q}"}} {histogram.percentile(q) / 1e9:.9f}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram.total / 1e9:.9f}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = ["# HELP trading_stage_latency_seconds Time from the previous pipeline stage "
+                 "(tick, bar_close, signal, risk_check, order_send, ack) on the same instrument.",
+                 "# TYPE trading_stage_latency_seconds summary"]
+        for name, histogram in self.stages.items():
+            self._summary_lines(lines, "trading_stage_latency_seconds", f'stage="{name}"', histogram)
+        lines += ["# HELP trading_tick_to_ack_seconds Time from the tick that closed a bar to the order ack.",
+                  "# TYPE trading_tick_to_ack_seconds summary"]
+        self._summary_lines(lines, "trading_tick_to_ack_seconds", "", self.tick_to_ack)
+
+        api = sorted(self.api.items())
+        lines += ["# HELP trading_api_calls_total AngelOneAPI method calls.", "# TYPE trading_api_calls_total counter"]
+        lines += [f'trading_api_calls_total{{method="{method}"}} {stats.calls}' for method, stats in api]
+        lines += ["# HELP trading_api_failures_total AngelOneAPI calls that raised or returned nothing.",
+                  "# TYPE trading_api_failures_total counter"]
+        lines += [f'trading_api_failures_total{{method="{method}"}} {stats.failures}' for method, stats in api]
+        lines += ["# HELP trading_api_latency_seconds AngelOneAPI method latency.",
+                  "# TYPE trading_api_latency_seconds summary"]
+        for method, stats in api:
+            self._summary_lines(lines, "trading_api_latency_seconds", f'method="{method}"', stats.latency)
+        limiters = sorted(self._limiters.items())
+        lines += ["# HELP trading_api_rate_limit_waits_total Calls that waited for the rate limiter.",
+                  "# TYPE trading_api_rate_limit_waits_total counter"]
+        lines += [f'trading_api_rate_limit_waits_total{{method="{method}"}} {limiter.wait_count}'
+                  for method, limiter in limiters]
+        lines += ["# HELP trading_api_rate_limit_wait_seconds_total Time spent waiting for the rate limiter.",
+                  "# TYPE trading_api_rate_limit_wait_seconds_total counter"]
+        lines += [f'trading_api_rate_limit_wait_seconds_total{{method="{method}"}} {limiter.wait_seconds:.6f}'
+                  for method, limiter in limiters]
+
+        values = self._gauge_values()
+        for name, (_, help_text) in sorted(self._gauges.items()):
+            if name in values:
+                lines += [f"# HELP trading_{name} {help_text or name}", f"# TYPE trading_{name} gauge",
+                          f"trading_{name} {values[name]:g}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def timed(method: str = None):
+    """
+    Decorator counting calls, failures (an exception, or a false/empty result) and
+    latency of an AngelOneAPI method in METRICS.
+    """
+    def decorator(function):
+        name = method or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            started = time.monotonic_ns()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                METRICS.api_call(name, time.monotonic_ns() - started, True)
+                raise
+            METRICS.api_call(name, time.monotonic_ns() - started, not result)
+            return result
+        return wrapper
+    return decorator
+
+
+# --- Exporter ----------------------------------------------------------------------------
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would otherwise go to stderr
+
+
+class MetricsExporter:
+    """
+    Serves METRICS at http://<host>:<port>/metrics for Prometheus to scrape, and writes
+    a JSON snapshot to <log_dir>/YYYY-MM-DD/metrics.jsonl every `dump_interval` seconds
+    (and once more on stop), each on its own daemon thread.
+    """
+
+    def __init__(self, metrics: Metrics = METRICS, port: int = 9108, host: str = '127.0.0.1',
+                 log_dir: str = 'logs', dump_interval: float = 60.0):
+        """
+        Args:
+            metrics (Metrics): What to export.
+            port (int): HTTP port; 0 disables the endpoint.
+            host (str): Interface to listen on; local only by default.
+            log_dir (str): Root of the dated log directories the dumps go to.
+            dump_interval (float): Seconds between dumps; 0 disables them.
+        """
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self.log_dir = log_dir
+        self.dump_interval = dump_interval
+        self._server = None
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.port:
+            handler = type('Handler', (_MetricsHandler,), {'metrics': self.metrics})
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+            self._server.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="metrics-http",
+                                                  daemon=True))
+            logger.info(f"Metrics served at http://{self.host}:{self.port}/metrics.")
+        if self.dump_interval:
+            self._threads.append(threading.Thread(target=self._dump_loop, name="metrics-dump", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def dump(self):
+        directory = os.path.join(self.log_dir, datetime.date.today().isoformat())
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "metrics.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.metrics.snapshot()) + "\n")
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.dump_interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error(f"Metrics dump failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self.dump_interval:
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error(f"Metrics dump failed: {e}")
+
+
+_exporter = None
+
+
+def setup_metrics(enabled: bool = True, port: int = 9108, dump_interval: float = 60.0, log_dir: str = 'logs',
+                  host: str = '127.0.0.1'):
+    """
+    Switches the process-wide instrumentation on or off and starts the exporter.
+    Calling it again replaces the previous exporter.
+    Returns:
+        MetricsExporter: The running exporter, or None when metrics are disabled.
+    """
+    global _exporter
+    shutdown_metrics()
+    METRICS.enabled = enabled
+    if not enabled:
+        return None
+    _exporter = MetricsExporter(METRICS, port, host, log_dir, dump_interval)
+    try:
+        _exporter.start()
+    except OSError as e:
+        logger.error(f"Metrics endpoint could not listen on {host}:{port}: {e}; only dumping to {log_dir}.")
+        _exporter = MetricsExporter(METRICS, 0, host, log_dir, dump_interval)
+        _exporter.start()
+    return _exporter
+
+
+def shutdown_metrics():
+    """Stops the exporter (writing a final dump)."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
@@ -0,0 +1,4 @@
+from src.models.enums import Exchange, OrderStatus, OrderType, ProductType, Side
+from src.models.order import Order
+from src.models.position import Position, PositionBook
+from src.models.trade import Fill, TradeBlotter
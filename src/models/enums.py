@@ -0,0 +1,84 @@
+# src/models/enums.py
+from enum import IntEnum
+
+
+class _ApiEnum(IntEnum):
+    """
+    Int-coded enum that prints as, and parses from, the SmartAPI string it stands for,
+    so members can go straight into log lines and request payloads built with str().
+    """
+
+    @property
+    def api_value(self) -> str:
+        return self.name
+
+    @classmethod
+    def parse(cls, value):
+        """Member for a member, its int code or its SmartAPI string (case-insensitive)."""
+        if isinstance(value, cls):
+            return value
+        try:
+            if isinstance(value, str):
+                return cls[value.strip().upper().replace(' ', '_')]
+            return cls(value)
+        except (KeyError, ValueError):
+            raise ValueError(f"{value!r} is not a valid {cls.__name__}") from None
+
+    def __str__(self):
+        return self.api_value
+
+    def __format__(self, spec):
+        return format(self.api_value, spec)
+
+
+class Exchange(_ApiEnum):
+    """Exchange segments (exch_seg); codes are the WebSocket exchangeType values."""
+    NSE = 1
+    NFO = 2
+    BSE = 3
+    BFO = 4
+    MCX = 5
+    NCDEX = 7
+    CDS = 13
+
+
+class Side(_ApiEnum):
+    """Transaction type; the code is the sign of the position change, so side * quantity is signed."""
+    BUY = 1
+    SELL = -1
+
+    @property
+    def opposite(self):
+        return Side(-self)
+
+
+class OrderType(_ApiEnum):
+    MARKET = 1
+    LIMIT = 2
+    STOPLOSS_LIMIT = 3
+    STOPLOSS_MARKET = 4
+
+
+class ProductType(_ApiEnum):
+    INTRADAY = 1
+    DELIVERY = 2
+    CARRYFORWARD = 3
+    MARGIN = 4
+    BO = 5
+
+
+class OrderStatus(_ApiEnum):
+    """Order book status. Active states have the lowest codes, so `status <= TRIGGER_PENDING` tests for them."""
+    OPEN = 1
+    TRIGGER_PENDING = 2
+    COMPLETE = 3
+    CANCELLED = 4
+    REJECTED = 5
+
+    @property
+    def api_value(self) -> str:
+        return self.name.lower().replace('_', ' ')
+
+    @property
+    def is_active(self) -> bool:
+        return self <= OrderStatus.TRIGGER_PENDING
@@ -0,0 +1,59 @@
+# src/models/order.py
+from enum import IntEnum
+
+from src.models.enums import Exchange, OrderStatus
+
+
+class Order:
+    """
+    An order and its fill state, using the SmartAPI field vocabulary with int-coded
+    enums (src.models.enums) for side, order type, product, exchange and status.
+    `slot` is the instrument's market data slot, the id every hot-path table is indexed by.
+    """
+    __slots__ = ('order_id', 'slot', 'symbol', 'token', 'exchange', 'side', 'order_type', 'product', 'quantity',
+                 'price', 'trigger_price', 'status', 'filled_quantity', 'average_price', 'created_ms',
+                 'updated_ms', 'tag', 'reason')
+
+    def __init__(self, order_id, slot, instrument, side, order_type, quantity, price, trigger_price, product,
+                 created_ms, tag=None):
+        self.order_id = order_id
+        self.slot = slot
+        self.symbol = instrument['symbol']
+        self.token = instrument['token']
+        self.exchange = Exchange.parse(instrument['exchange'])
+        self.side = side
+        self.order_type = order_type
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+        self.trigger_price = trigger_price
+        self.status = OrderStatus.OPEN
+        self.filled_quantity = 0
+        self.average_price = 0.0
+        self.created_ms = self.updated_ms = created_ms
+        self.tag = tag
+        self.reason = None
+
+    @property
+    def pending_quantity(self) -> int:
+        return self.quantity - self.filled_quantity
+
+    @property
+    def is_active(self) -> bool:
+        return self.status <= OrderStatus.TRIGGER_PENDING
+
+    @property
+    def instrument(self) -> dict:
+        return {'symbol': self.symbol, 'token': self.token, 'exchange': str(self.exchange)}
+
+    def as_dict(self) -> dict:
+        """The order in SmartAPI order book form (enums as their API strings)."""
+        order = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            order[name] = str(value) if isinstance(value, IntEnum) else value
+        return order
+
+    def __repr__(self):
+        return (f"Order({self.order_id} {self.side} {self.quantity} {self.symbol} {self.order_type} "
+                f"@{self.price}/{self.trigger_price} {self.status} filled={self.filled_quantity})")
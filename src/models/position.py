@@ -0,0 +1,125 @@
+# src/models/position.py
+import math
+
+import numpy as np
+
+
+class Position:
+    """Point-in-time view of one instrument's position, as returned by PositionBook.position()."""
+    __slots__ = ('slot', 'symbol', 'quantity', 'average_price', 'last_price', 'realized_pnl', 'unrealized_pnl',
+                 'fees', 'margin')
+
+    def __init__(self, slot, symbol, quantity, average_price, last_price, realized_pnl, unrealized_pnl, fees,
+                 margin):
+        self.slot = slot
+        self.symbol = symbol
+        self.quantity = quantity
+        self.average_price = average_price
+        self.last_price = last_price
+        self.realized_pnl = realized_pnl
+        self.unrealized_pnl = unrealized_pnl
+        self.fees = fees
+        self.margin = margin
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"Position({self.symbol} qty={self.quantity} avg={self.average_price:.2f} "
+                f"ltp={self.last_price:.2f} realized={self.realized_pnl:.2f} unrealized={self.unrealized_pnl:.2f})")
+
+
+class PositionBook:
+    """
+    Net positions of every instrument as parallel arrays indexed by market data slot.
+
+    Updates touch one slot and return the change they made, so the owner (Portfolio)
+    can keep account-level totals current without summing over all positions.
+    """
+
+    def __init__(self, max_slots: int, margin_rate: float = 1.0):
+        """
+        Args:
+            max_slots (int): Number of instrument slots.
+            margin_rate (float): Fraction of a position's entry value blocked as margin.
+        """
+        self.max_slots = max_slots
+        self.margin_rate = margin_rate
+        self.quantity = np.zeros(max_slots, dtype=np.int64)
+        self.average_price = np.zeros(max_slots)
+        self.last_price = np.full(max_slots, np.nan)
+        self.realized = np.zeros(max_slots)
+        self.unrealized = np.zeros(max_slots)
+        self.fees = np.zeros(max_slots)
+        self.margin = np.zeros(max_slots)
+        self.cycle_pnl = np.zeros(max_slots)  # realised P&L after fees since the position was last flat
+
+    def apply_fill(self, slot: int, signed_quantity: int, price: float, fees: float):
+        """
+        Books a fill (positive quantity buys, negative sells).
+        Returns:
+            tuple: (realized delta, unrealized delta, margin delta, closed round-trip P&L or None).
+        """
+        position = int(self.quantity[slot])
+        average = float(self.average_price[slot])
+        new_position = position + signed_quantity
+
+        realized = 0.0
+        if position and (position > 0) != (signed_quantity > 0):
+            closed = min(abs(signed_quantity), abs(position))
+            realized = (price - average) * closed * (1 if position > 0 else -1)
+        if new_position == 0:
+            average = 0.0
+        elif position == 0 or (position > 0) != (new_position > 0):
+            average = price
+        elif (position > 0) == (signed_quantity > 0):
+            average = (average * abs(position) + price * abs(signed_quantity)) / abs(new_position)
+
+        mark = float(self.last_price[slot])
+        if math.isnan(mark):
+            mark = self.last_price[slot] = price
+        unrealized = (mark - average) * new_position if new_position else 0.0
+        margin = abs(new_position) * average * self.margin_rate
+        deltas = (realized, unrealized - float(self.unrealized[slot]), margin - float(self.margin[slot]))
+
+        self.quantity[slot] = new_position
+        self.average_price[slot] = average
+        self.realized[slot] += realized
+        self.unrealized[slot] = unrealized
+        self.fees[slot] += fees
+        self.margin[slot] = margin
+
+        cycle = float(self.cycle_pnl[slot]) + realized - fees
+        closed_cycle = None
+        if new_position == 0 or (position and (position > 0) != (new_position > 0)):
+            closed_cycle, cycle = cycle, 0.0
+        self.cycle_pnl[slot] = cycle
+        return deltas + (closed_cycle,)
+
+    def mark(self, slot: int, price: float) -> float:
+        """Sets the slot's last price. Returns the change in its unrealized P&L."""
+        self.last_price[slot] = price
+        position = self.quantity[slot]
+        if not position:
+            return 0.0
+        unrealized = (price - float(self.average_price[slot])) * int(position)
+        delta = unrealized - float(self.unrealized[slot])
+        self.unrealized[slot] = unrealized
+        return delta
+
+    def position(self, slot: int, symbol: str = None) -> Position:
+        return Position(slot, symbol, int(self.quantity[slot]), float(self.average_price[slot]),
+                        float(self.last_price[slot]), float(self.realized[slot]), float(self.unrealized[slot]),
+                        float(self.fees[slot]), float(self.margin[slot]))
+
+    def open_slots(self) -> np.ndarray:
+        """Slots holding a non-zero position."""
+        return np.flatnonzero(self.quantity)
+
+    def reset(self, slot: int = None):
+        """Clears one slot (or all) ahead of reuse for another instrument or a new session."""
+        index = slice(None) if slot is None else slot
+        for array in (self.quantity, self.average_price, self.realized, self.unrealized, self.fees, self.margin,
+                      self.cycle_pnl):
+            array[index] = 0
+        self.last_price[index] = np.nan
@@ -0,0 +1,101 @@
+# src/models/trade.py
+import numpy as np
+
+from src.models.enums import Side
+
+
+class Fill:
+    """One execution against an order (a SmartAPI trade book entry)."""
+    __slots__ = ('order_id', 'slot', 'symbol', 'side', 'quantity', 'price', 'fees', 'timestamp_ms')
+
+    def __init__(self, order_id, slot, symbol, side, quantity, price, fees, timestamp_ms):
+        self.order_id = order_id
+        self.slot = slot
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.fees = fees
+        self.timestamp_ms = timestamp_ms
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Fill({self.order_id} {self.side} {self.quantity} {self.symbol} @{self.price})"
+
+
+class TradeBlotter:
+    """
+    Append-only record of executions as parallel arrays (struct of arrays) instead of
+    one object per fill: about 40 bytes a trade, and columns such as turnover or fees
+    can be summed without touching Python objects. Order ids and symbols are not
+    stored; trades are keyed by slot, and fills are kept whole only by whoever needs them.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self.timestamp_ms = np.zeros(capacity, dtype=np.int64)
+        self.slot = np.zeros(capacity, dtype=np.int32)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.price = np.zeros(capacity)
+        self.fees = np.zeros(capacity)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        capacity = 2 * len(self.price)
+        for name in ('timestamp_ms', 'slot', 'side', 'quantity', 'price', 'fees'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def append(self, timestamp_ms: int, slot: int, side: Side, quantity: int, price: float, fees: float):
+        i = self._size
+        if i == len(self.price):
+            self._grow()
+        self.timestamp_ms[i] = timestamp_ms
+        self.slot[i] = slot
+        self.side[i] = side
+        self.quantity[i] = quantity
+        self.price[i] = price
+        self.fees[i] = fees
+        self._size = i + 1
+
+    def add_fill(self, fill):
+        """Fill listener form of append()."""
+        self.append(fill.timestamp_ms, fill.slot, fill.side, fill.quantity, fill.price, fill.fees)
+
+    def __getitem__(self, i):
+        """Trade i as a (timestamp_ms, slot, side, quantity, price, fees) tuple."""
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        return (int(self.timestamp_ms[i]), int(self.slot[i]), Side(int(self.side[i])), int(self.quantity[i]),
+                float(self.price[i]), float(self.fees[i]))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def column(self, name: str):
+        """A read-only view of one column, trimmed to the trades recorded."""
+        view = getattr(self, name)[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def signed_quantity(self):
+        return self.column('side') * self.column('quantity')
+
+    def turnover(self) -> float:
+        return float(np.dot(self.column('quantity'), self.column('price')))
+
+    def total_fees(self) -> float:
+        return float(self.column('fees').sum())
+
+    def clear(self):
+        self._size = 0
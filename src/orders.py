@@ -0,0 +1,381 @@
+# src/orders.py
+import heapq
+import itertools
+import logging
+from collections import deque
+
+from src.bar_aggregator import DAY_MS, IST_OFFSET_MS
+from src.clock import SystemClock
+from src.costs import IntradayEquityCharges
+from src.market_data_manager import F_ASK, F_ASK_QTY, F_BID, F_BID_QTY, F_LTP, F_TIMESTAMP
+from src.models.enums import OrderStatus, OrderType, ProductType, Side
+from src.models.order import Order
+from src.models.trade import Fill
+
+logger = logging.getLogger(__name__)
+
+# Order vocabulary follows the SmartAPI order book, int-coded (src.models.enums).
+BUY, SELL = Side.BUY, Side.SELL
+MARKET, LIMIT, STOPLOSS_LIMIT, STOPLOSS_MARKET = (OrderType.MARKET, OrderType.LIMIT, OrderType.STOPLOSS_LIMIT,
+                                                  OrderType.STOPLOSS_MARKET)
+INTRADAY = ProductType.INTRADAY
+STATUS_OPEN = OrderStatus.OPEN
+STATUS_TRIGGER_PENDING = OrderStatus.TRIGGER_PENDING
+STATUS_COMPLETE = OrderStatus.COMPLETE
+STATUS_CANCELLED = OrderStatus.CANCELLED
+STATUS_REJECTED = OrderStatus.REJECTED
+
+
+def _coerce(enum, value):
+    """value as a member of enum, or unchanged if it is not one (left for _validate to reject)."""
+    try:
+        return enum.parse(value)
+    except ValueError:
+        return value
+
+
+class _TokenBook:
+    """Open orders of one instrument, organised so a tick only has to look at the tops."""
+    __slots__ = ('market', 'buy_limits', 'sell_limits', 'buy_stops', 'sell_stops')
+
+    def __init__(self):
+        self.market = deque()   # market orders waiting for liquidity, FIFO
+        self.buy_limits = []    # heap of (-price, seq, order): best bid first
+        self.sell_limits = []   # heap of (price, seq, order): best offer first
+        self.buy_stops = []     # heap of (trigger, seq, order): lowest trigger fires first on a rise
+        self.sell_stops = []    # heap of (-trigger, seq, order): highest trigger fires first on a fall
+
+
+class PaperTradingEngine:
+    """
+    In-process order simulator for paper trading.
+
+    Supports MARKET, LIMIT, STOPLOSS_LIMIT (SL) and STOPLOSS_MARKET (SL-M) orders matched
+    against the live best bid/ask and their quantities from MarketDataManager. A tick
+    offers its displayed quantity once, so large orders fill partially over several ticks.
+    In LTP-only feeds (no depth) orders fill at the last traded price without a size limit.
+
+    Open orders are kept in a per-instrument book indexed by market data slot, with
+    heaps for limit prices and stop triggers. A tick only touches the book of its own
+    instrument and only looks at the top of each heap, so matching cost per tick does
+    not grow with the number of resting orders. Cancelled orders are removed lazily.
+
+    From `square_off_ms` (IST, milliseconds after midnight) onwards the engine cancels
+    open intraday orders and flattens intraday positions with market orders, once per day.
+    """
+
+    def __init__(self, market_data, clock=None, charges=None, square_off_ms: int = (15 * 3600 + 15 * 60) * 1000,
+                 slippage=None):
+        """
+        Args:
+            market_data (MarketDataManager): Source of best bid/ask; the engine registers as a tick listener.
+            clock: Time source (SystemClock by default, SimulatedClock for replays).
+            charges (callable): Charges model from src.costs applied to each fill.
+            square_off_ms (int): Intraday auto square-off time, ms after IST midnight; None disables it.
+            slippage (callable): Slippage model from src.costs applied to market (and SL-M) fills,
+                e.g. for backtests on bars that carry no spread; None fills at the quote.
+        """
+        self.market_data = market_data
+        self.clock = clock or SystemClock()
+        self.charges = charges or IntradayEquityCharges()
+        self.slippage = slippage
+        self.square_off_ms = square_off_ms
+        max_slots = market_data.store.max_slots
+        self._books = [None] * max_slots
+        self._orders = {}
+        self._net_quantity = [0] * max_slots  # intraday position per slot, from fills
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._fill_listeners = []
+        self._order_listeners = []
+        self._squared_off_day = None
+        market_data.add_tick_listener(self.on_tick)
+
+    # --- Listeners -------------------------------------------------------------------
+
+    def add_fill_listener(self, callback):
+        """Registers callback(fill) for every execution."""
+        self._fill_listeners.append(callback)
+
+    def add_order_listener(self, callback):
+        """Registers callback(order) for every order state change."""
+        self._order_listeners.append(callback)
+
+    def _notify(self, order):
+        for callback in self._order_listeners:
+            callback(order)
+
+    # --- Order entry -----------------------------------------------------------------
+
+    def place_order(self, instrument: dict, side: Side, quantity: int, order_type: OrderType = MARKET,
+                    price: float = 0.0, trigger_price: float = 0.0, product: ProductType = INTRADAY,
+                    tag: str = None) -> Order:
+        """
+        Accepts an order (or rejects it with a reason) and matches it right away if the
+        current quote allows.
+        Args:
+            instrument (dict): {'symbol', 'token', 'exchange'}; must be subscribed in MarketDataManager.
+            side (Side): BUY or SELL (the SmartAPI strings are accepted too, as for the other enums).
+            quantity (int): Shares.
+            order_type (OrderType): MARKET, LIMIT, STOPLOSS_LIMIT or STOPLOSS_MARKET.
+            price (float): Limit price (LIMIT and STOPLOSS_LIMIT).
+            trigger_price (float): Trigger price (STOPLOSS_LIMIT and STOPLOSS_MARKET).
+            product (ProductType): Product type; INTRADAY positions are auto squared off.
+            tag (str): Free-form label carried on the order.
+        Returns:
+            Order: The order, with status REJECTED and a reason if it was not accepted.
+        """
+        now = self.clock.now_ms()
+        slot = self.market_data.slot_for(instrument['exchange'], instrument['token'])
+        order = Order(f"PAPER{next(self._ids):08d}", slot, instrument, _coerce(Side, side),
+                      _coerce(OrderType, order_type), int(quantity), float(price), float(trigger_price),
+                      _coerce(ProductType, product), now, tag)
+        self._orders[order.order_id] = order
+
+        reason = self._validate(order)
+        if reason:
+            order.status = STATUS_REJECTED
+            order.reason = reason
+            logger.warning(f"Paper order rejected: {order} ({reason})")
+            self._notify(order)
+            return order
+
+        if order.order_type in (STOPLOSS_LIMIT, STOPLOSS_MARKET):
+            order.status = STATUS_TRIGGER_PENDING
+        self._book(slot, order)
+        self._notify(order)
+        self._match(slot, now)
+        return order
+
+    @staticmethod
+    def _validate(order):
+        if order.slot is None:
+            return "instrument is not subscribed to market data"
+        if not isinstance(order.side, Side):
+            return f"invalid side {order.side}"
+        if order.quantity <= 0:
+            return "quantity must be positive"
+        if not isinstance(order.order_type, OrderType):
+            return f"invalid order type {order.order_type}"
+        if order.order_type in (LIMIT, STOPLOSS_LIMIT) and order.price <= 0:
+            return "limit price must be positive"
+        if order.order_type in (STOPLOSS_LIMIT, STOPLOSS_MARKET) and order.trigger_price <= 0:
+            return "trigger price must be positive"
+        return None
+
+    def _book(self, slot, order):
+        book = self._books[slot]
+        if book is None:
+            book = self._books[slot] = _TokenBook()
+        seq = next(self._seq)
+        if order.status == STATUS_TRIGGER_PENDING:
+            if order.side == BUY:
+                heapq.heappush(book.buy_stops, (order.trigger_price, seq, order))
+            else:
+                heapq.heappush(book.sell_stops, (-order.trigger_price, seq, order))
+        elif order.order_type in (MARKET, STOPLOSS_MARKET):
+            book.market.append(order)
+        elif order.side == BUY:
+            heapq.heappush(book.buy_limits, (-order.price, seq, order))
+        else:
+            heapq.heappush(book.sell_limits, (order.price, seq, order))
+
+    def modify_order(self, order_id: str, quantity: int = None, price: float = None,
+                     trigger_price: float = None) -> bool:
+        """
+        Changes an active order's quantity, price and/or trigger. The order loses its
+        queue position, as on the exchange.
+        Returns:
+            bool: True if the order was active and modified.
+        """
+        order = self._orders.get(order_id)
+        if order is None or not order.is_active:
+            return False
+        if quantity is not None and quantity <= order.filled_quantity:
+            logger.warning(f"Cannot reduce {order_id} to {quantity}; {order.filled_quantity} already filled.")
+            return False
+        # Re-book a fresh copy; the old heap entries become stale and are skipped lazily.
+        replacement = Order(order.order_id, order.slot, order.instrument, order.side, order.order_type,
+                            order.quantity if quantity is None else int(quantity),
+                            order.price if price is None else float(price),
+                            order.trigger_price if trigger_price is None else float(trigger_price),
+                            order.product, order.created_ms, order.tag)
+        replacement.status = order.status
+        replacement.filled_quantity = order.filled_quantity
+        replacement.average_price = order.average_price
+        replacement.updated_ms = self.clock.now_ms()
+        order.status = STATUS_CANCELLED  # marks the old heap entries stale
+        self._orders[order_id] = replacement
+        self._book(replacement.slot, replacement)
+        self._notify(replacement)
+        self._match(replacement.slot, replacement.updated_ms)
+        return True
+
+    def cancel_order(self, order_id: str) -> bool:
+        """Cancels an active order. Returns True if it was active."""
+        order = self._orders.get(order_id)
+        if order is None or not order.is_active:
+            return False
+        order.status = STATUS_CANCELLED
+        order.updated_ms = self.clock.now_ms()
+        self._notify(order)
+        return True
+
+    def cancel_all(self, slot: int = None) -> int:
+        """Cancels every active order (optionally only for one slot). Returns the number cancelled."""
+        if slot is None:
+            orders = list(self._orders.values())
+        else:
+            # Only the slot's book can hold its active orders; done orders there are skipped below.
+            book = self._books[slot]
+            if book is None:
+                return 0
+            orders = list(book.market)
+            for heap in (book.buy_limits, book.sell_limits, book.buy_stops, book.sell_stops):
+                orders.extend(entry[2] for entry in heap)
+        cancelled = 0
+        for order in orders:
+            if order.is_active and self._orders.get(order.order_id) is order:
+                cancelled += self.cancel_order(order.order_id)
+        return cancelled
+
+    def reset(self, slot: int):
+        """
+        Forgets a slot's book and intraday position ahead of its reuse for another
+        instrument; cancel_all(slot) first so its orders are closed out and notified.
+        """
+        self._books[slot] = None
+        self._net_quantity[slot] = 0
+
+    def order(self, order_id: str) -> Order:
+        return self._orders.get(order_id)
+
+    def open_orders(self) -> list:
+        return [order for order in self._orders.values() if order.is_active]
+
+    def net_quantity(self, slot: int) -> int:
+        """Net intraday position of a slot from paper fills."""
+        return self._net_quantity[slot]
+
+    # --- Matching --------------------------------------------------------------------
+
+    def on_tick(self, slot: int):
+        """MarketDataManager tick listener."""
+        if self.square_off_ms is not None:
+            now = self.clock.now_ms()
+            local = now + IST_OFFSET_MS
+            day = local // DAY_MS
+            if local - day * DAY_MS >= self.square_off_ms and day != self._squared_off_day:
+                self._squared_off_day = day
+                self.square_off()
+        if self._books[slot] is not None:
+            self._match(slot, None)
+
+    def _match(self, slot, now):
+        book = self._books[slot]
+        tick = self.market_data.store.latest(slot)
+        if book is None or tick is None:
+            return
+        ltp = float(tick[F_LTP])
+        bid, ask = float(tick[F_BID]), float(tick[F_ASK])
+        bid_qty, ask_qty = int(tick[F_BID_QTY]), int(tick[F_ASK_QTY])
+        depth = bool(bid_qty or ask_qty)
+        # Liquidity this tick can offer each side; unlimited at LTP without depth data.
+        liquidity = {BUY: ask_qty if depth else None, SELL: bid_qty if depth else None}
+        prices = {BUY: ask if depth and ask > 0 else ltp, SELL: bid if depth and bid > 0 else ltp}
+        if now is None:
+            now = int(tick[F_TIMESTAMP]) or self.clock.now_ms()
+
+        # 1. Stops whose trigger the last traded price has reached become live orders.
+        while book.buy_stops and (book.buy_stops[0][2].status != STATUS_TRIGGER_PENDING
+                                  or book.buy_stops[0][0] <= ltp):
+            _, _, order = heapq.heappop(book.buy_stops)
+            self._trigger(slot, order, now)
+        while book.sell_stops and (book.sell_stops[0][2].status != STATUS_TRIGGER_PENDING
+                                   or -book.sell_stops[0][0] >= ltp):
+            _, _, order = heapq.heappop(book.sell_stops)
+            self._trigger(slot, order, now)
+
+        # 2. Market orders, oldest first.
+        while book.market:
+            order = book.market[0]
+            if not order.is_active:
+                book.market.popleft()
+                continue
+            if not self._execute(order, prices[order.side], liquidity, now):
+                break
+            if not order.is_active:
+                book.market.popleft()
+
+        # 3. Marketable limits, best price first.
+        while book.buy_limits:
+            order = book.buy_limits[0][2]
+            if not order.is_active:
+                heapq.heappop(book.buy_limits)
+                continue
+            if order.price < prices[BUY] or not self._execute(order, prices[BUY], liquidity, now):
+                break
+            if not order.is_active:
+                heapq.heappop(book.buy_limits)
+        while book.sell_limits:
+            order = book.sell_limits[0][2]
+            if not order.is_active:
+                heapq.heappop(book.sell_limits)
+                continue
+            if order.price > prices[SELL] or not self._execute(order, prices[SELL], liquidity, now):
+                break
+            if not order.is_active:
+                heapq.heappop(book.sell_limits)
+
+    def _trigger(self, slot, order, now):
+        if order.status != STATUS_TRIGGER_PENDING:
+            return  # stale entry (cancelled or modified)
+        order.status = STATUS_OPEN
+        order.updated_ms = now
+        self._book(slot, order)
+        self._notify(order)
+
+    def _execute(self, order, price, liquidity, now) -> bool:
+        """Fills as much of order as this tick's liquidity allows. Returns False if nothing was filled."""
+        available = liquidity[order.side]
+        quantity = order.pending_quantity if available is None else min(order.pending_quantity, available)
+        if quantity <= 0:
+            return False
+        if available is not None:
+            liquidity[order.side] = available - quantity
+        if self.slippage is not None and order.order_type in (MARKET, STOPLOSS_MARKET):
+            price = self.slippage(order.side, price, quantity)
+        fees = self.charges(order.side, price, quantity)
+        filled = order.filled_quantity + quantity
+        order.average_price = (order.average_price * order.filled_quantity + price * quantity) / filled
+        order.filled_quantity = filled
+        order.updated_ms = now
+        if filled == order.quantity:
+            order.status = STATUS_COMPLETE
+        if order.product == INTRADAY:
+            self._net_quantity[order.slot] += order.side * quantity
+        fill = Fill(order.order_id, order.slot, order.symbol, order.side, quantity, price, fees, now)
+        for callback in self._fill_listeners:
+            callback(fill)
+        self._notify(order)
+        return True
+
+    # --- Square-off ------------------------------------------------------------------
+
+    def square_off(self) -> int:
+        """
+        Cancels all open intraday orders and sends market orders to flatten every
+        intraday position. Returns the number of square-off orders placed.
+        """
+        for order in list(self._orders.values()):
+            if order.is_active and order.product == INTRADAY:
+                self.cancel_order(order.order_id)
+        placed = 0
+        for slot, quantity in enumerate(self._net_quantity):
+            instrument = self.market_data.instrument(slot)
+            if quantity and instrument is not None:
+                self.place_order(instrument, SELL if quantity > 0 else BUY, abs(quantity), tag='square-off')
+                placed += 1
+        if placed:
+            logger.info(f"Paper square-off placed {placed} orders.")
+        return placed
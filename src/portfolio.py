@@ -0,0 +1,153 @@
+# src/portfolio.py
+import logging
+
+from src.market_data_manager import F_LTP
+from src.models.position import PositionBook
+
+logger = logging.getLogger(__name__)
+
+
+class Portfolio:
+    """
+    Account-level mark-to-market state: positions, realized/unrealized P&L, charges,
+    margin used and available funds.
+
+    Positions live in a PositionBook (arrays indexed by market data slot). Each fill and
+    each tick updates only its own slot, and the account totals are adjusted by the
+    change that update made, so snapshot() is O(1) no matter how many positions are open.
+    resync() recomputes the totals from the book (e.g. at end of day) to shed any
+    floating-point drift.
+    """
+
+    def __init__(self, funds_available: float, max_slots: int = 512, margin_rate: float = 0.2, market_data=None):
+        """
+        Args:
+            funds_available (float): Starting funds (ConfigManager.funds_available).
+            max_slots (int): Instrument slots; must cover MarketDataManager.max_tokens.
+            margin_rate (float): Fraction of intraday position value blocked as margin (0.2 = 5x leverage).
+            market_data (MarketDataManager): If given, positions are marked on its ticks.
+        """
+        self.funds = float(funds_available)
+        self.book = PositionBook(max_slots, margin_rate)
+        self.market_data = market_data
+        self.realized_pnl = 0.0
+        self.unrealized_pnl = 0.0
+        self.fees = 0.0
+        self.margin_used = 0.0
+        self.open_positions = 0
+        self.round_trips = []  # realised P&L (after fees) of each position from open to flat
+        self._fill_listeners = []
+        if market_data is not None:
+            market_data.add_tick_listener(self.on_tick)
+
+    def add_fill_listener(self, callback):
+        """Registers callback(fill, position) called after a fill has been booked."""
+        self._fill_listeners.append(callback)
+
+    # --- Updates ---------------------------------------------------------------------
+
+    def on_fill(self, fill):
+        """Books an execution (src.models.trade.Fill or anything with slot/side (Side)/quantity/price/fees)."""
+        slot = fill.slot
+        signed = fill.side * fill.quantity
+        was_open = bool(self.book.quantity[slot])
+        realized, unrealized, margin, closed_cycle = self.book.apply_fill(slot, signed, fill.price, fill.fees)
+        self.realized_pnl += realized
+        self.unrealized_pnl += unrealized
+        self.margin_used += margin
+        self.fees += fill.fees
+        self.open_positions += bool(self.book.quantity[slot]) - was_open
+        if closed_cycle is not None:
+            self.round_trips.append(closed_cycle)
+        if self._fill_listeners:
+            position = self.position(slot)
+            for callback in self._fill_listeners:
+                callback(fill, position)
+
+    def mark(self, slot: int, price: float):
+        """Marks one instrument at price."""
+        self.unrealized_pnl += self.book.mark(slot, price)
+
+    def on_tick(self, slot: int):
+        """MarketDataManager tick listener: marks the ticking instrument at its LTP."""
+        self.unrealized_pnl += self.book.mark(slot, float(self.market_data.store.latest(slot)[F_LTP]))
+
+    def resync(self):
+        """Recomputes the account totals from the position book."""
+        book = self.book
+        self.realized_pnl = float(book.realized.sum())
+        self.unrealized_pnl = float(book.unrealized.sum())
+        self.fees = float(book.fees.sum())
+        self.margin_used = float(book.margin.sum())
+        self.open_positions = int(len(book.open_slots()))
+
+    def reset(self, slot: int):
+        """
+        Clears one slot ahead of its reuse for another instrument. The slot's realised P&L
+        net of charges moves into funds, so equity is unchanged; an open position there is
+        dropped from the book (and logged), as it can no longer be marked or exited.
+        """
+        book = self.book
+        quantity = int(book.quantity[slot])
+        if quantity:
+            logger.warning(f"Slot {slot} reassigned with {quantity} still open; dropping the position from the book.")
+        realized, unrealized, fees = float(book.realized[slot]), float(book.unrealized[slot]), float(book.fees[slot])
+        self.funds += realized - fees
+        self.realized_pnl -= realized
+        self.unrealized_pnl -= unrealized
+        self.fees -= fees
+        self.margin_used -= float(book.margin[slot])
+        self.open_positions -= bool(quantity)
+        book.reset(slot)
+
+    def start_session(self):
+        """
+        Rolls realised P&L into funds and clears the book for a new trading day. Skipped
+        while positions are open, so their cost basis and P&L stay in the book.
+        """
+        if self.open_positions:
+            logger.warning(f"Not rolling the portfolio over: {self.open_positions} positions are still open, "
+                           f"so the previous session's book and P&L carry over.")
+            return
+        self.funds = self.equity()
+        self.book.reset()
+        self.realized_pnl = self.unrealized_pnl = self.fees = self.margin_used = 0.0
+
+    # --- Queries ---------------------------------------------------------------------
+
+    def quantity(self, slot: int) -> int:
+        return int(self.book.quantity[slot])
+
+    def equity(self) -> float:
+        """Funds plus realised and unrealised P&L, net of charges."""
+        return self.funds + self.realized_pnl - self.fees + self.unrealized_pnl
+
+    def available_funds(self) -> float:
+        """Funds free for new positions: equity less blocked margin, with unrealised profits not counted."""
+        return self.funds + self.realized_pnl - self.fees + min(self.unrealized_pnl, 0.0) - self.margin_used
+
+    def margin_required(self, quantity: int, price: float) -> float:
+        """Margin a new position of quantity at price would block."""
+        return abs(quantity) * price * self.book.margin_rate
+
+    def position(self, slot: int):
+        instrument = self.market_data.instrument(slot) if self.market_data is not None else None
+        return self.book.position(slot, instrument['symbol'] if instrument else None)
+
+    def positions(self) -> list:
+        """Open positions (for the UI); O(open positions)."""
+        return [self.position(int(slot)) for slot in self.book.open_slots()]
+
+    def snapshot(self) -> dict:
+        """Account totals; O(1), cheap enough to call on every risk check or UI refresh."""
+        return {
+            'funds': self.funds,
+            'realized_pnl': self.realized_pnl,
+            'unrealized_pnl': self.unrealized_pnl,
+            'fees': self.fees,
+            'net_pnl': self.realized_pnl + self.unrealized_pnl - self.fees,
+            'margin_used': self.margin_used,
+            'available_funds': self.available_funds(),
+            'equity': self.equity(),
+            'open_positions': self.open_positions,
+        }
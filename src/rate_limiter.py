@@ -0,0 +1,156 @@
+# src/rate_limiter.py
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    The bucket holds at most `capacity` tokens and refills continuously at `rate`
+    tokens per second. Callers block in acquire() only for as long as needed for
+    enough tokens to become available, so bursts up to `capacity` go out immediately
+    and sustained traffic is smoothed to `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Tokens added per second (e.g. the broker's requests/second limit).
+            capacity (float): Maximum burst size. Defaults to rate.
+            clock (callable): Monotonic time source, overridable for simulations.
+        """
+        if rate <= 0:
+            raise ValueError("TokenBucket rate must be positive.")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+        self.wait_count = 0      # Number of acquire() calls that had to wait
+        self.wait_seconds = 0.0  # Total time spent waiting
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Takes tokens if they are available right now. Never blocks."""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Blocks until `tokens` tokens are available and takes them.
+        Args:
+            tokens (float): Number of tokens to take. Must not exceed capacity.
+            timeout (float): Maximum seconds to wait, or None to wait indefinitely.
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first.
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}.")
+        deadline = None if timeout is None else self._clock() + timeout
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    if waited:
+                        self.wait_count += 1
+                        self.wait_seconds += waited
+                    return True
+                delay = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            waited += delay
+
+
+class SlidingWindowLimiter:
+    """
+    Thread-safe limiter that never grants more than `rate` calls in any `period`
+    seconds, the way a broker counts requests against its per-second limit.
+
+    The grant times of the last `rate` calls are kept; a call waits until the oldest of
+    them has left the window. Unlike a TokenBucket there is no burst on top of the
+    limit, so a cold start cannot send more than the broker accepts.
+    """
+
+    def __init__(self, rate: float, period: float = 1.0, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Calls allowed per period (e.g. the broker's requests/second limit).
+                Below 1 it means one call every period / rate seconds; above 1 a fraction is
+                dropped, so no window ever holds more than `rate` calls.
+            period (float): Window length in seconds.
+            clock (callable): Monotonic time source, overridable for simulations.
+        """
+        if rate <= 0:
+            raise ValueError("SlidingWindowLimiter rate must be positive.")
+        self.rate = max(int(rate), 1)
+        self.period = float(period) if rate >= 1 else period / rate
+        self._clock = clock
+        self._grants = deque()
+        self._lock = threading.Lock()
+        self.wait_count = 0      # Number of acquire() calls that had to wait
+        self.wait_seconds = 0.0  # Total time spent waiting
+
+    def _delay(self, now):
+        """Seconds until a call may go out at `now` (0 if it can go now)."""
+        grants = self._grants
+        while grants and grants[0] <= now - self.period:
+            grants.popleft()
+        if len(grants) < self.rate:
+            return 0.0
+        return grants[0] + self.period - now
+
+    def try_acquire(self) -> bool:
+        """Takes a call slot if one is free right now. Never blocks."""
+        with self._lock:
+            now = self._clock()
+            if self._delay(now):
+                return False
+            self._grants.append(now)
+            return True
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Blocks until a call fits in the window and records it.
+        Args:
+            timeout (float): Maximum seconds to wait, or None to wait indefinitely.
+        Returns:
+            bool: True if the call may go out, False if the timeout expired first.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                delay = self._delay(now)
+                if not delay:
+                    self._grants.append(now)
+                    if waited:
+                        self.wait_count += 1
+                        self.wait_seconds += waited
+                    return True
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,272 @@
+# src/risk_manager.py
+import logging
+import math
+
+import numpy as np
+
+from src.metrics import ACK, METRICS, ORDER_SEND, RISK_CHECK
+from src.models.enums import OrderStatus, OrderType, Side
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RISK_LIMITS = {
+    # Per order
+    'max_order_quantity': 5000,
+    'max_order_value': 100000.0,
+    # Per symbol: value of the position after the order, counting unfilled orders on the same side.
+    'max_position_value': 50000.0,
+    # Portfolio
+    'max_gross_exposure': 300000.0,
+    'max_daily_loss': 3000.0,
+    'max_open_orders': 50,
+}
+
+
+class RiskManager:
+    """
+    Pre-trade risk gate between strategy signals and an order gateway
+    (PaperTradingEngine, or anything with place_order()/cancel_all()).
+
+    Every order is checked against quantity and notional caps, per-symbol position
+    value, portfolio gross exposure, the day's loss limit, the open-order limit and the
+    instrument's price band (circuit limits). Per-symbol limits are precomputed into
+    arrays indexed by market data slot, and all running figures (open orders, unfilled
+    quantity per side, exposure) are kept current from order and fill events, so a
+    check is a handful of array reads and comparisons.
+
+    When the day's loss limit is breached the kill switch trips: every open order is
+    cancelled with one cancel_all() call and only orders that reduce a position (without
+    reversing it) are accepted until the switch is cleared, so positions can still be exited.
+    """
+
+    def __init__(self, portfolio, order_gateway=None, market_data=None, limits: dict = None, max_slots: int = 512):
+        """
+        Args:
+            portfolio (Portfolio): Source of positions and P&L; fills are followed through it.
+            order_gateway: Receives orders that pass (place_order) and the kill switch (cancel_all).
+            market_data (MarketDataManager): If given, the loss limit is also checked on every tick.
+            limits (dict): Overrides for DEFAULT_RISK_LIMITS.
+            max_slots (int): Instrument slots; must match the portfolio's.
+        """
+        self.portfolio = portfolio
+        self.order_gateway = order_gateway
+        self.limits = p = {**DEFAULT_RISK_LIMITS, **(limits or {})}
+        self.max_order_quantity = np.full(max_slots, p['max_order_quantity'], dtype=np.int64)
+        self.max_order_value = np.full(max_slots, p['max_order_value'])
+        self.max_position_value = np.full(max_slots, p['max_position_value'])
+        self.lower_band = np.full(max_slots, -np.inf)
+        self.upper_band = np.full(max_slots, np.inf)
+        self.max_gross_exposure = p['max_gross_exposure']
+        self.max_daily_loss = p['max_daily_loss']
+        self.max_open_orders = p['max_open_orders']
+
+        self.open_orders = 0
+        self.pending_buy = np.zeros(max_slots, dtype=np.int64)
+        self.pending_sell = np.zeros(max_slots, dtype=np.int64)
+        self._order_pending = {}  # order_id -> (slot, side, unfilled quantity counted in pending_*)
+        self.exposure = np.zeros(max_slots)
+        self.gross_exposure = 0.0
+        self.halted = False
+        self.halt_reason = None
+        self.rejections = 0
+        self._session_start_equity = portfolio.equity()
+
+        portfolio.add_fill_listener(self.on_fill)
+        if order_gateway is not None and hasattr(order_gateway, 'add_order_listener'):
+            order_gateway.add_order_listener(self.on_order)
+        self.market_data = market_data
+        if market_data is not None:
+            market_data.add_tick_listener(self.on_tick)
+
+    # --- Limits ----------------------------------------------------------------------
+
+    def set_symbol_limits(self, slot: int, max_order_quantity: int = None, max_order_value: float = None,
+                          max_position_value: float = None):
+        """Overrides the default limits for one instrument."""
+        if max_order_quantity is not None:
+            self.max_order_quantity[slot] = max_order_quantity
+        if max_order_value is not None:
+            self.max_order_value[slot] = max_order_value
+        if max_position_value is not None:
+            self.max_position_value[slot] = max_position_value
+
+    def set_price_band(self, slot: int, lower: float, upper: float):
+        """Sets the circuit limits orders for a slot must price within."""
+        self.lower_band[slot] = lower if lower else -np.inf
+        self.upper_band[slot] = upper if upper else np.inf
+
+    def load_circuit_limits(self, quotes: dict):
+        """
+        Sets price bands from FULL-mode quotes keyed by (exchange, token), as returned by
+        AngelOneAPI.get_market_data_batch. Instruments not subscribed in market data are skipped.
+        """
+        for (exchange, token), quote in quotes.items():
+            slot = self.market_data.slot_for(exchange, token) if self.market_data is not None else None
+            if slot is not None and quote:
+                self.set_price_band(slot, quote.get('lowerCircuit'), quote.get('upperCircuit'))
+
+    def reset(self, slot: int):
+        """
+        Restores a slot's default limits and clears its running figures ahead of its reuse
+        for another instrument (after the gateway's cancel_all(slot) and Portfolio.reset(slot)).
+        """
+        p = self.limits
+        self.max_order_quantity[slot] = p['max_order_quantity']
+        self.max_order_value[slot] = p['max_order_value']
+        self.max_position_value[slot] = p['max_position_value']
+        self.lower_band[slot] = -np.inf
+        self.upper_band[slot] = np.inf
+        for order_id, (order_slot, _, _) in list(self._order_pending.items()):
+            if order_slot == slot:
+                del self._order_pending[order_id]
+                self.open_orders -= 1
+        self.pending_buy[slot] = self.pending_sell[slot] = 0
+        self.gross_exposure -= self.exposure[slot]
+        self.exposure[slot] = 0.0
+
+    # --- Running counters ------------------------------------------------------------
+
+    def on_order(self, order):
+        """Order gateway listener: tracks open orders and their unfilled quantity per side."""
+        previous = self._order_pending.get(order.order_id)
+        if previous is not None:
+            slot, side, quantity = previous
+            (self.pending_buy if side == Side.BUY else self.pending_sell)[slot] -= quantity
+        elif order.is_active:
+            self.open_orders += 1
+        if order.is_active:
+            quantity = order.pending_quantity
+            (self.pending_buy if order.side == Side.BUY else self.pending_sell)[order.slot] += quantity
+            self._order_pending[order.order_id] = (order.slot, order.side, quantity)
+        elif previous is not None:
+            del self._order_pending[order.order_id]
+            self.open_orders -= 1
+
+    def on_fill(self, fill, position):
+        """Portfolio fill listener: updates the slot's exposure and the portfolio total."""
+        exposure = abs(position.quantity) * position.average_price
+        self.gross_exposure += exposure - self.exposure[fill.slot]
+        self.exposure[fill.slot] = exposure
+        self._check_loss()
+
+    def on_tick(self, slot: int):
+        """MarketDataManager tick listener: trips the kill switch as soon as the loss limit is hit."""
+        if not self.halted:
+            self._check_loss()
+
+    def _check_loss(self):
+        session_pnl = self.portfolio.equity() - self._session_start_equity
+        if session_pnl <= -self.max_daily_loss and not self.halted:
+            self.kill_switch(f"daily loss limit of {self.max_daily_loss:.2f} reached")
+
+    # --- Checks ----------------------------------------------------------------------
+
+    def check(self, slot: int, side: Side, quantity: int, price: float = 0.0) -> str:
+        """
+        Pre-trade check of one order. price is the limit price; 0 (market orders) uses the last price.
+        Returns:
+            str: The reason the order is refused, or None if it may be sent.
+        """
+        position = self.portfolio.book.quantity[slot]
+        if side == Side.BUY:
+            after = position + self.pending_buy[slot] + quantity
+        else:
+            after = position - self.pending_sell[slot] - quantity
+        if self.halted and not (abs(after) < abs(position) and after * position >= 0):
+            return f"trading halted: {self.halt_reason}"
+        if quantity > self.max_order_quantity[slot]:
+            return f"quantity {quantity} above limit {self.max_order_quantity[slot]}"
+        if not price:
+            price = self.portfolio.book.last_price[slot]
+            if math.isnan(price):
+                return "no price to value a market order"
+        elif not self.lower_band[slot] <= price <= self.upper_band[slot]:
+            return f"price {price} outside band {self.lower_band[slot]}-{self.upper_band[slot]}"
+        value = quantity * price
+        if value > self.max_order_value[slot]:
+            return f"order value {value:.2f} above limit {self.max_order_value[slot]:.2f}"
+        if self.open_orders >= self.max_open_orders:
+            return f"{self.open_orders} open orders (limit {self.max_open_orders})"
+        if abs(after) > abs(position):  # Orders that reduce a position are always allowed.
+            position_value = abs(after) * price
+            if position_value > self.max_position_value[slot]:
+                return f"position value {position_value:.2f} above limit {self.max_position_value[slot]:.2f}"
+            gross = self.gross_exposure - self.exposure[slot] + position_value
+            if gross > self.max_gross_exposure:
+                return f"gross exposure {gross:.2f} above limit {self.max_gross_exposure:.2f}"
+        return None
+
+    def place_order(self, instrument: dict, side: Side, quantity: int, order_type: OrderType = OrderType.MARKET,
+                    price: float = 0.0, trigger_price: float = 0.0, **kwargs):
+        """
+        Checks an order and forwards it to the order gateway if it passes.
+        Returns:
+            The gateway's result, or None if the order was refused.
+        """
+        market_data = self.market_data
+        slot = market_data.slot_for(instrument['exchange'], instrument['token']) if market_data is not None else None
+        if slot is None:
+            logger.warning(f"Risk: refusing {side} {quantity} {instrument['symbol']}: not subscribed to market data.")
+            self.rejections += 1
+            return None
+        side = Side.parse(side)
+        reason = self.check(slot, side, quantity, price or trigger_price)
+        if METRICS.enabled:
+            METRICS.stage(RISK_CHECK, slot)
+        if reason:
+            logger.warning(f"Risk: refusing {side} {quantity} {instrument['symbol']}: {reason}.")
+            self.rejections += 1
+            return None
+        if METRICS.enabled:
+            METRICS.stage(ORDER_SEND, slot)
+        result = self.order_gateway.place_order(instrument, side, quantity, order_type, price, trigger_price, **kwargs)
+        if METRICS.enabled and result is not None and getattr(result, 'status', None) != OrderStatus.REJECTED:
+            METRICS.stage(ACK, slot)
+        return result
+
+    def submit_target(self, signal):
+        """
+        Strategy signal listener: orders the difference between the signal's target and
+        the current position through place_order(). Unfilled orders for the instrument
+        are cancelled first; the new target replaces them.
+        Returns:
+            The gateway's result, or None if no order was needed or it was refused.
+        """
+        instrument = self.market_data.instrument(signal.slot) if self.market_data is not None else None
+        if instrument is None:
+            return None
+        self.order_gateway.cancel_all(signal.slot)
+        delta = signal.target_quantity - self.portfolio.quantity(signal.slot)
+        if not delta:
+            return None
+        logger.info(f"Signal {signal}: {'BUY' if delta > 0 else 'SELL'} {abs(delta)} {instrument['symbol']}.")
+        return self.place_order(instrument, Side.BUY if delta > 0 else Side.SELL, abs(delta), tag=signal.reason)
+
+    # --- Kill switch -----------------------------------------------------------------
+
+    def kill_switch(self, reason: str = "manual", square_off: bool = False) -> int:
+        """
+        Halts trading and cancels every open order in one cancel_all() call; optionally
+        flattens positions too (gateways that support square_off()).
+        Returns:
+            int: Number of orders cancelled.
+        """
+        self.halted = True
+        self.halt_reason = reason
+        cancelled = 0
+        if self.order_gateway is not None:
+            cancelled = self.order_gateway.cancel_all() or 0
+            if square_off and hasattr(self.order_gateway, 'square_off'):
+                self.order_gateway.square_off()
+        logger.critical(f"Risk kill switch: {reason}. Cancelled {cancelled} open orders.")
+        return cancelled
+
+    def resume(self):
+        """Clears the kill switch."""
+        self.halted = False
+        self.halt_reason = None
+
+    def start_session(self):
+        """Clears the kill switch and measures the daily loss limit from the current equity."""
+        self._session_start_equity = self.portfolio.equity()
+        self.resume()
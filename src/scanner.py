@@ -0,0 +1,259 @@
+# src/scanner.py
+import datetime
+import logging
+import operator
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.database_manager import parse_candles
+
+logger = logging.getLogger(__name__)
+
+# Daily history is held as one (fields, symbols, days) float64 block.
+HISTORY_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+(H_OPEN, H_HIGH, H_LOW, H_CLOSE, H_VOLUME) = range(len(HISTORY_FIELDS))
+
+_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+              '==': operator.eq, '!=': operator.ne}
+_CLAUSE = re.compile(r'^\s*(?:(-?[\d.]+)\s*(<=|<|>=|>)\s*)?([a-z_][a-z0-9_]*)\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+)\s*$')
+
+
+def parse_expression(expression: str) -> list:
+    """
+    Parses a filter expression such as "gap_pct > 2 and rel_volume >= 1.5 and 50 <= close <= 2000"
+    into a list of (column, operator, value) clauses that are ANDed together.
+    """
+    clauses = []
+    for part in re.split(r'\s+and\s+', expression.strip(), flags=re.IGNORECASE):
+        match = _CLAUSE.match(part)
+        if not match:
+            raise ValueError(f"Cannot parse screener clause '{part}'.")
+        low, low_op, column, op, value = match.groups()
+        if low is not None:
+            # "a < column" is the same as "column > a".
+            mirrored = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}[low_op]
+            clauses.append((column, _OPERATORS[mirrored], float(low)))
+        clauses.append((column, _OPERATORS[op], float(value)))
+    return clauses
+
+
+class StockScanner:
+    """
+    Vectorised stock screener over the whole NSE equity universe.
+
+    Daily OHLCV for every symbol is loaded into a contiguous (fields, symbols, days)
+    array, right-aligned so the last column is the most recent completed session
+    (shorter histories are NaN-padded on the left). Today's live values are kept in
+    separate per-symbol arrays.
+
+    Derived columns (gap %, relative volume, ATR %, distance from moving averages, ...)
+    are computed with whole-array NumPy operations and cached. Columns that only depend
+    on history are computed once per load; update_today() only invalidates the columns
+    that read today's values, so intraday re-scans recompute just those.
+    """
+
+    def __init__(self, angel_api, lookback_days: int = 60, candle_loader=None, max_workers: int = 3):
+        """
+        Args:
+            angel_api (AngelOneAPI): Logged-in API instance with the scrip master loaded.
+            lookback_days (int): Number of completed daily sessions to load per symbol.
+            candle_loader (callable): loader(instrument, from_dt, to_dt) -> (n, 6) array of daily
+                candles; defaults to fetching ONE_DAY candles from the API.
+            max_workers (int): Concurrent history requests (they share the API's rate limiter).
+        """
+        self.angel_api = angel_api
+        self.lookback_days = lookback_days
+        self.candle_loader = candle_loader or self._load_from_api
+        self.max_workers = max_workers
+        self.instruments = []
+        self.symbols = []
+        self._index = {}
+        self.history = np.full((len(HISTORY_FIELDS), 0, lookback_days), np.nan)
+        self.today = {field: np.empty(0) for field in HISTORY_FIELDS}
+        self._cache = {}
+        self._columns = {
+            # name: (function, depends on today's values)
+            'prev_close': (lambda: self.history[H_CLOSE, :, -1], False),
+            'avg_volume_20': (lambda: self._nanmean(self.history[H_VOLUME, :, -20:]), False),
+            'sma_20': (lambda: self._nanmean(self.history[H_CLOSE, :, -20:]), False),
+            'sma_50': (lambda: self._nanmean(self.history[H_CLOSE, :, -50:]), False),
+            'atr_14': (self._atr_14, False),
+            'atr_pct': (lambda: self.column('atr_14') / self.column('prev_close') * 100.0, False),
+            'open': (lambda: self.today['open'], True),
+            'close': (lambda: np.where(np.isnan(self.today['close']), self.column('prev_close'),
+                                       self.today['close']), True),
+            'volume': (lambda: self.today['volume'], True),
+            'gap_pct': (lambda: (self.today['open'] / self.column('prev_close') - 1.0) * 100.0, True),
+            'change_pct': (lambda: (self.column('close') / self.column('prev_close') - 1.0) * 100.0, True),
+            'rel_volume': (lambda: self.today['volume'] / self.column('avg_volume_20'), True),
+            'dist_sma20_pct': (lambda: (self.column('close') / self.column('sma_20') - 1.0) * 100.0, True),
+            'dist_sma50_pct': (lambda: (self.column('close') / self.column('sma_50') - 1.0) * 100.0, True),
+        }
+
+    # --- Loading ---------------------------------------------------------------------
+
+    def universe_from_scrip_master(self, exchange: str = 'NSE') -> list:
+        """Every cash equity ('-EQ' series) on an exchange as {'symbol', 'token', 'exchange'} dicts."""
+        index = self.angel_api.scrip_data
+        if not index:
+            logger.error("Scrip master data not loaded. Call load_scrip_master() first.")
+            return []
+        instruments = []
+        for row in index.rows_for_exchange(exchange, symbol_suffix='-EQ'):
+            info = index.row(row)
+            instruments.append({'symbol': info['symbol'][:-3], 'token': info['token'], 'exchange': exchange})
+        return instruments
+
+    def _load_from_api(self, instrument, from_dt, to_dt):
+        rows = self.angel_api.get_candle_data(instrument['exchange'], instrument['token'], 'ONE_DAY',
+                                              from_dt, to_dt)
+        return parse_candles(rows) if rows else None
+
+    def load_universe(self, instruments: list = None, end_date: datetime.date = None) -> bool:
+        """
+        Loads daily history for the universe (default: all NSE equities in the scrip master).
+        Args:
+            instruments (list): {'symbol', 'token', 'exchange'} dicts to load instead of the full universe.
+            end_date (datetime.date): Last session to include; defaults to yesterday.
+        Returns:
+            bool: True if history was loaded for at least one symbol.
+        """
+        if instruments is None:
+            instruments = self.universe_from_scrip_master()
+        if not instruments:
+            logger.error("Screener universe is empty; nothing to load.")
+            return False
+        end_date = end_date or (datetime.date.today() - datetime.timedelta(days=1))
+        to_dt = datetime.datetime.combine(end_date, datetime.time(15, 30))
+        # Calendar days comfortably covering lookback_days sessions (weekends and holidays).
+        from_dt = to_dt - datetime.timedelta(days=self.lookback_days * 7 // 5 + 15)
+
+        started = time.monotonic()
+        history = np.full((len(HISTORY_FIELDS), len(instruments), self.lookback_days), np.nan)
+
+        def load(item):
+            i, instrument = item
+            try:
+                candles = self.candle_loader(instrument, from_dt, to_dt)
+            except Exception as e:
+                logger.error(f"Failed to load history for {instrument['symbol']}: {e}", exc_info=True)
+                return False
+            if candles is None or not len(candles):
+                return False
+            candles = candles[-self.lookback_days:]
+            history[:, i, self.lookback_days - len(candles):] = candles[:, 1:].T
+            return True
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scanner") as pool:
+            loaded = sum(pool.map(load, enumerate(instruments)))
+
+        self.instruments = list(instruments)
+        self.symbols = [inst['symbol'] for inst in instruments]
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.history = history
+        self.today = {field: np.full(len(instruments), np.nan) for field in HISTORY_FIELDS}
+        self._cache = {}
+        logger.info(f"Screener loaded history for {loaded}/{len(instruments)} symbols "
+                    f"in {time.monotonic() - started:.1f}s.")
+        return loaded > 0
+
+    # --- Live updates ----------------------------------------------------------------
+
+    def update_today(self, quotes: dict):
+        """
+        Sets today's values from quotes keyed by symbol (as returned by
+        StockBasketManager.get_market_data_for_basket or the batched quote API in FULL/OHLC mode)
+        and invalidates only the columns that depend on them.
+        """
+        for symbol, quote in quotes.items():
+            i = self._index.get(symbol)
+            if i is None or not quote:
+                continue
+            self.today['open'][i] = quote.get('open', np.nan)
+            self.today['high'][i] = quote.get('high', np.nan)
+            self.today['low'][i] = quote.get('low', np.nan)
+            self.today['close'][i] = quote.get('ltp', np.nan)
+            self.today['volume'][i] = quote.get('tradeVolume', np.nan)
+        self._invalidate_today()
+
+    def update_today_arrays(self, **arrays):
+        """Vectorised variant of update_today: full per-symbol arrays for any of open/high/low/close/volume."""
+        for field, values in arrays.items():
+            self.today[field][:] = values
+        self._invalidate_today()
+
+    def _invalidate_today(self):
+        for name, (_, depends_on_today) in self._columns.items():
+            if depends_on_today:
+                self._cache.pop(name, None)
+
+    # --- Columns and scans -----------------------------------------------------------
+
+    @staticmethod
+    def _nanmean(values):
+        counts = np.sum(~np.isnan(values), axis=1)
+        totals = np.nansum(values, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def _atr_14(self):
+        high = self.history[H_HIGH, :, -14:]
+        low = self.history[H_LOW, :, -14:]
+        prev_close = self.history[H_CLOSE, :, -15:-1]
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        return self._nanmean(true_range)
+
+    def column(self, name: str) -> np.ndarray:
+        """Per-symbol values of a derived column, computed on first use and cached."""
+        values = self._cache.get(name)
+        if values is None:
+            if name not in self._columns:
+                raise KeyError(f"Unknown screener column '{name}'. Available: {sorted(self._columns)}")
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = self._cache[name] = self._columns[name][0]()
+        return values
+
+    def mask(self, expression: str) -> np.ndarray:
+        """Boolean per-symbol mask for a filter expression; NaN values never pass."""
+        result = np.ones(len(self.symbols), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for column, op, value in parse_expression(expression):
+                result &= op(self.column(column), value)
+        return result
+
+    def scan(self, expression: str, rank_by: str, top_n: int = 20, descending: bool = True) -> list:
+        """
+        Filters the universe and ranks the survivors.
+        Args:
+            expression (str): Filter, e.g. "gap_pct > 1 and rel_volume >= 1.5 and 50 <= close <= 2000".
+            rank_by (str): Column to rank on.
+            top_n (int): Number of results to return.
+            descending (bool): Highest values first.
+        Returns:
+            list: [(symbol, rank value), ...] best first.
+        """
+        started = time.perf_counter()
+        candidates = np.flatnonzero(self.mask(expression))
+        scores = self.column(rank_by)[candidates]
+        valid = ~np.isnan(scores)
+        candidates, scores = candidates[valid], scores[valid]
+        order = np.argsort(-scores if descending else scores, kind='stable')[:top_n]
+        results = [(self.symbols[i], float(scores[j])) for j, i in zip(order.tolist(), candidates[order].tolist())]
+        logger.info(f"Screener '{expression}' matched {len(candidates)} symbols "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms; returning top {len(results)}.")
+        return results
+
+    def feed_basket(self, basket_manager, base_symbols: list, expression: str, rank_by: str,
+                    top_n: int = 10, descending: bool = True) -> bool:
+        """
+        Loads the predefined basket plus the screener's top_n picks into a StockBasketManager.
+        Returns:
+            bool: Result of StockBasketManager.load_basket_stocks().
+        """
+        picks = [symbol for symbol, _ in self.scan(expression, rank_by, top_n, descending)]
+        symbols = list(base_symbols) + [symbol for symbol in picks if symbol not in base_symbols]
+        logger.info(f"Screener added {len(symbols) - len(base_symbols)} symbols to the basket: {picks}")
+        return basket_manager.load_basket_stocks(symbols)
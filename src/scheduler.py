@@ -0,0 +1,585 @@
+# src/scheduler.py
+import asyncio
+import datetime
+import functools
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.bar_aggregator import DAY_MS, IST_OFFSET_MS, SESSION_CLOSE_MS, SESSION_OPEN_MS, BarAggregator
+from src.clock import SystemClock
+from src.database_manager import INTERVALS, CandleStore, TradeJournal, from_epoch_ms, to_epoch_ms
+from src.market_data_manager import MarketDataManager
+from src.metrics import METRICS
+from src.orders import PaperTradingEngine
+from src.portfolio import Portfolio
+from src.risk_manager import RiskManager
+from src.sharding import SharedTickStore, ShardPool
+from src.stock_basket import StockBasketManager
+from src.strategy import IndicatorEngine, TrendStrategy
+
+logger = logging.getLogger(__name__)
+
+# Session events, IST milliseconds after midnight.
+PRE_OPEN_SCAN_MS = 9 * 3600 * 1000                    # 09:00
+SQUARE_OFF_MS = (15 * 3600 + 15 * 60) * 1000          # 15:15
+SESSION_REFRESH_LEAD_MS = 10 * 60 * 1000              # renew the login this long before it expires
+PNL_SNAPSHOT_INTERVAL_MS = 60 * 1000                  # journal a P&L snapshot this often in session
+
+
+def is_weekday(epoch_ms: int) -> bool:
+    """Whether epoch_ms falls on Monday-Friday in IST."""
+    # Epoch day 0 (1970-01-01) was a Thursday, so weekday() == (day + 3) % 7.
+    return ((epoch_ms + IST_OFFSET_MS) // DAY_MS + 3) % 7 < 5
+
+
+def next_time_of_day(time_of_day_ms: int, after_ms: int, weekdays_only: bool = True) -> int:
+    """Epoch ms of the next IST time_of_day_ms strictly after after_ms, skipping weekends if asked."""
+    local = after_ms + IST_OFFSET_MS
+    due = local // DAY_MS * DAY_MS + time_of_day_ms - IST_OFFSET_MS
+    if due <= after_ms:
+        due += DAY_MS
+    while weekdays_only and not is_weekday(due):
+        due += DAY_MS
+    return due
+
+
+class _Timer:
+    __slots__ = ('name', 'callback', 'reschedule', 'cancelled')
+
+    def __init__(self, name, callback, reschedule):
+        self.name = name
+        self.callback = callback
+        self.reschedule = reschedule  # reschedule(last_due_ms) -> next due ms, or None for one-shot timers
+        self.cancelled = False
+
+
+class SessionScheduler:
+    """
+    Timer heap for market-session events, run as one asyncio task.
+
+    Timers are kept in a heap ordered by due time, so the task only ever sleeps until the
+    earliest one; adding an earlier timer wakes it. Callbacks may be plain functions
+    (called on the event loop, so they must be quick) or coroutine functions (run as
+    their own tasks). Daily timers skip weekends; exchange holidays are not known here.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or SystemClock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._timers = {}
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+
+    def _push(self, due_ms, timer):
+        heapq.heappush(self._heap, (due_ms, next(self._seq), timer))
+        if self._heap[0][2] is timer:
+            self._wakeup.set()
+
+    def _add(self, name, callback, due_ms, reschedule):
+        self.cancel(name)
+        timer = self._timers[name] = _Timer(name, callback, reschedule)
+        self._push(due_ms, timer)
+        return due_ms
+
+    def once(self, name: str, when_ms: int, callback) -> int:
+        """Runs callback once at epoch ms when_ms. Returns the due time."""
+        return self._add(name, callback, when_ms, None)
+
+    def daily(self, name: str, time_of_day_ms: int, callback, weekdays_only: bool = True) -> int:
+        """Runs callback every (week)day at an IST time of day. Returns the first due time."""
+        reschedule = functools.partial(next_time_of_day, time_of_day_ms, weekdays_only=weekdays_only)
+        return self._add(name, callback, reschedule(self.clock.now_ms()), reschedule)
+
+    def every(self, name: str, interval_ms: int, callback, start_ms: int = SESSION_OPEN_MS,
+              end_ms: int = SESSION_CLOSE_MS) -> int:
+        """Runs callback every interval_ms between IST times of day start_ms and end_ms on weekdays."""
+        def reschedule(last_ms):
+            local = last_ms + IST_OFFSET_MS
+            time_of_day = local % DAY_MS
+            if start_ms <= time_of_day and time_of_day + interval_ms < end_ms:
+                return last_ms + interval_ms
+            return next_time_of_day(start_ms, last_ms)
+        now = self.clock.now_ms()
+        time_of_day = (now + IST_OFFSET_MS) % DAY_MS
+        due = now + interval_ms if start_ms <= time_of_day < end_ms - interval_ms else next_time_of_day(start_ms, now)
+        return self._add(name, callback, due, reschedule)
+
+    def cancel(self, name: str):
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancelled = True  # removed from the heap lazily
+
+    def pending(self) -> list:
+        """(due_ms, name) of every live timer, earliest first."""
+        return sorted((due, timer.name) for due, _, timer in self._heap if not timer.cancelled)
+
+    async def run(self):
+        """Fires timers as they come due. Runs until cancelled."""
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            due, _, timer = self._heap[0]
+            if timer.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            delay = (due - self.clock.now_ms()) / 1000.0
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            next_due = timer.reschedule(due) if timer.reschedule else None
+            if next_due is not None:
+                self._push(next_due, timer)
+            else:
+                self._timers.pop(timer.name, None)
+            self._fire(timer)
+
+    def _fire(self, timer):
+        logger.info(f"Scheduler: running '{timer.name}'.")
+        try:
+            result = timer.callback()
+        except Exception as e:
+            logger.error(f"Scheduled event '{timer.name}' failed: {e}", exc_info=True)
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(functools.partial(self._task_done, timer.name))
+
+    def _task_done(self, name, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled event '{name}' failed: {task.exception()}", exc_info=task.exception())
+
+
+class TickRelay:
+    """
+    Moves tick notifications from the feed thread onto the event loop.
+
+    Stands in for MarketDataManager (store, slot_for, instrument, add_tick_listener) for
+    components that must run on the loop thread - the order engine, portfolio and risk
+    checks - so they never race with order entry. Ticks are coalesced per slot: if the
+    loop falls behind, a slot that ticks several times is processed once against its
+    latest state in the TickStore, which bounds the backlog by the number of slots.
+    """
+
+    def __init__(self, market_data: MarketDataManager, loop: asyncio.AbstractEventLoop):
+        self.market_data = market_data
+        self.store = market_data.store
+        self.loop = loop
+        self._listeners = []
+        self._dirty = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self.ticks_coalesced = 0
+        market_data.add_tick_listener(self._on_feed_tick)
+
+    def add_tick_listener(self, callback):
+        """Registers callback(slot), called on the event loop thread."""
+        self._listeners.append(callback)
+
+    def slot_for(self, exchange, token):
+        return self.market_data.slot_for(exchange, token)
+
+    def instrument(self, slot: int):
+        return self.market_data.instrument(slot)
+
+    def _on_feed_tick(self, slot):
+        with self._lock:
+            if slot in self._dirty:
+                self.ticks_coalesced += 1
+                return
+            self._dirty.add(slot)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._scheduled = False
+        for slot in dirty:
+            for callback in self._listeners:
+                try:
+                    callback(slot)
+                except Exception as e:
+                    logger.error("Tick listener failed for slot %s: %s", slot, e, exc_info=True)
+
+
+class TradingRuntime:
+    """
+    Owns the asyncio event loop of the bot.
+
+    Blocking SmartConnect calls run in a bounded thread pool (call()), so a slow REST
+    request never stalls tick processing. The pipeline runs as concurrent parts:
+
+      feed thread   WebSocket -> MarketDataManager -> BarAggregator -> bar queue
+      loop          TickRelay -> PaperTradingEngine matching, Portfolio marks, risk loss check
+      strategy task bar queue -> IndicatorEngine -> TrendStrategy -> signal queue
+      order task    signal queue -> RiskManager -> order gateway
+      scheduler     pre-open scan, session start, periodic re-scan, square-off,
+                    session close and login refresh
+      journal       writer thread persisting orders, fills, P&L snapshots and ticks
+
+    Both queues are bounded: a slow order task makes the strategy task wait, and a full
+    bar queue drops (and logs) bars rather than growing without limit.
+
+    With config.strategy_workers > 0 the feed thread only fills a shared-memory tick
+    store, and bars, indicators and the strategy run in a ShardPool of worker processes
+    instead of the strategy task; their signals join the same signal queue.
+    """
+
+    def __init__(self, config, angel_api, basket_symbols: list, timeframe: int = 300, params: dict = None,
+                 scanner=None, scan_expression: str = None, rank_by: str = 'change_pct', scan_top_n: int = 10,
+                 clock=None):
+        """
+        Args:
+            config (ConfigManager): Settings (funds, pool and queue sizes, re-scan interval).
+            angel_api (AngelOneAPI): Broker API; logged in by run().
+            basket_symbols (list): Predefined basket symbols.
+            timeframe (int): Bar timeframe (seconds) the strategy runs on.
+            params (dict): Indicator/regime overrides (see DEFAULT_INDICATOR_PARAMS).
+            scanner (StockScanner): Optional screener adding picks to the basket.
+            scan_expression (str): Screener filter used at pre-open and on each re-scan.
+            rank_by (str): Screener column the picks are ranked on.
+            scan_top_n (int): Number of screener picks added to the basket.
+            clock: Time source; SystemClock by default.
+        """
+        self.config = config
+        self.angel_api = angel_api
+        self.basket_symbols = list(basket_symbols)
+        self.timeframe = timeframe
+        self.params = params
+        self.scanner = scanner
+        self.scan_expression = scan_expression
+        self.rank_by = rank_by
+        self.scan_top_n = scan_top_n
+        self.clock = clock or SystemClock()
+        self.loop = None
+        self.executor = None
+        self.scheduler = None
+        self.basket = None
+        self.market_data = None
+        self.shards = None
+        self.journal = None
+        self._stopping = None
+        self._tasks = []
+        self._in_session = False
+        self._assigned = []  # instrument each slot was last synced with (non-sharded pipeline)
+
+    # --- Blocking calls --------------------------------------------------------------
+
+    async def call(self, function, *args, timeout: float = None, **kwargs):
+        """Runs a blocking function (e.g. an AngelOneAPI method) in the API thread pool."""
+        future = self.loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+        return await (asyncio.wait_for(future, timeout) if timeout else future)
+
+    # --- Lifecycle -------------------------------------------------------------------
+
+    async def run(self) -> bool:
+        """Logs in, builds the pipeline and runs until stop() is called. Returns False if startup failed."""
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.config.api_max_workers, thread_name_prefix="api")
+        self._stopping = asyncio.Event()
+        try:
+            if not await self.startup():
+                return False
+            workers = [self.scheduler.run(), self._order_worker()]
+            if self.shards is None:
+                workers.append(self._strategy_worker())
+            self._tasks = [asyncio.ensure_future(coroutine) for coroutine in workers]
+            self._schedule_session_events()
+            await self._stopping.wait()
+            return True
+        finally:
+            await self.shutdown()
+
+    def stop(self):
+        """Asks run() to return; safe to call from any thread."""
+        if self.loop is not None and self._stopping is not None:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+
+    async def startup(self) -> bool:
+        if not self.config.is_paper_trading():
+            # Live order routing is not implemented yet; refuse to trade real money by accident.
+            logger.error("Live order routing is not available; set paper trading mode. Runtime not started.")
+            return False
+        # Login (often just a cached-session check) and the scrip master are independent.
+        logged_in, scrip_loaded = await asyncio.gather(self.call(self.angel_api.login),
+                                                       self.call(self.angel_api.load_scrip_master))
+        if not logged_in:
+            logger.error("Angel One API login failed; runtime not started.")
+            return False
+        if not scrip_loaded:
+            logger.error("Failed to load scrip master; runtime not started.")
+            return False
+        self.basket = StockBasketManager(self.angel_api)
+        if not await self.call(self.basket.load_basket_stocks, self.basket_symbols):
+            logger.error("No basket stocks were successfully loaded; runtime not started.")
+            return False
+        self._build_pipeline()
+        return True
+
+    def _build_pipeline(self):
+        config = self.config
+        self.scheduler = SessionScheduler(self.clock)
+        self.bar_queue = asyncio.Queue(maxsize=config.event_queue_size)
+        self.signal_queue = asyncio.Queue(maxsize=config.event_queue_size)
+        self._new_signals = []
+
+        if config.strategy_workers > 0:
+            self.market_data = MarketDataManager(
+                self.angel_api, store=SharedTickStore(config.market_data_slots, config.tick_history))
+            self.aggregator = self.engine = self.strategy = None
+            self.shards = ShardPool(self.market_data, config.strategy_workers, self.timeframe, self.params,
+                                    square_off_ms=SQUARE_OFF_MS)
+            self.shards.add_signal_listener(self._on_shard_signal)
+        else:
+            self.market_data = MarketDataManager(self.angel_api, max_tokens=config.market_data_slots,
+                                                 capacity=config.tick_history)
+            self.aggregator = BarAggregator(self.market_data, timeframes=(self.timeframe,))
+            self.aggregator.attach_queue(self.bar_queue, self.loop)
+            self.engine = IndicatorEngine(None, self.timeframe, self.params, max_slots=self.market_data.store.max_slots)
+            self.strategy = TrendStrategy(self.engine, square_off_ms=SQUARE_OFF_MS)
+            self.strategy.add_signal_listener(self._new_signals.append)
+        max_slots = self.market_data.store.max_slots
+        self.relay = TickRelay(self.market_data, self.loop)
+        METRICS.register_gauge('feed_ticks_received', lambda: self.market_data.ticks_received, "Feed ticks stored.")
+        METRICS.register_gauge('feed_ticks_dropped', lambda: self.market_data.ticks_dropped,
+                               "Feed ticks for tokens not subscribed.")
+        METRICS.register_gauge('bar_queue_size', self.bar_queue.qsize, "Bars waiting for the strategy task.")
+        METRICS.register_gauge('signal_queue_size', self.signal_queue.qsize, "Signals waiting for the order task.")
+
+        # Listener order matters: positions are marked before orders match and risk reads P&L.
+        self.portfolio = Portfolio(config.funds_available, max_slots, config.intraday_margin_rate, self.relay)
+        self.gateway = PaperTradingEngine(self.relay, self.clock, square_off_ms=SQUARE_OFF_MS)
+        self.gateway.add_fill_listener(self.portfolio.on_fill)
+        self.risk = RiskManager(self.portfolio, self.gateway, self.relay, max_slots=max_slots)
+
+        if config.journal_enabled:
+            # Ticks are journaled straight from the feed thread; orders and fills from the loop.
+            self.journal = TradeJournal(config.journal_dir, config.journal_fsync, clock=self.clock,
+                                        market_data=self.market_data if config.journal_ticks else None)
+            self.gateway.add_order_listener(self.journal.record_order)
+            self.gateway.add_fill_listener(self.journal.record_fill)
+            self.journal.start()
+        self.market_data.attach_basket(self.basket)
+        if self.shards is not None:
+            self.shards.start()
+            self.shards.attach_basket(self.basket)
+        # Registered after MarketDataManager's listener, so slots are already updated when it runs.
+        self._assigned = [self.market_data.instrument(slot) for slot in range(max_slots)]
+        self.basket.add_listener(lambda added, removed: self.loop.call_soon_threadsafe(self._sync_slots))
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.market_data is not None:
+            self.market_data.stop()
+        if self.shards is not None:
+            await self.call(self.shards.stop)
+            self.market_data.store.detach()
+        if self.journal is not None:
+            await self.call(self.journal.close)
+        if self.angel_api.is_logged_in():
+            await self.call(self.angel_api.logout, terminate=not self.config.keep_session_on_exit)
+        self.executor.shutdown(wait=False)
+        logger.info("Runtime stopped.")
+
+    # --- Pipeline tasks --------------------------------------------------------------
+
+    async def _strategy_worker(self):
+        """Feeds completed bars to the indicators and passes resulting signals on, waiting when orders lag."""
+        while True:
+            timeframe, slot, bar = await self.bar_queue.get()
+            try:
+                self.engine.on_bar(timeframe, slot, bar)
+            except Exception as e:
+                logger.error(f"Indicator update failed for slot {slot}: {e}", exc_info=True)
+            signals, self._new_signals[:] = list(self._new_signals), []
+            for signal in signals:
+                await self.signal_queue.put(signal)
+
+    def _on_shard_signal(self, signal):
+        """ShardPool signal listener; runs on the pool's reader thread."""
+        self.loop.call_soon_threadsafe(self._put_signal, signal)
+
+    def _put_signal(self, signal):
+        try:
+            self.signal_queue.put_nowait(signal)
+        except asyncio.QueueFull:
+            logger.warning(f"Signal queue full; dropped {signal}.")
+
+    async def _order_worker(self):
+        """Turns target-position signals into orders for the difference, through the risk gate."""
+        while True:
+            signal = await self.signal_queue.get()
+            try:
+                self.risk.submit_target(signal)
+            except Exception as e:
+                logger.error(f"Order handling failed for {signal}: {e}", exc_info=True)
+
+    # --- Session events --------------------------------------------------------------
+
+    def _schedule_session_events(self):
+        scheduler = self.scheduler
+        if self.scanner is not None and self.scan_expression:
+            scheduler.daily('pre-open scan', PRE_OPEN_SCAN_MS, self.pre_open_scan)
+            scheduler.every('re-scan', self.config.rescan_interval_minutes * 60 * 1000, self.rescan,
+                            start_ms=SESSION_OPEN_MS, end_ms=SQUARE_OFF_MS)
+        scheduler.daily('session start', SESSION_OPEN_MS, self.start_session)
+        scheduler.daily('square-off', SQUARE_OFF_MS, self.square_off)
+        scheduler.daily('session close', SESSION_CLOSE_MS, self.close_session)
+        if self.journal is not None:
+            scheduler.every('P&L snapshot', PNL_SNAPSHOT_INTERVAL_MS,
+                            lambda: self.journal.record_snapshot(self.portfolio))
+        self._schedule_login_refresh()
+
+        # Started mid-session: join the session now instead of waiting for tomorrow's open.
+        now = self.clock.now_ms()
+        time_of_day = (now + IST_OFFSET_MS) % DAY_MS
+        if SESSION_OPEN_MS <= time_of_day < SESSION_CLOSE_MS and is_weekday(now):
+            if self.scanner is not None and self.scan_expression:
+                self._tasks.append(asyncio.ensure_future(self.pre_open_scan()))
+            self._tasks.append(asyncio.ensure_future(self.start_session()))
+
+    def _schedule_login_refresh(self):
+        expiry = self.angel_api.session_expiry_time
+        if expiry is None:
+            return
+        due = max(to_epoch_ms(expiry) - SESSION_REFRESH_LEAD_MS, self.clock.now_ms())
+        self.scheduler.once('login refresh', due, self.refresh_login)
+        logger.info(f"Login refresh scheduled for {datetime.datetime.fromtimestamp(due / 1000)}.")
+
+    async def refresh_login(self):
+        if await self.call(self.angel_api.refresh_session):
+            self._schedule_login_refresh()
+        else:
+            logger.error("Login refresh failed; retrying in one minute.")
+            self.scheduler.once('login refresh', self.clock.now_ms() + 60 * 1000, self.refresh_login)
+
+    async def start_session(self):
+        if self._in_session:
+            return
+        self._in_session = True
+        self.portfolio.start_session()
+        self.risk.start_session()
+        await self._warm_up()
+        self.market_data.start()
+        logger.info(f"Session started with {len(self.market_data.subscribed_instruments())} instruments.")
+
+    async def _warm_up(self, instruments: list = None):
+        """
+        Seeds indicators from cached candles (fetching what is missing) so signals start at
+        the open; all subscribed instruments unless a list is given.
+        """
+        interval = next((name for name, (seconds, _) in INTERVALS.items() if seconds == self.timeframe), None)
+        if interval is None:
+            return
+        store = CandleStore(self.angel_api)
+        if instruments is None:
+            instruments = self.market_data.subscribed_instruments()
+        end = self.clock.now_ms()
+        start = end - 10 * DAY_MS
+        try:
+            await self.call(store.ensure, instruments, interval, start, end)
+        except Exception as e:
+            logger.warning(f"Indicator warm-up fetch failed: {e}")
+        for instrument in instruments:
+            slot = self.market_data.slot_for(instrument['exchange'], instrument['token'])
+            if slot is None:
+                continue  # dropped from the basket while the candles were fetched
+            bars = store.read_bars(instrument['exchange'], instrument['token'], interval, start, end)
+            if self.shards is not None:
+                self.shards.warm_up(slot, bars)
+            else:
+                self.engine.reset(slot)
+                self.engine.warm_up(slot, bars)
+
+    def _sync_slots(self):
+        """
+        Follows basket changes (on the loop thread). Freed slots are reused for other
+        instruments, so a slot whose instrument changed has its orders cancelled and its
+        order book, position and risk figures cleared; in the non-sharded pipeline it also
+        starts from empty indicators and no target, and new instruments are warmed up
+        (ShardPool does both for its workers).
+        """
+        added = []
+        for slot, assigned in enumerate(self._assigned):
+            instrument = self.market_data.instrument(slot)
+            if instrument is assigned:
+                continue
+            self._assigned[slot] = instrument
+            if assigned is not None:
+                self.gateway.cancel_all(slot)
+                self.gateway.reset(slot)
+                self.portfolio.reset(slot)
+                self.risk.reset(slot)
+            if self.engine is not None:
+                self.engine.reset(slot)
+                self.strategy.reset(slot)
+                if instrument is not None:
+                    added.append(instrument)
+        if added and self._in_session:
+            self._tasks.append(asyncio.ensure_future(self._warm_up(added)))
+
+    async def pre_open_scan(self):
+        if await self.call(self.scanner.load_universe):
+            await self.rescan()
+
+    async def rescan(self):
+        """Refreshes today's quotes for the screener universe and updates the basket with its picks."""
+        universe = self.scanner.instruments
+        if not universe:
+            return
+        tokens = {}
+        for instrument in universe:
+            tokens.setdefault(instrument['exchange'], []).append(instrument['token'])
+        quotes = await self.call(self.angel_api.get_market_data_batch, tokens, "FULL")
+        by_token = {token: quote for (_, token), quote in quotes.items()}
+        self.scanner.update_today({inst['symbol']: by_token.get(inst['token']) for inst in universe})
+        # Never drop an instrument that still has a position.
+        held = [inst['symbol'] for inst in self.market_data.subscribed_instruments()
+                if self.portfolio.quantity(self.market_data.slot_for(inst['exchange'], inst['token']))]
+        base = self.basket_symbols + [symbol for symbol in held if symbol not in self.basket_symbols]
+        await self.call(self.scanner.feed_basket, self.basket, base, self.scan_expression, self.rank_by,
+                        self.scan_top_n)
+
+    def square_off(self):
+        self.gateway.square_off()
+        # Positions are already being flattened by the gateway; only the targets need resetting.
+        if self.shards is not None:
+            self.shards.reset_targets()
+        else:
+            self.strategy.flatten_all(self.clock.now_ms(), reason='square-off')
+            self._new_signals.clear()
+
+    async def close_session(self):
+        if self.shards is not None:
+            self.shards.flush()
+        else:
+            self.aggregator.flush()
+        self.market_data.stop()
+        self.market_data.feed = None  # reconnect tomorrow with the then-current tokens
+        self.portfolio.resync()
+        self._in_session = False
+        logger.info(f"Session closed: {self.portfolio.snapshot()}")
+        if self.journal is not None:
+            self.journal.record_snapshot(self.portfolio)
+            await self.call(self.journal.flush)
+            day = from_epoch_ms(self.clock.now_ms()).date()
+            written = await self.call(self.journal.export_trades_csv, self.config.trade_logs_file, day)
+            logger.info(f"Wrote {written} fills for {day} to {self.config.trade_logs_file}.")
@@ -0,0 +1,389 @@
+# src/scrip_index.py
+import array
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Fixed-size file header:
+# magic, format version, row count, source size, source mtime (ns), source sha1, meta length
+_HEADER = struct.Struct('<8sIIqq20sI')
+_MAGIC = b'SCRIPIX\x01'
+_VERSION = 1
+_ALIGN = 8
+
+# String columns kept in the index, in the order they are written.
+_STRING_FIELDS = ('symbol', 'token', 'name', 'instrumenttype')
+_REQUIRED_KEYS = ('symbol', 'token', 'exch_seg', 'name')
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _table_capacity(count):
+    """Smallest power of two that keeps the hash table at most half full."""
+    capacity = 16
+    while capacity < count * 2:
+        capacity <<= 1
+    return capacity
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default=0):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class ScripMasterIndex:
+    """
+    Read-only, memory-mapped index over the Angel One scrip master.
+
+    The OpenAPIScripMaster.json file is converted once (whenever the source file
+    changes) into a compact columnar file: one array per field plus two open-addressing
+    hash tables keyed by (exch_seg, symbol) and (exch_seg, token), and a row order sorted
+    by (exch_seg, symbol) for prefix searches. At startup the file is only mmap'ed, so
+    pages are faulted in lazily and nothing is parsed up front.
+
+    Row numbers are stable for the lifetime of an index file and can be used as
+    compact instrument ids.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self._file = open(index_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, count, self.source_size, self.source_mtime_ns,
+         self.source_sha1, meta_len) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"{index_path} is not a scrip index (version {_VERSION}).")
+        meta = json.loads(bytes(self._mm[_HEADER.size:_HEADER.size + meta_len]))
+        if meta['byteorder'] != sys.byteorder:
+            self.close()
+            raise ValueError(f"{index_path} was built on a {meta['byteorder']}-endian machine.")
+
+        self._count = count
+        self.exchanges = meta['exchanges']
+        self._exchange_codes = {name: code for code, name in enumerate(self.exchanges)}
+        self._symbol_mask = meta['symbol_capacity'] - 1
+        self._token_mask = meta['token_capacity'] - 1
+
+        view = memoryview(self._mm)
+        self._views = [view]
+        sections = {}
+        for name, (offset, length, fmt) in meta['sections'].items():
+            section = view[offset:offset + length]
+            sections[name] = section.cast(fmt)
+            self._views.extend((section, sections[name]))
+
+        self._exch = sections['exch']
+        self._lotsize = sections['lotsize']
+        self._tick_size = sections['tick_size']
+        self._symbol_table = sections['symbol_table']
+        self._token_table = sections['token_table']
+        self._sorted = sections['sorted']
+        self._strings = {field: (sections[f'{field}_offsets'], sections[f'{field}_blob'])
+                         for field in _STRING_FIELDS}
+
+    # --- Building -------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, json_path, index_path):
+        """
+        Opens the index for json_path, (re)building it first if it is missing or stale.
+        The index is considered stale when the source size/mtime differ from the ones
+        recorded at build time and its SHA-1 differs as well.
+        Returns:
+            ScripMasterIndex: The opened index.
+        """
+        stat = os.stat(json_path)
+        header = cls._read_header(index_path)
+        if header is not None:
+            _, _, _, size, mtime_ns, sha1, _ = header
+            if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                return cls(index_path)
+            source_sha1 = _file_sha1(json_path)
+            if source_sha1 == sha1:
+                # Same content, only touched (e.g. re-downloaded). Record the new mtime.
+                cls._rewrite_source_stat(index_path, header, stat)
+                logger.info(f"Scrip master at {json_path} unchanged (same hash); reusing {index_path}.")
+                return cls(index_path)
+            logger.info(f"Scrip master at {json_path} changed; rebuilding index.")
+        cls.build(json_path, index_path)
+        return cls(index_path)
+
+    @staticmethod
+    def _read_header(index_path):
+        try:
+            with open(index_path, 'rb') as f:
+                raw = f.read(_HEADER.size)
+        except OSError:
+            return None
+        if len(raw) != _HEADER.size:
+            return None
+        header = _HEADER.unpack(raw)
+        if header[0] != _MAGIC or header[1] != _VERSION:
+            return None
+        return header
+
+    @staticmethod
+    def _rewrite_source_stat(index_path, header, stat):
+        magic, version, count, _, _, sha1, meta_len = header
+        with open(index_path, 'r+b') as f:
+            f.write(_HEADER.pack(magic, version, count, stat.st_size, stat.st_mtime_ns, sha1, meta_len))
+
+    @staticmethod
+    def build(json_path, index_path):
+        """
+        Parses the scrip master JSON and writes the columnar index to index_path.
+        The file is written to a temporary path and atomically moved into place, so a
+        crash mid-build never leaves a truncated index behind.
+        Returns:
+            int: Number of instruments written.
+        """
+        stat = os.stat(json_path)
+        source_sha1 = _file_sha1(json_path)
+        with open(json_path, 'rb') as f:
+            raw_data = json.load(f)
+
+        exchanges = sorted({entry['exch_seg'] for entry in raw_data
+                            if all(k in entry for k in _REQUIRED_KEYS)})
+        exchange_codes = {name: code for code, name in enumerate(exchanges)}
+
+        exch = array.array('B')
+        lotsize = array.array('i')
+        tick_size = array.array('d')
+        offsets = {field: array.array('I', [0]) for field in _STRING_FIELDS}
+        blobs = {field: bytearray() for field in _STRING_FIELDS}
+        symbol_keys = []
+        token_keys = []
+
+        for entry in raw_data:
+            if not all(k in entry for k in _REQUIRED_KEYS):
+                continue
+            code = exchange_codes[entry['exch_seg']]
+            exch.append(code)
+            lotsize.append(_to_int(entry.get('lotsize')))
+            tick_size.append(_to_float(entry.get('tick_size')))
+            for field in _STRING_FIELDS:
+                value = (entry.get(field) or '').encode('utf-8')
+                blobs[field] += value
+                offsets[field].append(len(blobs[field]))
+            symbol_keys.append(bytes((code,)) + entry['symbol'].encode('utf-8'))
+            token_keys.append(bytes((code,)) + str(entry['token']).encode('utf-8'))
+
+        count = len(exch)
+        symbol_table = ScripMasterIndex._build_table(symbol_keys)
+        token_table = ScripMasterIndex._build_table(token_keys)
+        sorted_rows = array.array('I', sorted(range(count), key=symbol_keys.__getitem__))
+
+        columns = [('exch', exch, 'B'), ('lotsize', lotsize, 'i'), ('tick_size', tick_size, 'd'),
+                   ('symbol_table', symbol_table, 'I'), ('token_table', token_table, 'I'),
+                   ('sorted', sorted_rows, 'I')]
+        for field in _STRING_FIELDS:
+            columns.append((f'{field}_offsets', offsets[field], 'I'))
+            columns.append((f'{field}_blob', bytes(blobs[field]), 'B'))
+
+        # Lay out sections after the header, each aligned to 8 bytes.
+        def section_bytes(data):
+            return data.tobytes() if isinstance(data, array.array) else data
+
+        payloads = [(name, section_bytes(data), fmt) for name, data, fmt in columns]
+        meta = {'byteorder': sys.byteorder, 'exchanges': exchanges,
+                'symbol_capacity': len(symbol_table), 'token_capacity': len(token_table),
+                'sections': {}}
+        # The meta length depends on the offsets, which depend on the meta length: repeat
+        # until it settles (it only grows, so this takes a few passes at most).
+        meta_len = 0
+        while True:
+            position = _HEADER.size + meta_len
+            for name, payload, fmt in payloads:
+                position += -position % _ALIGN
+                meta['sections'][name] = [position, len(payload), fmt]
+                position += len(payload)
+            meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+            meta_bytes += b' ' * (-(_HEADER.size + len(meta_bytes)) % _ALIGN)
+            if len(meta_bytes) == meta_len:
+                break
+            meta_len = len(meta_bytes)
+
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, count, stat.st_size, stat.st_mtime_ns,
+                                 source_sha1, len(meta_bytes)))
+            f.write(meta_bytes)
+            for name, payload, _ in payloads:
+                f.write(b'\0' * (meta['sections'][name][0] - f.tell()))
+                f.write(payload)
+        os.replace(tmp_path, index_path)
+        logger.info(f"Built scrip index {index_path} with {count} instruments.")
+        return count
+
+    @staticmethod
+    def _build_table(keys):
+        """Open-addressing (linear probing) table of row + 1; 0 marks an empty slot."""
+        capacity = _table_capacity(len(keys))
+        mask = capacity - 1
+        table = array.array('I', bytes(4 * capacity))
+        for row, key in enumerate(keys):
+            slot = zlib.crc32(key) & mask
+            while table[slot]:
+                if keys[table[slot] - 1] == key:
+                    break  # Keep the first occurrence of a duplicate key.
+                slot = (slot + 1) & mask
+            else:
+                table[slot] = row + 1
+        return table
+
+    # --- Lookups --------------------------------------------------------------------
+
+    def __len__(self):
+        return self._count
+
+    def _string(self, field, row):
+        offsets, blob = self._strings[field]
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+    def _string_bytes(self, field, row):
+        offsets, blob = self._strings[field]
+        return blob[offsets[row]:offsets[row + 1]]
+
+    def _probe(self, table, mask, field, code, value):
+        key = bytes((code,)) + value
+        slot = zlib.crc32(key) & mask
+        while True:
+            entry = table[slot]
+            if not entry:
+                return None
+            row = entry - 1
+            if self._exch[row] == code and self._string_bytes(field, row) == value:
+                return row
+            slot = (slot + 1) & mask
+
+    def find_row(self, symbol, exchange):
+        """
+        Returns the row number of the instrument with this exact symbol on this
+        exchange segment, or None.
+        """
+        code = self._exchange_codes.get(exchange)
+        if code is None:
+            return None
+        return self._probe(self._symbol_table, self._symbol_mask, 'symbol', code, symbol.encode('utf-8'))
+
+    def find_row_by_token(self, token, exchange=None):
+        """
+        Returns the row number for a scrip token. Tokens are only unique within an
+        exchange segment; without one, segments are tried in index order.
+        """
+        value = str(token).encode('utf-8')
+        if exchange is not None:
+            code = self._exchange_codes.get(exchange)
+            if code is None:
+                return None
+            return self._probe(self._token_table, self._token_mask, 'token', code, value)
+        for code in range(len(self.exchanges)):
+            row = self._probe(self._token_table, self._token_mask, 'token', code, value)
+            if row is not None:
+                return row
+        return None
+
+    def find_rows_by_prefix(self, prefix, exchange, limit=None):
+        """
+        Returns row numbers of instruments on this exchange whose symbol starts with
+        prefix, in symbol order. Uses binary search over the sorted row order.
+        """
+        code = self._exchange_codes.get(exchange)
+        if code is None:
+            return []
+        target = prefix.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self._sorted[mid]
+            if (self._exch[row], bytes(self._string_bytes('symbol', row))) < (code, target):
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        while lo < self._count and (limit is None or len(rows) < limit):
+            row = self._sorted[lo]
+            if self._exch[row] != code or not bytes(self._string_bytes('symbol', row)).startswith(target):
+                break
+            rows.append(row)
+            lo += 1
+        return rows
+
+    def rows_for_exchange(self, exchange, instrument_type=None, symbol_suffix=None):
+        """
+        Yields row numbers on an exchange segment, optionally filtered by instrument
+        type and/or symbol suffix (e.g. '-EQ' for cash equities).
+        """
+        code = self._exchange_codes.get(exchange)
+        if code is None:
+            return
+        itype = instrument_type.encode('utf-8') if instrument_type is not None else None
+        suffix = symbol_suffix.encode('utf-8') if symbol_suffix is not None else None
+        for row in range(self._count):
+            if self._exch[row] != code:
+                continue
+            if itype is not None and self._string_bytes('instrumenttype', row) != itype:
+                continue
+            if suffix is not None and not bytes(self._string_bytes('symbol', row)).endswith(suffix):
+                continue
+            yield row
+
+    def row(self, row):
+        """
+        Returns the instrument at a row number as a dictionary:
+        {'symbol', 'token', 'exch_seg', 'name', 'instrumenttype', 'lotsize', 'tick_size'}.
+        """
+        return {
+            'symbol': self._string('symbol', row),
+            'token': self._string('token', row),
+            'exch_seg': self.exchanges[self._exch[row]],
+            'name': self._string('name', row),
+            'instrumenttype': self._string('instrumenttype', row),
+            'lotsize': self._lotsize[row],
+            'tick_size': self._tick_size[row],
+        }
+
+    def lookup(self, symbol, exchange):
+        """Returns the instrument dictionary for an exact (symbol, exchange) match, or None."""
+        row = self.find_row(symbol, exchange)
+        return self.row(row) if row is not None else None
+
+    def lookup_token(self, token, exchange=None):
+        """Returns the instrument dictionary for a scrip token, or None."""
+        row = self.find_row_by_token(token, exchange)
+        return self.row(row) if row is not None else None
+
+    def close(self):
+        """Releases the memory map and the underlying file."""
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+            self._file = None
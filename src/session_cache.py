@@ -0,0 +1,101 @@
+# src/session_cache.py
+import base64
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Optional: without it sessions are simply not cached.
+    Fernet = None
+    InvalidToken = Exception
+
+logger = logging.getLogger(__name__)
+
+
+def jwt_expiry(token: str) -> datetime.datetime:
+    """Expiry ('exp' claim) of a JWT as a naive local datetime, or None if it has none. The signature is not checked."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return datetime.datetime.fromtimestamp(int(claims['exp']))
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class SessionCache:
+    """
+    Encrypted on-disk cache of the SmartAPI session (jwt, refresh and feed tokens and
+    their expiry), so a restart can reuse or renew the session instead of running the
+    full TOTP login.
+
+    The file is encrypted with Fernet under a key derived from SESSION_CACHE_KEY if set,
+    otherwise from the account's own TOTP secret and PIN, so it is useless without the
+    .env credentials. Needs the `cryptography` package; without it the cache is disabled.
+    """
+
+    def __init__(self, path: str, secret: str, client_code: str):
+        """
+        Args:
+            path (str): Cache file location.
+            secret (str): Key material for the encryption key.
+            client_code (str): Account the session belongs to; a cache for another account is ignored.
+        """
+        self.path = path
+        self.client_code = client_code
+        self._fernet = None
+        if Fernet is None:
+            logger.warning("cryptography is not installed; the session will not be cached between runs.")
+        elif secret:
+            key = hashlib.pbkdf2_hmac('sha256', secret.encode(), f"session-cache:{client_code}".encode(), 100000)
+            self._fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    @property
+    def enabled(self) -> bool:
+        return self._fernet is not None
+
+    def load(self) -> dict:
+        """
+        The cached session, or None if there is none, it belongs to another account,
+        it cannot be decrypted, or it has expired.
+        Returns:
+            dict: {'jwt_token', 'refresh_token', 'feed_token', 'expires_at' (datetime)}.
+        """
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                session = json.loads(self._fernet.decrypt(f.read()))
+        except (OSError, ValueError, InvalidToken) as e:
+            logger.warning(f"Ignoring unreadable session cache {self.path}: {e}")
+            return None
+        if session.get('client_code') != self.client_code:
+            return None
+        session['expires_at'] = datetime.datetime.fromisoformat(session['expires_at'])
+        if session['expires_at'] <= datetime.datetime.now():
+            logger.info("Cached session has expired.")
+            return None
+        return session
+
+    def save(self, jwt_token: str, refresh_token: str, feed_token: str, expires_at: datetime.datetime):
+        if not self.enabled:
+            return
+        session = {'client_code': self.client_code, 'jwt_token': jwt_token, 'refresh_token': refresh_token,
+                   'feed_token': feed_token, 'expires_at': expires_at.isoformat()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        # Owner-only permissions from the start; the tokens are live credentials.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._fernet.encrypt(json.dumps(session).encode()))
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,562 @@
+# src/sharding.py
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.bar_aggregator import BAR_FIELDS, BarAggregator
+from src.logger import handle_forwarded, logger_levels, setup_worker_logging
+from src.market_data_manager import F_LTP, F_LTQ, F_TIMESTAMP, F_VOLUME, TICK_FIELDS, RingStore
+from src.metrics import BAR_CLOSE, METRICS, SIGNAL
+from src.strategy import IndicatorEngine, Signal, TrendStrategy
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRingStore(RingStore):
+    """
+    RingStore placed in a named shared memory block, so other processes can attach to
+    it by name and read it without copying or messaging.
+
+    Each slot has a single writer. Writes are bracketed by a per-slot sequence counter
+    (a seqlock): it is odd while a row is being written, and readers retry when it was
+    odd or changed while they read. This relies on stores becoming visible in program
+    order, as they do on x86-64.
+    """
+
+    def __init__(self, fields: tuple, max_slots: int, capacity: int, name: str = None):
+        """
+        Args:
+            fields (tuple): Field names.
+            max_slots (int): Number of slots.
+            capacity (int): Rows kept per slot.
+            name (str): Existing block to attach to; None creates (and owns) a new one.
+                Attach from processes started by multiprocessing: they share the creator's
+                resource tracker, which then releases the block once, when the owner unlinks it.
+        """
+        self.owner = name is None
+        data_size = RingStore.nbytes(len(fields), max_slots, capacity)
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=data_size + max_slots * 8)
+        super().__init__(fields, max_slots, capacity, self.shm.buf)
+        self.seq = np.ndarray((max_slots,), dtype=np.int64, buffer=self.shm.buf, offset=data_size)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def spec(self) -> tuple:
+        """What attach() needs, in picklable form."""
+        return self.fields, self.max_slots, self.capacity, self.shm.name
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        fields, max_slots, capacity, name = spec
+        return cls(fields, max_slots, capacity, name)
+
+    def write(self, slot: int, row: tuple):
+        self.seq[slot] += 1
+        super().write(slot, row)
+        self.seq[slot] += 1
+
+    def set_latest(self, slot: int, field: int, value: float):
+        self.seq[slot] += 1
+        super().set_latest(slot, field, value)
+        self.seq[slot] += 1
+
+    def reset(self, slot: int):
+        self.seq[slot] += 1
+        super().reset(slot)
+        self.seq[slot] += 1
+
+    def read_since(self, slot: int, since: int):
+        """
+        Rows of a slot written after the first `since` ones (at most `capacity` of them),
+        as lists in field order, read consistently under the seqlock.
+        Returns:
+            tuple: (rows, count) where count is the slot's row count the rows run up to.
+        """
+        seq, counts, capacity = self.seq, self.counts, self.capacity
+        while True:
+            before = int(seq[slot])
+            if before & 1:
+                continue
+            count = int(counts[slot])
+            n = min(count - since, capacity) if count >= since else min(count, capacity)
+            if n <= 0:
+                rows = []
+            else:
+                end = (count - 1) % capacity + 1 + capacity
+                rows = self.data[:, slot, end - n:end].T.tolist()
+            if int(seq[slot]) == before:
+                return rows, count
+
+    def detach(self):
+        """Detaches from the block, and removes it if this store created it."""
+        for field in self.fields:
+            delattr(self, field)
+        self.data = self.counts = self.seq = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedTickStore(SharedRingStore):
+    """TickStore layout (TICK_FIELDS) in shared memory, for MarketDataManager(store=...)."""
+
+    def __init__(self, max_slots: int, capacity: int, name: str = None):
+        super().__init__(TICK_FIELDS, max_slots, capacity, name)
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        _, max_slots, capacity, name = spec
+        return cls(max_slots, capacity, name)
+
+
+# --- Worker process ----------------------------------------------------------------------
+
+class _ShardWorker:
+    """
+    One strategy process: builds bars, indicators and target positions for the slots
+    it owns, reading their ticks straight from the shared TickStore.
+    """
+
+    def __init__(self, shard: int, spec: dict, commands, events):
+        self.shard = shard
+        self.commands = commands
+        self.events = events
+        self.poll_interval = spec['poll_interval']
+        self.ticks = SharedTickStore.attach(spec['ticks'])
+        self.bars = SharedRingStore.attach(spec['bars'])
+        timeframe = spec['timeframe']
+        self.aggregator = BarAggregator(None, timeframes=(timeframe,), history=self.bars.capacity,
+                                        max_slots=self.ticks.max_slots)
+        self.engine = IndicatorEngine(None, timeframe, spec['params'], max_slots=self.ticks.max_slots)
+        self.strategy = TrendStrategy(self.engine, spec['capital_per_trade'], spec['allow_short'],
+                                      square_off_ms=spec['square_off_ms'])
+        self.aggregator.add_bar_listener(self._on_bar)
+        self.strategy.add_signal_listener(self._on_signal)
+        self._bar_close_ns = 0  # while a bar is being processed, when it closed
+        self.slots = np.empty(0, dtype=np.int64)
+        self.seen = np.empty(0, dtype=np.int64)
+        self.ticks_processed = 0
+
+    def _on_bar(self, timeframe, slot, bar):
+        self.bars.write(slot, bar)
+        # Signals from this bar carry its close time, for the pool's BAR_CLOSE/SIGNAL metrics.
+        self._bar_close_ns = time.monotonic_ns()
+        self.engine.on_bar(timeframe, slot, bar)
+        self._bar_close_ns = 0
+
+    def _on_signal(self, signal):
+        self.events.put(('signal', self.shard, signal.slot, signal.target_quantity, signal.price,
+                         signal.timestamp_ms, signal.reason, self._bar_close_ns))
+
+    def _set_slots(self, slots, seen):
+        order = np.argsort(slots)
+        self.slots = np.asarray(slots, dtype=np.int64)[order]
+        self.seen = np.asarray(seen, dtype=np.int64)[order]
+
+    def _assign(self, slot, target, seen, bar_state=None):
+        self.aggregator.reset_slot(slot)
+        if bar_state is not None:
+            self.aggregator.restore_slot(slot, bar_state)
+        self._warm(slot)
+        self.strategy.set_target(slot, target)
+        keep = self.slots != slot
+        self._set_slots(list(self.slots[keep]) + [slot], list(self.seen[keep]) + [seen])
+
+    def _warm(self, slot):
+        bars = self.bars.window(slot, self.bars.capacity)
+        if bars.shape[1]:
+            self.engine.warm_up(slot, bars)
+        else:
+            self.engine.reset(slot)
+
+    def _release(self, slot, move):
+        keep = self.slots != slot
+        seen = self.seen[~keep]
+        self._set_slots(self.slots[keep], self.seen[keep])
+        target = self.strategy.target(slot)
+        bar_state = self.aggregator.slot_state(slot)
+        self.strategy.reset(slot)
+        self.engine.reset(slot)
+        self.aggregator.reset_slot(slot)
+        self.events.put(('released', self.shard, slot, target, move, int(seen[0]) if len(seen) else 0, bar_state))
+
+    def _handle(self, command) -> bool:
+        kind = command[0]
+        if kind == 'assign':
+            self._assign(*command[1:])
+        elif kind == 'release':
+            self._release(*command[1:])
+        elif kind == 'warm':
+            self._warm(command[1])
+        elif kind == 'reset_targets':
+            for slot in self.slots.tolist():
+                self.strategy.reset(slot)
+        elif kind == 'flatten':
+            self.strategy.flatten_all(*command[1:])
+        elif kind == 'flush':
+            self.aggregator.flush()
+        elif kind == 'on_time':
+            self.aggregator.on_time(*command[1:])
+        elif kind == 'stats':
+            self.events.put(('stats', self.shard, {'slots': len(self.slots), 'ticks': self.ticks_processed,
+                                                   'behind': int((self.ticks.counts[self.slots] - self.seen).sum())}))
+        elif kind == 'stop':
+            return False
+        return True
+
+    def _poll(self) -> int:
+        """Folds every new tick of the owned slots into their bars. Returns the number of ticks."""
+        if not len(self.slots):
+            return 0
+        changed = np.flatnonzero(self.ticks.counts[self.slots] != self.seen)
+        processed = 0
+        add_tick = self.aggregator.add_tick
+        for i in changed.tolist():
+            slot = int(self.slots[i])
+            since = int(self.seen[i])
+            rows, count = self.ticks.read_since(slot, since)
+            if count < since:  # the slot was reset under us
+                self.aggregator.reset_slot(slot)
+            for row in rows:
+                add_tick(slot, int(row[F_TIMESTAMP]), row[F_LTP], row[F_VOLUME], row[F_LTQ])
+            self.seen[i] = count
+            processed += len(rows)
+        self.ticks_processed += processed
+        return processed
+
+    def run(self):
+        self.events.put(('ready', self.shard))
+        running = True
+        while running:
+            try:
+                while True:
+                    running = self._handle(self.commands.get_nowait()) and running
+            except queue.Empty:
+                pass
+            try:
+                if not self._poll():
+                    time.sleep(self.poll_interval)
+            except Exception as e:
+                self.events.put(('error', self.shard, repr(e)))
+                time.sleep(self.poll_interval)
+        self.ticks.detach()
+        self.bars.detach()
+
+
+def _shard_main(shard, spec, commands, events):
+    # Records go back to the pool's reader thread and are written by this process's parent.
+    setup_worker_logging(lambda record: events.put(('log', shard, record)), spec['log_levels'])
+    METRICS.enabled = False  # ticks are stamped in the feed process; the pool stamps bar closes and signals
+    try:
+        _ShardWorker(shard, spec, commands, events).run()
+    except Exception as e:
+        events.put(('error', shard, repr(e)))
+
+
+# --- Coordinator -------------------------------------------------------------------------
+
+class ShardPool:
+    """
+    Runs bar aggregation, indicators and the strategy for the subscribed instruments in
+    N worker processes, each owning a shard of the market data slots.
+
+    The feed process keeps decoding ticks into MarketDataManager, whose store must be a
+    SharedTickStore: workers read their slots' ticks from it in place, polling the
+    per-slot counts, so no tick is copied or sent between processes. Completed bars are
+    written back into a shared bar store (which also carries warm-up history and moves
+    with a slot between workers). Workers send target-position signals back over one
+    queue; they are delivered to signal listeners on a reader thread of this process,
+    where the single order/risk pipeline takes over.
+
+    Slots follow the basket: new instruments go to the least-loaded shard, removed ones
+    are released, and slots are moved between shards when the tick load (ticks seen
+    since the last rebalance) drifts apart by more than `tolerance`. A moved slot keeps
+    its target, completed bars and open bar, and the new owner resumes reading where the
+    old one stopped, so a move does not change the signals. A slot reused for another
+    instrument is likewise only reset and assigned once its previous owner has released it.
+    """
+
+    def __init__(self, market_data, workers: int = 2, timeframe: int = 300, params: dict = None,
+                 capital_per_trade: float = 10000.0, allow_short: bool = True,
+                 square_off_ms: int = (15 * 3600 + 15 * 60) * 1000, history: int = 500,
+                 poll_interval: float = 0.0005, tolerance: float = 0.25):
+        """
+        Args:
+            market_data (MarketDataManager): Tick source; must have been built with a SharedTickStore.
+            workers (int): Worker processes.
+            timeframe (int): Bar timeframe (seconds) the strategy runs on.
+            params (dict): Indicator/regime overrides (see DEFAULT_INDICATOR_PARAMS).
+            capital_per_trade (float): TrendStrategy position sizing.
+            allow_short (bool): TrendStrategy short entries.
+            square_off_ms (int): TrendStrategy square-off time, ms after IST midnight.
+            history (int): Completed bars kept per slot in the shared bar store.
+            poll_interval (float): Idle sleep of a worker between polls (seconds); bounds added latency.
+            tolerance (float): Relative load difference between shards that triggers a rebalance.
+        """
+        if not isinstance(market_data.store, SharedTickStore):
+            raise ValueError("ShardPool needs a MarketDataManager built with store=SharedTickStore(...).")
+        self.market_data = market_data
+        self.ticks = market_data.store
+        self.workers = workers
+        self.tolerance = tolerance
+        max_slots = self.ticks.max_slots
+        self.bars = SharedRingStore(BAR_FIELDS, max_slots, history)
+        self._spec = {
+            'ticks': self.ticks.spec(), 'bars': self.bars.spec(), 'timeframe': timeframe, 'params': params,
+            'capital_per_trade': capital_per_trade, 'allow_short': allow_short, 'square_off_ms': square_off_ms,
+            'poll_interval': poll_interval, 'log_levels': logger_levels(),
+        }
+        self._owner = [None] * max_slots       # slot -> shard
+        self._assigned = [None] * max_slots    # slot -> instrument dict it was assigned for
+        self._targets = [0] * max_slots        # latest target per slot, carried across moves
+        self._moving = {}                      # slot -> (shard it is moving from, shard it is moving to)
+        self._releasing = {}                   # slot -> shard still letting go of the slot's previous instrument
+        self._marks = np.zeros(max_slots, dtype=np.int64)  # tick counts at the last rebalance
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._processes = []
+        self._commands = []
+        self._events = None
+        self._stats = queue.Queue()
+        self._reader = None
+        self.ready = threading.Event()
+        self._ready_count = 0
+        self.moves = 0
+
+    # --- Lifecycle -------------------------------------------------------------------
+
+    def start(self):
+        """Starts the worker processes and the signal reader, then assigns the subscribed instruments."""
+        context = multiprocessing.get_context('spawn')  # never fork a process that runs threads
+        self._events = context.Queue()
+        for shard in range(self.workers):
+            commands = context.Queue()
+            process = context.Process(target=_shard_main, args=(shard, self._spec, commands, self._events),
+                                      name=f"shard-{shard}", daemon=True)
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+        self._reader = threading.Thread(target=self._read_events, name="shard-events", daemon=True)
+        self._reader.start()
+        self.sync()
+        logger.info(f"Started {self.workers} strategy worker processes.")
+
+    def stop(self, timeout: float = 5.0):
+        for commands in self._commands:
+            commands.put(('stop',))
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Strategy worker {process.name} did not stop; terminating it.")
+                process.terminate()
+        if self._events is not None:
+            self._events.put(None)
+            self._reader.join(timeout)
+        self._processes, self._commands = [], []
+        self.bars.detach()
+
+    def attach_basket(self, basket_manager):
+        """
+        Follows basket changes. Register after MarketDataManager.attach_basket(), so
+        subscriptions have been updated by the time the shards are.
+        """
+        basket_manager.add_listener(lambda added, removed: self.sync())
+
+    # --- Signals ---------------------------------------------------------------------
+
+    def add_signal_listener(self, callback):
+        """Registers callback(signal) for every change in target position; called on the reader thread."""
+        self._listeners.append(callback)
+
+    def target(self, slot: int) -> int:
+        return self._targets[slot]
+
+    def _read_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            kind, shard = event[0], event[1]
+            if kind == 'signal':
+                _, _, slot, target, price, timestamp_ms, reason, bar_close_ns = event
+                moving = self._moving.get(slot)
+                if slot in self._releasing or shard != (moving[0] if moving else self._owner[slot]):
+                    continue  # from a shard that no longer owns the slot
+                self._targets[slot] = target
+                if METRICS.enabled:
+                    # Ticks are stamped in this process, so the worker's bar close and the signal are too.
+                    if bar_close_ns:
+                        METRICS.stage(BAR_CLOSE, slot, bar_close_ns)
+                    METRICS.stage(SIGNAL, slot)
+                signal = Signal(slot, target, price, timestamp_ms, reason)
+                for callback in self._listeners:
+                    try:
+                        callback(signal)
+                    except Exception as e:
+                        logger.error(f"Signal listener failed for {signal}: {e}", exc_info=True)
+            elif kind == 'released':
+                _, _, slot, target, move, seen, bar_state = event
+                with self._lock:
+                    if self._releasing.get(slot) == shard:
+                        # The previous instrument is gone from its shard: the slot can start afresh.
+                        del self._releasing[slot]
+                        if self._owner[slot] is not None:
+                            self._assign_new(slot)
+                        continue
+                    moving = self._moving.pop(slot, None)
+                    if move and moving is not None:
+                        destination = moving[1]
+                        # The new owner carries on from the old one's open bar and read position.
+                        self._targets[slot] = target
+                        self._commands[destination].put(('assign', slot, target, seen, bar_state))
+            elif kind == 'stats':
+                self._stats.put((shard, event[2]))
+            elif kind == 'ready':
+                with self._lock:
+                    self._ready_count += 1
+                    if self._ready_count == self.workers:
+                        self.ready.set()
+            elif kind == 'log':
+                handle_forwarded(event[2])
+            elif kind == 'error':
+                logger.error(f"Strategy worker {shard} failed: {event[2]}")
+
+    # --- Shard assignment ------------------------------------------------------------
+
+    def _loads(self):
+        """Ticks per shard since the last rebalance (each slot counts at least one)."""
+        weights = np.maximum(self.ticks.counts - self._marks, 0) + 1
+        loads = [0] * self.workers
+        for slot, shard in enumerate(self._owner):
+            if shard is not None:
+                loads[shard] += int(weights[slot])
+        return loads, weights
+
+    def sync(self):
+        """Brings shard ownership in line with MarketDataManager's subscriptions, then rebalances."""
+        with self._lock:
+            loads, weights = self._loads()
+            for slot in range(len(self._owner)):
+                instrument = self.market_data.instrument(slot)
+                if instrument is self._assigned[slot]:
+                    continue
+                shard = self._owner[slot]
+                if slot not in self._releasing:  # otherwise a release is already under way
+                    moving = self._moving.pop(slot, None)
+                    if moving is not None:
+                        self._releasing[slot] = moving[0]  # its release for the move is already queued
+                    elif shard is not None:
+                        self._commands[shard].put(('release', slot, False))
+                        self._releasing[slot] = shard
+                if shard is not None:
+                    loads[shard] -= int(weights[slot])
+                    self._owner[slot] = None
+                self._assigned[slot] = instrument
+                self._targets[slot] = 0
+                if instrument is not None:
+                    shard = loads.index(min(loads))
+                    self._owner[slot] = shard
+                    loads[shard] += 1
+                    if slot not in self._releasing:
+                        self._assign_new(slot)
+                    # else assigned once the 'released' event arrives, like a move
+        self.rebalance()
+
+    def _assign_new(self, slot):
+        """Hands a slot to its owner for a new instrument, without the previous one's history."""
+        self.bars.reset(slot)
+        self._commands[self._owner[slot]].put(('assign', slot, 0, 0))
+
+    def rebalance(self) -> int:
+        """
+        Moves slots from the busiest to the least busy shard while that narrows a load
+        gap larger than `tolerance`. Returns the number of slots moved.
+        """
+        moved = 0
+        with self._lock:
+            loads, weights = self._loads()
+            for _ in range(len(self._owner)):
+                heavy, light = loads.index(max(loads)), loads.index(min(loads))
+                gap = loads[heavy] - loads[light]
+                if gap <= self.tolerance * max(loads[heavy], 1):
+                    break
+                candidates = [slot for slot, shard in enumerate(self._owner)
+                              if shard == heavy and slot not in self._moving and slot not in self._releasing
+                              and weights[slot] < gap]
+                if not candidates:
+                    break
+                # The slot whose load comes closest to halving the gap.
+                slot = min(candidates, key=lambda s: abs(gap / 2 - weights[s]))
+                self._owner[slot] = light
+                self._moving[slot] = (heavy, light)
+                loads[heavy] -= int(weights[slot])
+                loads[light] += int(weights[slot])
+                self._commands[heavy].put(('release', slot, True))
+                moved += 1
+            self._marks[:] = self.ticks.counts
+        if moved:
+            self.moves += moved
+            logger.info(f"Rebalanced strategy shards: moved {moved} instruments; loads {loads}.")
+        return moved
+
+    def shards(self) -> list:
+        """Slots owned by each shard."""
+        owned = [[] for _ in range(self.workers)]
+        for slot, shard in enumerate(self._owner):
+            if shard is not None:
+                owned[shard].append(slot)
+        return owned
+
+    def stats(self, timeout: float = 5.0) -> list:
+        """Per-shard {'slots', 'ticks' processed, 'behind' (ticks not yet read)}, None where a shard did not answer."""
+        self._broadcast(('stats',))
+        stats = [None] * self.workers
+        deadline = time.monotonic() + timeout
+        for _ in range(self.workers):
+            try:
+                shard, values = self._stats.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            stats[shard] = values
+        return stats
+
+    # --- Commands --------------------------------------------------------------------
+
+    def _broadcast(self, command):
+        for commands in self._commands:
+            commands.put(command)
+
+    def warm_up(self, slot: int, bars):
+        """
+        Seeds a slot's indicators with historical bars (a (BAR_FIELDS, n) array). Call
+        before the feed starts; the bars also serve any later move of the slot.
+        """
+        bars = np.asarray(bars, dtype=np.float64)
+        self.bars.reset(slot)
+        for bar in bars[:, -self.bars.capacity:].T.tolist():
+            self.bars.write(slot, bar)
+        shard = self._owner[slot]
+        if shard is not None:
+            self._commands[shard].put(('warm', slot))
+
+    def reset_targets(self):
+        """Forgets every target without signalling (positions are being squared off elsewhere)."""
+        self._targets = [0] * len(self._targets)
+        self._broadcast(('reset_targets',))
+
+    def flatten_all(self, timestamp_ms: int, reason: str = 'flatten'):
+        self._broadcast(('flatten', timestamp_ms, reason))
+
+    def flush(self):
+        """Completes every open bar in every shard (end of session)."""
+        self._broadcast(('flush',))
+
+    def on_time(self, now_ms: int, grace_ms: int = 1000):
+        self._broadcast(('on_time', now_ms, grace_ms))
@@ -1,19 +1,10 @@
 import logging
-import time # Imported for potential future use or small delays if needed
 from src.api import AngelOneAPI
 
+logger = logging.getLogger(__name__)
+
 
 
-# --- Setup Logging for this module ---
-# This basicConfig will set up logging for this file if not already
-# configured by a central logger.py or main.py.
-# Using 'api_debug.log' here for consistency with other API-related logs.
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("api_debug.log"), # Or a more specific log file if desired
-                        logging.StreamHandler()
-                    ])
 
 class StockBasketManager:
     """
@@ -31,7 +22,30 @@ class StockBasketManager:
         self.angel_api = angel_api
         # Stores stock details: [{'symbol': 'INFY', 'token': '...', 'exchange': '...'}]
         self.basket_stocks = []
-        logging.info("StockBasketManager initialized.")
+        # Callbacks notified as callback(added, removed) whenever the basket changes,
+        # e.g. MarketDataManager keeping its feed subscriptions in sync.
+        self._listeners = []
+        logger.info("StockBasketManager initialized.")
+
+    def add_listener(self, callback):
+        """
+        Registers a callback that is called with (added, removed) lists of stock
+        details every time load_basket_stocks() changes the basket.
+        """
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, previous_stocks):
+        previous = {(stock['exchange'], stock['token']): stock for stock in previous_stocks}
+        current = {(stock['exchange'], stock['token']): stock for stock in self.basket_stocks}
+        added = [stock for key, stock in current.items() if key not in previous]
+        removed = [stock for key, stock in previous.items() if key not in current]
+        if not added and not removed:
+            return
+        for callback in self._listeners:
+            try:
+                callback(added, removed)
+            except Exception as e:
+                logger.error(f"Basket listener {callback} failed: {e}", exc_info=True)
 
     def load_basket_stocks(self, symbols: list, default_exchange_segment: str = 'NSE') -> bool:
         """
@@ -45,15 +59,16 @@ class StockBasketManager:
             bool: True if at least one stock was loaded successfully, False otherwise.
         """
         if not self.angel_api.scrip_data:
-            logging.error("Scrip master data is not loaded in AngelOneAPI. Cannot load basket stocks.")
-            logging.error("Please ensure angel_api.load_scrip_master() is called and successful before calling StockBasketManager.load_basket_stocks().")
+            logger.error("Scrip master data is not loaded in AngelOneAPI. Cannot load basket stocks.")
+            logger.error("Please ensure angel_api.load_scrip_master() is called and successful before calling StockBasketManager.load_basket_stocks().")
             return False
 
+        previous_stocks = self.basket_stocks
         self.basket_stocks = [] # Clear any previously loaded stocks
         loaded_count = 0
         total_requested = len(symbols)
 
-        logging.info(f"Attempting to load {total_requested} stocks into the basket from scrip master...")
+        logger.info(f"Attempting to load {total_requested} stocks into the basket from scrip master...")
 
         for symbol_name in symbols:
             # Use the AngelOneAPI's helper function to get scrip info
@@ -69,13 +84,14 @@ class StockBasketManager:
                         'exchange': scrip_info['exchange']
                     })
                     loaded_count += 1
-                    logging.info(f"Successfully added '{symbol_name}' (Token: {scrip_info['token']}) to basket.")
+                    logger.debug("Added '%s' (Token: %s) to basket.", symbol_name, scrip_info['token'])
                 else:
-                    logging.warning(f"Invalid scrip_info format received for '{symbol_name}'. Expected 'token' and 'exchange' keys. Skipping.")
+                    logger.warning(f"Invalid scrip_info format received for '{symbol_name}'. Expected 'token' and 'exchange' keys. Skipping.")
             else:
-                logging.warning(f"Could not find valid scrip info for '{symbol_name}' in '{default_exchange_segment}' segment. Skipping this stock.")
+                logger.warning(f"Could not find valid scrip info for '{symbol_name}' in '{default_exchange_segment}' segment. Skipping this stock.")
 
-        logging.info(f"Finished loading basket stocks. Loaded {loaded_count} out of {total_requested} requested stocks.")
+        logger.info(f"Finished loading basket stocks. Loaded {loaded_count} out of {total_requested} requested stocks.")
+        self._notify_listeners(previous_stocks)
         return loaded_count > 0 # Return True if at least one stock was loaded
 
     def get_basket_symbols(self) -> list[str]:
@@ -107,25 +123,25 @@ class StockBasketManager:
         """
         all_market_data = {}
         if not self.basket_stocks:
-            logging.warning("No stocks in the basket to fetch market data for.")
+            logger.warning("No stocks in the basket to fetch market data for.")
             return all_market_data
 
-        logging.info(f"Attempting to fetch {mode} market data for all {len(self.basket_stocks)} stocks in the basket.")
+        logger.info(f"Attempting to fetch {mode} market data for all {len(self.basket_stocks)} stocks in the basket.")
+        exchange_tokens = {}
         for stock_info in self.basket_stocks:
-            symbol = stock_info['symbol']
-            token = stock_info['token']
-            exchange = stock_info['exchange']
+            exchange_tokens.setdefault(stock_info['exchange'], []).append(stock_info['token'])
 
-            market_data = self.angel_api.get_market_data(exchange, token, mode=mode)
+        # One request per exchange chunk; AngelOneAPI handles chunking and rate limiting.
+        quotes = self.angel_api.get_market_data_batch(exchange_tokens, mode=mode)
+
+        for stock_info in self.basket_stocks:
+            symbol = stock_info['symbol']
+            market_data = quotes.get((stock_info['exchange'], str(stock_info['token'])))
             if market_data:
                 all_market_data[symbol] = market_data
-                logging.info(f"Fetched {mode} data for {symbol}: LTP={market_data.get('ltp', 'N/A')}")
+                logger.debug("Fetched %s data for %s: LTP=%s", mode, symbol, market_data.get('ltp', 'N/A'))
             else:
-                logging.warning(f"Failed to get {mode} market data for {symbol}.")
-            
-            # Add a small delay to avoid hitting API rate limits. Adjust as necessary.
-            time.sleep(0.2) # Reduced slightly, but monitor API limits
+                logger.warning(f"Failed to get {mode} market data for {symbol}.")
 
-        logging.info("Completed market data fetching for basket stocks.")
+        logger.info("Completed market data fetching for basket stocks.")
         return all_market_data
-
@@ -0,0 +1,701 @@
+# src/strategy.py
+import logging
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.bar_aggregator import B_CLOSE, B_HIGH, B_LOW, B_OPEN, B_START, B_VOLUME, DAY_MS, IST_OFFSET_MS
+from src.metrics import METRICS, SIGNAL
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+
+# --- Streaming indicators -------------------------------------------------------------
+#
+# Every indicator updates in O(1) time and memory per value. The batch functions further
+# down compute the same series over whole arrays and are written to perform exactly the
+# same floating point operations in the same order, so both paths agree bit for bit.
+# Rolling sums/means use running cumulative sums (c[t] - c[t - n]) because that is what
+# np.cumsum produces; recursive smoothers (EMA, Wilder) are inherently sequential and
+# use the same scalar recurrence in both paths.
+
+
+class RollingSum:
+    """Sum of the last `period` values, as a difference of running cumulative sums."""
+    __slots__ = ('period', 'value', '_cum', '_ring', '_count')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value = NAN
+        self._cum = 0.0
+        self._ring = [0.0] * period
+        self._count = 0
+
+    def update(self, x: float) -> float:
+        self._cum += x
+        i = self._count % self.period
+        oldest = self._ring[i]
+        self._ring[i] = self._cum
+        self._count += 1
+        if self._count >= self.period:
+            self.value = self._cum - oldest
+        return self.value
+
+
+class SMA:
+    """Simple moving average."""
+    __slots__ = ('period', 'value', '_sum')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value = NAN
+        self._sum = RollingSum(period)
+
+    def update(self, x: float) -> float:
+        total = self._sum.update(x)
+        if total == total:
+            self.value = total / self.period
+        return self.value
+
+
+class EMA:
+    """
+    Exponential smoother seeded with the SMA of its first `period` inputs.
+    alpha defaults to 2 / (period + 1); Wilder smoothing uses alpha = 1 / period.
+    """
+    __slots__ = ('period', 'alpha', 'value', '_seed')
+
+    def __init__(self, period: int, alpha: float = None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.value = NAN
+        self._seed = SMA(period)
+
+    def update(self, x: float) -> float:
+        if self._seed is not None:
+            self.value = self._seed.update(x)
+            if self.value == self.value:
+                self._seed = None
+        else:
+            self.value = self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+def Wilder(period: int) -> EMA:
+    """Wilder's smoothing (RMA), as used by RSI, ATR and ADX."""
+    return EMA(period, alpha=1.0 / period)
+
+
+def _true_range(high, low, prev_close):
+    if prev_close != prev_close:
+        return high - low
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class RSI:
+    """Relative Strength Index with Wilder smoothing."""
+    __slots__ = ('period', 'value', '_gain', '_loss', '_prev')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = NAN
+        self._gain = Wilder(period)
+        self._loss = Wilder(period)
+        self._prev = NAN
+
+    def update(self, close: float) -> float:
+        prev, self._prev = self._prev, close
+        if prev != prev:
+            return self.value
+        change = close - prev
+        avg_gain = self._gain.update(change if change > 0 else 0.0)
+        avg_loss = self._loss.update(-change if change < 0 else 0.0)
+        if avg_loss == avg_loss:
+            self.value = 100.0 if avg_loss == 0.0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        return self.value
+
+
+class ATR:
+    """Average True Range with Wilder smoothing."""
+    __slots__ = ('period', 'value', '_tr', '_prev_close')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = NAN
+        self._tr = Wilder(period)
+        self._prev_close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.value = self._tr.update(_true_range(high, low, self._prev_close))
+        self._prev_close = close
+        return self.value
+
+
+class ADX:
+    """Average Directional Index with +DI/-DI, Wilder smoothed."""
+    __slots__ = ('period', 'value', 'plus_di', 'minus_di', '_tr', '_plus_dm', '_minus_dm', '_dx',
+                 '_prev_high', '_prev_low', '_prev_close')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = self.plus_di = self.minus_di = NAN
+        self._tr = Wilder(period)
+        self._plus_dm = Wilder(period)
+        self._minus_dm = Wilder(period)
+        self._dx = Wilder(period)
+        self._prev_high = self._prev_low = self._prev_close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_high, prev_low, prev_close = self._prev_high, self._prev_low, self._prev_close
+        self._prev_high, self._prev_low, self._prev_close = high, low, close
+        if prev_close != prev_close:
+            return self.value
+        up = high - prev_high
+        down = prev_low - low
+        tr = self._tr.update(_true_range(high, low, prev_close))
+        plus_dm = self._plus_dm.update(up if (up > down and up > 0.0) else 0.0)
+        minus_dm = self._minus_dm.update(down if (down > up and down > 0.0) else 0.0)
+        if tr != tr:
+            return self.value
+        self.plus_di = 100.0 * plus_dm / tr if tr != 0.0 else 0.0
+        self.minus_di = 100.0 * minus_dm / tr if tr != 0.0 else 0.0
+        di_sum = self.plus_di + self.minus_di
+        dx = 100.0 * abs(self.plus_di - self.minus_di) / di_sum if di_sum != 0.0 else 0.0
+        self.value = self._dx.update(dx)
+        return self.value
+
+
+class VWAP:
+    """Volume weighted average price, reset at every session change."""
+    __slots__ = ('value', '_pv', '_volume', '_session')
+
+    def __init__(self):
+        self.value = NAN
+        self._pv = 0.0
+        self._volume = 0.0
+        self._session = None
+
+    def update(self, price: float, volume: float, session=None) -> float:
+        if session != self._session:
+            self._session = session
+            self._pv = 0.0
+            self._volume = 0.0
+        self._pv += price * volume
+        self._volume += volume
+        if self._volume > 0.0:
+            self.value = self._pv / self._volume
+        return self.value
+
+
+class BollingerBandwidth:
+    """
+    (upper - lower) / middle of Bollinger Bands, i.e. 2 * k * stddev / SMA.
+    Inputs are shifted by the first value seen before squaring, which keeps the
+    running sums small and the variance free of catastrophic cancellation.
+    """
+    __slots__ = ('period', 'k', 'value', '_ref', '_sum', '_sum_sq')
+
+    def __init__(self, period: int = 20, k: float = 2.0):
+        self.period = period
+        self.k = k
+        self.value = NAN
+        self._ref = NAN
+        self._sum = RollingSum(period)
+        self._sum_sq = RollingSum(period)
+
+    def update(self, close: float) -> float:
+        if self._ref != self._ref:
+            self._ref = close
+        shifted = close - self._ref
+        total = self._sum.update(shifted)
+        total_sq = self._sum_sq.update(shifted * shifted)
+        if total == total:
+            mean = total / self.period
+            var = total_sq / self.period - mean * mean
+            var = 0.0 if var <= 0.0 else var
+            self.value = 2.0 * self.k * math.sqrt(var) / (mean + self._ref)
+        return self.value
+
+
+class _RollingExtreme:
+    """Rolling max (or min) over `period` values using a monotonic deque; amortised O(1)."""
+    __slots__ = ('period', 'value', '_is_max', '_window', '_count')
+
+    def __init__(self, period: int, is_max: bool):
+        self.period = period
+        self.value = NAN
+        self._is_max = is_max
+        self._window = deque()
+        self._count = 0
+
+    def update(self, x: float) -> float:
+        window = self._window
+        if self._is_max:
+            while window and window[-1][1] <= x:
+                window.pop()
+        else:
+            while window and window[-1][1] >= x:
+                window.pop()
+        window.append((self._count, x))
+        if window[0][0] <= self._count - self.period:
+            window.popleft()
+        self._count += 1
+        if self._count >= self.period:
+            self.value = window[0][1]
+        return self.value
+
+
+class Choppiness:
+    """Choppiness Index: 100 * log10(sum(TR, n) / (highest high - lowest low)) / log10(n)."""
+    __slots__ = ('period', 'value', '_tr_sum', '_high', '_low', '_prev_close', '_log_n')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = NAN
+        self._tr_sum = RollingSum(period)
+        self._high = _RollingExtreme(period, is_max=True)
+        self._low = _RollingExtreme(period, is_max=False)
+        self._prev_close = NAN
+        self._log_n = math.log10(period)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr_sum = self._tr_sum.update(_true_range(high, low, self._prev_close))
+        highest = self._high.update(high)
+        lowest = self._low.update(low)
+        self._prev_close = close
+        if tr_sum == tr_sum:
+            price_range = highest - lowest
+            self.value = 100.0 * math.log10(tr_sum / price_range) / self._log_n if price_range > 0.0 else 100.0
+        return self.value
+
+
+# --- Batch (vectorised) versions ------------------------------------------------------
+
+def rolling_sum_batch(x, period: int):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), NAN)
+    if len(x) < period:
+        return out
+    cum = np.cumsum(x)
+    oldest = np.empty(len(x) - period + 1)
+    oldest[0] = 0.0
+    oldest[1:] = cum[:len(x) - period]
+    out[period - 1:] = cum[period - 1:] - oldest
+    return out
+
+
+def sma_batch(x, period: int):
+    return rolling_sum_batch(x, period) / period
+
+
+def _smooth_batch(x, period: int, alpha: float):
+    """EMA/Wilder recurrence over x, skipping leading NaNs; matches EMA.update exactly."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), NAN)
+    valid = np.flatnonzero(x == x)
+    if len(valid) < period:
+        return out
+    start = valid[0]
+    seed_end = start + period
+    out[seed_end - 1] = rolling_sum_batch(x[start:seed_end], period)[-1] / period
+    value = float(out[seed_end - 1])
+    values = x[seed_end:].tolist()
+    smoothed = out[seed_end:]
+    for i, v in enumerate(values):
+        value = value + alpha * (v - value)
+        smoothed[i] = value
+    return out
+
+
+def ema_batch(x, period: int):
+    return _smooth_batch(x, period, 2.0 / (period + 1))
+
+
+def wilder_batch(x, period: int):
+    return _smooth_batch(x, period, 1.0 / period)
+
+
+def _true_range_batch(high, low, close):
+    tr = high - low
+    prev_close = close[:-1]
+    tr[1:] = np.maximum(np.maximum(tr[1:], np.abs(high[1:] - prev_close)), np.abs(low[1:] - prev_close))
+    return tr
+
+
+def rsi_batch(close, period: int = 14):
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), NAN)
+    if len(close) < 2:
+        return out
+    change = np.diff(close)
+    avg_gain = wilder_batch(np.where(change > 0, change, 0.0), period)
+    avg_loss = wilder_batch(np.where(change < 0, -change, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(avg_loss == 0.0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    out[1:] = np.where(avg_loss == avg_loss, rsi, NAN)
+    return out
+
+
+def atr_batch(high, low, close, period: int = 14):
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    return wilder_batch(_true_range_batch(high, low, close), period)
+
+
+def adx_batch(high, low, close, period: int = 14):
+    """Returns (adx, plus_di, minus_di) arrays."""
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    n = len(close)
+    adx, plus_di, minus_di = np.full(n, NAN), np.full(n, NAN), np.full(n, NAN)
+    if n < 2:
+        return adx, plus_di, minus_di
+    up = high[1:] - high[:-1]
+    down = low[:-1] - low[1:]
+    tr = wilder_batch(_true_range_batch(high, low, close)[1:], period)
+    plus_dm = wilder_batch(np.where((up > down) & (up > 0.0), up, 0.0), period)
+    minus_dm = wilder_batch(np.where((down > up) & (down > 0.0), down, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pdi = np.where(tr != 0.0, 100.0 * plus_dm / tr, 0.0)
+        mdi = np.where(tr != 0.0, 100.0 * minus_dm / tr, 0.0)
+        di_sum = pdi + mdi
+        dx = np.where(di_sum != 0.0, 100.0 * np.abs(pdi - mdi) / di_sum, 0.0)
+    warm = tr == tr
+    plus_di[1:] = np.where(warm, pdi, NAN)
+    minus_di[1:] = np.where(warm, mdi, NAN)
+    adx[1:] = wilder_batch(np.where(warm, dx, NAN), period)
+    return adx, plus_di, minus_di
+
+
+def vwap_batch(price, volume, session=None):
+    price, volume = np.asarray(price, dtype=np.float64), np.asarray(volume, dtype=np.float64)
+    out = np.full(len(price), NAN)
+    if session is None:
+        bounds = [0, len(price)]
+    else:
+        session = np.asarray(session)
+        bounds = [0, *(np.flatnonzero(session[1:] != session[:-1]) + 1).tolist(), len(price)]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        cum_pv = np.cumsum(price[lo:hi] * volume[lo:hi])
+        cum_volume = np.cumsum(volume[lo:hi])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = cum_pv / cum_volume
+        # Before the first traded volume of a session the previous value carries over.
+        for i in np.flatnonzero(~(cum_volume > 0.0)).tolist():
+            vwap[i] = vwap[i - 1] if i > 0 else (out[lo - 1] if lo > 0 else NAN)
+        out[lo:hi] = vwap
+    return out
+
+
+def bollinger_bandwidth_batch(close, period: int = 20, k: float = 2.0):
+    close = np.asarray(close, dtype=np.float64)
+    if not len(close):
+        return np.full(0, NAN)
+    ref = float(close[0])
+    shifted = close - ref
+    mean = rolling_sum_batch(shifted, period) / period
+    var = rolling_sum_batch(shifted * shifted, period) / period - mean * mean
+    var = np.where(var <= 0.0, 0.0, var)
+    return 2.0 * k * np.sqrt(var) / (mean + ref)
+
+
+def choppiness_batch(high, low, close, period: int = 14):
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    n = len(close)
+    out = np.full(n, NAN)
+    if n < period:
+        return out
+    tr_sum = rolling_sum_batch(_true_range_batch(high, low, close), period)[period - 1:]
+    price_range = sliding_window_view(high, period).max(axis=1) - sliding_window_view(low, period).min(axis=1)
+    log_n = math.log10(period)
+    # math.log10 rather than np.log10: numpy may use SIMD kernels whose last-bit
+    # rounding differs from libm, which would break parity with the streaming path.
+    ratio = np.divide(tr_sum, price_range, out=np.ones(len(tr_sum)), where=price_range > 0.0)
+    logs = np.fromiter((math.log10(r) for r in ratio.tolist()), dtype=np.float64, count=len(ratio))
+    out[period - 1:] = np.where(price_range > 0.0, 100.0 * logs / log_n, 100.0)
+    return out
+
+
+# --- Per-symbol indicator state ---------------------------------------------------------
+
+DEFAULT_INDICATOR_PARAMS = {
+    'ema_fast': 9,
+    'ema_slow': 21,
+    'sma': 20,
+    'rsi': 14,
+    'atr': 14,
+    'adx': 14,
+    'bollinger': 20,
+    'bollinger_k': 2.0,
+    'choppiness': 14,
+    # Regime thresholds: ADX below ~20 means no trend; CHOP above 61.8 means ranging.
+    'adx_trend_threshold': 20.0,
+    'chop_sideways_threshold': 61.8,
+}
+
+
+def session_of(start_ms) -> int:
+    """IST trading day number of an epoch-millisecond timestamp."""
+    return (int(start_ms) + IST_OFFSET_MS) // DAY_MS
+
+
+class SymbolIndicators:
+    """
+    Indicator state for one instrument, updated once per completed bar.
+    The strategy reads the attributes directly (values are NaN until warmed up).
+    """
+    __slots__ = ('params', 'bars_seen', 'last_bar_start', 'close', 'ema_fast', 'ema_slow', 'sma', 'rsi', 'atr', 'adx',
+                 'vwap', 'bandwidth', 'chop', '_indicators')
+
+    def __init__(self, params: dict = None):
+        self.params = p = {**DEFAULT_INDICATOR_PARAMS, **(params or {})}
+        self.bars_seen = 0
+        self.last_bar_start = NAN
+        self.close = NAN
+        self._indicators = (
+            EMA(p['ema_fast']), EMA(p['ema_slow']), SMA(p['sma']), RSI(p['rsi']), ATR(p['atr']),
+            ADX(p['adx']), VWAP(), BollingerBandwidth(p['bollinger'], p['bollinger_k']),
+            Choppiness(p['choppiness']),
+        )
+        (self.ema_fast, self.ema_slow, self.sma, self.rsi, self.atr, self.adx, self.vwap,
+         self.bandwidth, self.chop) = [NAN] * 9
+
+    def update_bar(self, bar) -> None:
+        """Folds a completed bar (BAR_FIELDS order) into every indicator."""
+        start, high, low, close, volume = bar[B_START], bar[B_HIGH], bar[B_LOW], bar[B_CLOSE], bar[B_VOLUME]
+        ema_fast, ema_slow, sma, rsi, atr, adx, vwap, bandwidth, chop = self._indicators
+        self.last_bar_start = start
+        self.close = close
+        self.ema_fast = ema_fast.update(close)
+        self.ema_slow = ema_slow.update(close)
+        self.sma = sma.update(close)
+        self.rsi = rsi.update(close)
+        self.atr = atr.update(high, low, close)
+        self.adx = adx.update(high, low, close)
+        self.vwap = vwap.update((high + low + close) / 3.0, volume, session_of(start))
+        self.bandwidth = bandwidth.update(close)
+        self.chop = chop.update(high, low, close)
+        self.bars_seen += 1
+
+    @property
+    def plus_di(self) -> float:
+        return self._indicators[5].plus_di
+
+    @property
+    def minus_di(self) -> float:
+        return self._indicators[5].minus_di
+
+    @property
+    def is_warm(self) -> bool:
+        """True once the regime indicators (ADX and Choppiness) have valid values."""
+        return self.adx == self.adx and self.chop == self.chop
+
+    @property
+    def sideways(self) -> bool:
+        """
+        True when the market for this symbol is ranging: ADX below the trend threshold
+        or Choppiness above the sideways threshold. Also True until warmed up, so
+        nothing trades on incomplete information.
+        """
+        if not self.is_warm:
+            return True
+        return (self.adx < self.params['adx_trend_threshold']
+                or self.chop > self.params['chop_sideways_threshold'])
+
+
+def compute_indicators_batch(bars, params: dict = None) -> dict:
+    """
+    Vectorised counterpart of SymbolIndicators over a (BAR_FIELDS, n) array of bars,
+    e.g. RingStore.window(...) or a block read from the candle cache. Produces the
+    same values SymbolIndicators would after each bar.
+    Returns:
+        dict: Indicator name -> array of length n, plus a boolean 'sideways' array.
+    """
+    p = {**DEFAULT_INDICATOR_PARAMS, **(params or {})}
+    start, high, low, close, volume = (np.asarray(bars[i], dtype=np.float64)
+                                       for i in (B_START, B_HIGH, B_LOW, B_CLOSE, B_VOLUME))
+    adx, plus_di, minus_di = adx_batch(high, low, close, p['adx'])
+    sessions = (start.astype(np.int64) + IST_OFFSET_MS) // DAY_MS
+    result = {
+        'ema_fast': ema_batch(close, p['ema_fast']),
+        'ema_slow': ema_batch(close, p['ema_slow']),
+        'sma': sma_batch(close, p['sma']),
+        'rsi': rsi_batch(close, p['rsi']),
+        'atr': atr_batch(high, low, close, p['atr']),
+        'adx': adx,
+        'plus_di': plus_di,
+        'minus_di': minus_di,
+        'vwap': vwap_batch((high + low + close) / 3.0, volume, sessions),
+        'bandwidth': bollinger_bandwidth_batch(close, p['bollinger'], p['bollinger_k']),
+        'chop': choppiness_batch(high, low, close, p['choppiness']),
+    }
+    warm = (adx == adx) & (result['chop'] == result['chop'])
+    result['sideways'] = ~warm | (adx < p['adx_trend_threshold']) | (result['chop'] > p['chop_sideways_threshold'])
+    return result
+
+
+class IndicatorEngine:
+    """
+    Maintains SymbolIndicators per instrument slot from the completed bars of one
+    timeframe of a BarAggregator, and notifies listeners after each update.
+    """
+
+    def __init__(self, aggregator=None, timeframe: int = 300, params: dict = None, max_slots: int = 512):
+        """
+        Args:
+            aggregator (BarAggregator): Bar source; None to drive the engine with on_bar() directly.
+            timeframe (int): Bar timeframe (seconds) the indicators run on.
+            params (dict): Overrides for DEFAULT_INDICATOR_PARAMS.
+            max_slots (int): Number of instrument slots when no aggregator is given.
+        """
+        self.timeframe = timeframe
+        self.params = {**DEFAULT_INDICATOR_PARAMS, **(params or {})}
+        if aggregator is not None:
+            max_slots = aggregator.bars[timeframe].max_slots
+            aggregator.add_bar_listener(self.on_bar)
+        self._states = [None] * max_slots
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Registers callback(slot, state) called after a slot's indicators are updated."""
+        self._listeners.append(callback)
+
+    def state(self, slot: int) -> SymbolIndicators:
+        """Indicator state for a slot, created on first use."""
+        state = self._states[slot]
+        if state is None:
+            state = self._states[slot] = SymbolIndicators(self.params)
+        return state
+
+    def reset(self, slot: int):
+        self._states[slot] = None
+
+    def on_bar(self, timeframe: int, slot: int, bar):
+        """Bar listener for BarAggregator."""
+        if timeframe != self.timeframe:
+            return
+        state = self.state(slot)
+        state.update_bar(bar)
+        for callback in self._listeners:
+            callback(slot, state)
+
+    def warm_up(self, slot: int, bars):
+        """
+        Replays historical bars (a (BAR_FIELDS, n) array) into a slot's state without
+        notifying listeners, so signals start from fully warmed indicators.
+        """
+        state = self._states[slot] = SymbolIndicators(self.params)
+        for bar in np.asarray(bars, dtype=np.float64).T.tolist():
+            state.update_bar(bar)
+        logger.debug("Warmed up indicators for slot %d with %d bars.", slot, state.bars_seen)
+        return state
+
+
+# --- Signals ----------------------------------------------------------------------------
+
+class Signal:
+    """A strategy's desired position for one instrument slot."""
+    __slots__ = ('slot', 'target_quantity', 'price', 'timestamp_ms', 'reason')
+
+    def __init__(self, slot: int, target_quantity: int, price: float, timestamp_ms: int, reason: str):
+        self.slot = slot
+        self.target_quantity = target_quantity
+        self.price = price
+        self.timestamp_ms = timestamp_ms
+        self.reason = reason
+
+    def __repr__(self):
+        return (f"Signal(slot={self.slot}, target={self.target_quantity}, price={self.price}, "
+                f"ts={self.timestamp_ms}, reason={self.reason!r})")
+
+
+class TrendStrategy:
+    """
+    Intraday trend follower gated by the sideways filter.
+
+    Direction comes from the fast/slow EMA cross confirmed by price against session
+    VWAP; while SymbolIndicators.sideways is set the strategy goes (and stays) flat.
+    No new entries after `last_entry_ms`, and everything is flattened from
+    `square_off_ms` (both IST, milliseconds after midnight).
+
+    Signals are target positions, emitted only when the target changes; turning them
+    into orders is the order layer's job.
+    """
+
+    def __init__(self, engine: IndicatorEngine, capital_per_trade: float = 10000.0, allow_short: bool = True,
+                 last_entry_ms: int = (15 * 3600) * 1000, square_off_ms: int = (15 * 3600 + 15 * 60) * 1000):
+        self.engine = engine
+        self.capital_per_trade = capital_per_trade
+        self.allow_short = allow_short
+        self.last_entry_ms = last_entry_ms
+        self.square_off_ms = square_off_ms
+        self._bar_ms = engine.timeframe * 1000
+        self._targets = [0] * len(engine._states)
+        self._listeners = []
+        engine.add_listener(self.on_indicators)
+
+    def add_signal_listener(self, callback):
+        """Registers callback(signal) for every change in target position."""
+        self._listeners.append(callback)
+
+    def target(self, slot: int) -> int:
+        return self._targets[slot]
+
+    def reset(self, slot: int):
+        """Forgets the target for a slot without emitting a signal (e.g. after a forced square-off)."""
+        self._targets[slot] = 0
+
+    def set_target(self, slot: int, target: int):
+        """Adopts a target without emitting a signal (e.g. a slot handed over from another process)."""
+        self._targets[slot] = target
+
+    def _emit(self, slot, target, price, timestamp_ms, reason):
+        if METRICS.enabled:
+            METRICS.stage(SIGNAL, slot)
+        self._targets[slot] = target
+        signal = Signal(slot, target, price, timestamp_ms, reason)
+        for callback in self._listeners:
+            callback(signal)
+
+    def on_indicators(self, slot: int, state: SymbolIndicators):
+        """IndicatorEngine listener: re-evaluates the target position after each bar."""
+        current = self._targets[slot]
+        bar_end = int(state.last_bar_start) + self._bar_ms
+        time_of_day = (bar_end + IST_OFFSET_MS) % DAY_MS
+        close = state.close
+
+        if time_of_day >= self.square_off_ms:
+            if current:
+                self._emit(slot, 0, close, bar_end, 'square-off')
+            return
+        if state.sideways:
+            if current:
+                self._emit(slot, 0, close, bar_end, 'sideways')
+            return
+
+        direction = 0
+        if state.ema_fast > state.ema_slow and close > state.vwap:
+            direction = 1
+        elif self.allow_short and state.ema_fast < state.ema_slow and close < state.vwap:
+            direction = -1
+        current_direction = (current > 0) - (current < 0)
+        if direction == current_direction or direction == 0:
+            # Trend unconfirmed: keep the position; exit only on an opposite EMA cross.
+            if current_direction and (state.ema_fast - state.ema_slow) * current_direction < 0:
+                self._emit(slot, 0, close, bar_end, 'trend reversal')
+            return
+        if time_of_day >= self.last_entry_ms:
+            if current:
+                self._emit(slot, 0, close, bar_end, 'trend reversal')
+            return
+        quantity = int(self.capital_per_trade // close) if close > 0 else 0
+        if quantity:
+            self._emit(slot, direction * quantity, close, bar_end, 'trend long' if direction > 0 else 'trend short')
+
+    def flatten_all(self, timestamp_ms: int, reason: str = 'flatten'):
+        """Sets every non-zero target back to zero (e.g. kill switch or end of session)."""
+        for slot, current in enumerate(self._targets):
+            if current:
+                state = self.engine._states[slot]
+                self._emit(slot, 0, state.close if state is not None else NAN, timestamp_ms, reason)
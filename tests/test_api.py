@@ -0,0 +1,94 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('SmartApi')
+pytest.importorskip('pyotp')
+pytest.importorskip('cryptography.fernet')
+
+from src.api import AngelOneAPI
+from src.fake_broker import BROKER_ERROR, FakeBroker, fake_jwt
+from src.session_cache import SessionCache
+
+
+class FailingBroker(FakeBroker):
+    """FakeBroker whose listed endpoints always answer with a broker error."""
+
+    def __init__(self, failing=()):
+        super().__init__(rate_limits={})
+        self.failing = set(failing)
+
+    def _call(self, endpoint):
+        failure = super()._call(endpoint)
+        return BROKER_ERROR if endpoint in self.failing else failure
+
+
+def make_config(tmp_path, username='C1'):
+    return SimpleNamespace(api_key='key', username=username, pin='0000', totp_secret='JBSWY3DPEHPK3PXP',
+                           session_cache_path=str(tmp_path / 'session.bin'), session_cache_key=None,
+                           quote_rate_limit=10.0, historical_rate_limit=3.0)
+
+
+def cache_session(config, hours=6.0, client_code=None):
+    expires = (datetime.datetime.now() + datetime.timedelta(hours=hours)).replace(microsecond=0)
+    cache = SessionCache(config.session_cache_path, f"{config.totp_secret}:{config.pin}",
+                         client_code or config.username)
+    cache.save(f"Bearer {fake_jwt(expires)}", 'cached-refresh', 'cached-feed', expires)
+    return expires
+
+
+def login(config, broker):
+    api = AngelOneAPI(config, smart_connect=broker.connect)
+    assert api.login()
+    return api
+
+
+def test_first_login_uses_totp_and_caches_the_session(tmp_path):
+    config, broker = make_config(tmp_path), FailingBroker()
+    api = login(config, broker)
+    assert broker.calls == {'generateSession': 1}
+    assert api.jwt_token.startswith('Bearer ') and api.session_expiry_time > datetime.datetime.now()
+    assert SessionCache(config.session_cache_path, 'JBSWY3DPEHPK3PXP:0000', 'C1').load()['feed_token'] == api.feed_token
+
+
+def test_cached_session_is_reused(tmp_path):
+    config, broker = make_config(tmp_path), FailingBroker()
+    expires = cache_session(config)
+    api = login(config, broker)
+    assert broker.calls == {'getProfile': 1}
+    assert (api.refresh_token, api.feed_token, api.session_expiry_time) == ('cached-refresh', 'cached-feed', expires)
+
+
+def test_rejected_cache_is_renewed_with_the_refresh_token(tmp_path):
+    config, broker = make_config(tmp_path), FailingBroker({'getProfile'})
+    cache_session(config)
+    api = login(config, broker)
+    assert broker.calls == {'getProfile': 1, 'generateToken': 1}
+    assert api.feed_token != 'cached-feed'
+    assert SessionCache(config.session_cache_path, 'JBSWY3DPEHPK3PXP:0000', 'C1').load()['feed_token'] == api.feed_token
+
+
+def test_totp_login_when_cache_and_refresh_both_fail(tmp_path):
+    config, broker = make_config(tmp_path), FailingBroker({'getProfile', 'generateToken'})
+    cache_session(config)
+    login(config, broker)
+    assert broker.calls == {'getProfile': 1, 'generateToken': 1, 'generateSession': 1}
+
+
+@pytest.mark.parametrize('hours, client_code', [(-1.0, None), (6.0, 'C2')])
+def test_expired_or_foreign_cache_goes_straight_to_totp(tmp_path, hours, client_code):
+    config, broker = make_config(tmp_path), FailingBroker()
+    cache_session(config, hours, client_code)
+    login(config, broker)
+    assert broker.calls == {'generateSession': 1}
+
+
+def test_failed_login_and_logout(tmp_path):
+    config = make_config(tmp_path)
+    assert not AngelOneAPI(config, smart_connect=FailingBroker({'generateSession'}).connect).login()
+    broker = FailingBroker()
+    api = login(config, broker)
+    api.logout()
+    assert api.jwt_token is None and broker.calls['terminateSession'] == 1
+    assert SessionCache(config.session_cache_path, 'JBSWY3DPEHPK3PXP:0000', 'C1').load() is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.backtester import Backtester
+
+# Monday 2024-01-01 09:15 IST
+SESSION_START_MS = 1704080700000
+INSTRUMENTS = [{'symbol': f'S{i}-EQ', 'token': str(100 + i), 'exchange': 'NSE'} for i in range(3)]
+
+
+@pytest.fixture(scope='module')
+def bars():
+    rng = np.random.default_rng(3)
+    starts = (SESSION_START_MS + np.arange(3)[:, None] * 86_400_000
+              + np.arange(375)[None, :] * 60_000).ravel().astype(float)
+    out = []
+    for _ in INSTRUMENTS:
+        close = 500 + np.cumsum(rng.normal(0, 0.3, len(starts)))
+        open_ = close + rng.normal(0, 0.1, len(starts))
+        out.append(np.vstack([starts, open_, np.maximum(open_, close) + 0.2, np.minimum(open_, close) - 0.2, close,
+                              rng.integers(100, 1000, len(starts))]))
+    return out
+
+
+def run(bars, **options):
+    summary = Backtester(INSTRUMENTS, timeframe=60, **options).run_bars(bars).summary()
+    summary.pop('elapsed_seconds')
+    return summary
+
+
+def test_runs_are_deterministic_and_flat_at_each_close(bars):
+    backtester = Backtester(INSTRUMENTS, timeframe=60)
+    result = backtester.run_bars(bars)
+    assert result.summary()['orders'] > 0
+    assert backtester.portfolio.open_positions == 0
+    assert len(result.daily_equity) == 3
+    assert run(bars) == run(bars)
+
+
+def test_orders_go_through_the_paper_trading_gateway(bars):
+    backtester = Backtester(INSTRUMENTS, timeframe=60)
+    result = backtester.run_bars(bars)
+    fills = list(result.trades)
+    assert [backtester.gateway.net_quantity(slot) for slot in range(3)] == [0, 0, 0]
+    assert all(backtester.portfolio.quantity(slot) == 0 for slot in range(3))
+    # Fills happen at the bar close plus slippage, stamped with the close tick's time.
+    assert all((fill[0] - SESSION_START_MS) % 60_000 == 59_999 for fill in fills)
+
+
+def test_risk_limits_apply_as_live(bars):
+    summary = run(bars, risk_limits={'max_order_quantity': 1})
+    assert summary['orders'] == 0
+    assert summary['refused'] > 0
@@ -0,0 +1,99 @@
+import pytest
+
+from src.bar_aggregator import B_CLOSE, B_HIGH, B_START, BarAggregator
+
+# Monday 2024-06-03 09:15 IST
+SESSION_START_MS = 1717386300000
+MINUTE = 60_000
+
+
+@pytest.fixture
+def aggregator():
+    aggregator = BarAggregator(timeframes=(60, 180), max_slots=2)
+    aggregator.emitted = []
+    aggregator.add_bar_listener(lambda timeframe, slot, bar: aggregator.emitted.append((timeframe, slot, bar)))
+    return aggregator
+
+
+def test_ticks_build_ohlcv_and_the_next_bar_completes_it(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 1_000, 100.0, 1_000)
+    aggregator.add_tick(0, SESSION_START_MS + 20_000, 103.0, 1_500)
+    aggregator.add_tick(0, SESSION_START_MS + 40_000, 99.0, 1_700)
+    aggregator.add_tick(0, SESSION_START_MS + 59_000, 101.0, 2_000)
+    assert aggregator.emitted == []
+    aggregator.add_tick(0, SESSION_START_MS + MINUTE, 102.0, 2_100)
+    assert aggregator.emitted == [(60, 0, (SESSION_START_MS, 100.0, 103.0, 99.0, 101.0, 2_000.0))]
+    aggregator.add_tick(0, SESSION_START_MS + 2 * MINUTE, 102.0, 2_600)
+    assert aggregator.emitted[-1][2][-1] == 100.0  # the 2_600 print belongs to the next bar
+
+
+def test_bars_are_aligned_to_the_session_open(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 4 * MINUTE + 5_000, 100.0)
+    aggregator.add_tick(0, SESSION_START_MS + 6 * MINUTE, 101.0)
+    starts = {timeframe: bar[B_START] for timeframe, _, bar in aggregator.emitted}
+    assert starts == {60: SESSION_START_MS + 4 * MINUTE, 180: SESSION_START_MS + 3 * MINUTE}
+
+
+def test_volume_falls_back_to_last_traded_quantity(aggregator):
+    for second in (1, 2, 3):
+        aggregator.add_tick(1, SESSION_START_MS + second * 1_000, 50.0, 0, 10)
+    aggregator.flush()
+    assert [bar[-1] for timeframe, _, bar in aggregator.emitted if timeframe == 60] == [30.0]
+
+
+def test_out_of_session_ticks_are_ignored(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS - 1_000, 100.0)
+    aggregator.add_tick(0, SESSION_START_MS + 375 * MINUTE, 100.0)  # 15:30
+    assert aggregator.out_of_session_ticks == 2
+    aggregator.flush()
+    assert aggregator.emitted == []
+
+
+def test_on_time_closes_bars_without_a_following_tick(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 10_000, 100.0)
+    aggregator.on_time(SESSION_START_MS + MINUTE + 500, grace_ms=1_000)
+    assert aggregator.emitted == []
+    aggregator.on_time(SESSION_START_MS + MINUTE + 1_000, grace_ms=1_000)
+    assert [(timeframe, bar[B_START]) for timeframe, _, bar in aggregator.emitted] == [(60, SESSION_START_MS)]
+
+
+def test_late_tick_after_on_time_does_not_reopen_the_bar(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 10_000, 100.0)
+    aggregator.on_time(SESSION_START_MS + MINUTE + 1_000, grace_ms=1_000)
+    # A tick stamped inside the completed bar arrives after the grace period.
+    aggregator.add_tick(0, SESSION_START_MS + 59_000, 104.0)
+    assert aggregator.late_ticks == 1
+    assert aggregator.bars[60].latest(0)[B_HIGH] == 104.0
+    aggregator.add_tick(0, SESSION_START_MS + MINUTE + 5_000, 101.0)
+    aggregator.flush()
+    starts = [bar[B_START] for timeframe, _, bar in aggregator.emitted if timeframe == 60]
+    assert starts == [SESSION_START_MS, SESSION_START_MS + MINUTE]
+
+
+def test_late_tick_for_an_older_bar_is_only_counted(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 10_000, 100.0)
+    aggregator.add_tick(0, SESSION_START_MS + 2 * MINUTE, 101.0)
+    aggregator.add_tick(0, SESSION_START_MS + 3 * MINUTE, 102.0)
+    aggregator.add_tick(0, SESSION_START_MS + 20_000, 200.0)
+    assert aggregator.late_ticks == 2  # one per timeframe
+    assert aggregator.bars[60].latest(0)[B_HIGH] == 101.0
+
+
+def test_new_session_completes_the_previous_day(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 10_000, 100.0, 500)
+    aggregator.add_tick(0, SESSION_START_MS + 86_400_000 + 10_000, 110.0, 20)
+    assert [bar[B_CLOSE] for timeframe, _, bar in aggregator.emitted] == [100.0, 100.0]
+    aggregator.flush()
+    assert [bar[-1] for _, _, bar in aggregator.emitted] == [500.0, 500.0, 20.0, 20.0]  # day volume restarts
+
+
+def test_slot_state_round_trip(aggregator):
+    aggregator.add_tick(0, SESSION_START_MS + 10_000, 100.0)
+    aggregator.on_time(SESSION_START_MS + MINUTE + 1_000, grace_ms=1_000)
+    other = BarAggregator(timeframes=(60, 180), max_slots=2)
+    emitted = []
+    other.add_bar_listener(lambda timeframe, slot, bar: emitted.append((timeframe, bar[B_START])))
+    other.restore_slot(1, aggregator.slot_state(0))
+    other.add_tick(1, SESSION_START_MS + 30_000, 99.0)  # late for the moved bar
+    other.flush()
+    assert emitted == [(180, SESSION_START_MS)]
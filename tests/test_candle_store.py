@@ -0,0 +1,105 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src import database_manager
+from src.database_manager import IST, CandleStore, INTERVALS, from_epoch_ms, to_epoch_ms
+
+
+def at(hour, minute, second=0):
+    return to_epoch_ms(datetime.datetime(2024, 6, 3, hour, minute, second))
+
+
+class FakeCandleAPI:
+    """get_candle_data() over a synthetic series, returning candles started by `now` (forming ones included)."""
+
+    def __init__(self):
+        self.now_ms = at(15, 30)
+        self.requests = []
+
+    def get_candle_data(self, exchange, symbol_token, interval, from_date, to_date):
+        self.requests.append((from_date, to_date))
+        bar_ms = INTERVALS[interval][0] * 1000
+        start = max(at(9, 15), to_epoch_ms(from_date))
+        start += -(start - at(9, 15)) % bar_ms
+        end = min(to_epoch_ms(to_date), self.now_ms)
+        rows = []
+        for stamp in range(start, end + 1, bar_ms):
+            price = 100.0 + (stamp - at(9, 15)) / bar_ms
+            rows.append([from_epoch_ms(stamp).replace(tzinfo=IST).isoformat(), price, price + 1, price - 1, price, 10])
+        return rows
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeCandleAPI()
+    monkeypatch.setattr(database_manager.time, 'time', lambda: api.now_ms / 1000)
+    return api
+
+
+@pytest.fixture
+def store(tmp_path, api):
+    return CandleStore(api, root=str(tmp_path), max_workers=1)
+
+
+INSTRUMENT = {'exchange': 'NSE', 'token': '2885'}
+
+
+def starts(store, interval):
+    return store.read('NSE', '2885', interval)['start'].tolist()
+
+
+def test_ensure_fetches_only_what_is_missing(store, api):
+    assert store.ensure([INSTRUMENT], 'FIVE_MINUTE', at(9, 15), at(10, 14, 59)) == 0
+    assert len(api.requests) == 1
+    assert store.ensure([INSTRUMENT], 'FIVE_MINUTE', at(9, 15), at(10, 14, 59)) == 0
+    assert len(api.requests) == 1
+    store.ensure([INSTRUMENT], 'FIVE_MINUTE', at(9, 15), at(11, 14, 59))
+    assert len(api.requests) == 2
+    assert api.requests[-1][0] == datetime.datetime(2024, 6, 3, 10, 14, 59, 1000)  # right after the covered range
+    assert starts(store, 'FIVE_MINUTE') == list(range(at(9, 15), at(11, 15), 300_000))
+
+
+def test_forming_candle_is_fetched_again_later(store, api):
+    api.now_ms = at(10, 2)
+    store.ensure([INSTRUMENT], 'FIVE_MINUTE', at(9, 15), at(15, 29))
+    assert starts(store, 'FIVE_MINUTE')[-1] == at(9, 55)  # the 10:00 candle was still forming
+    api.now_ms = at(10, 30)
+    store.ensure([INSTRUMENT], 'FIVE_MINUTE', at(9, 15), at(15, 29))
+    assert starts(store, 'FIVE_MINUTE') == list(range(at(9, 15), at(10, 30), 300_000))
+
+
+def test_missing_ranges_split_to_request_limits(store):
+    pieces = store.missing_ranges('NSE', '2885', 'ONE_MINUTE', datetime.date(2024, 1, 1), datetime.date(2024, 3, 1))
+    assert len(pieces) == 3
+    assert all(hi - lo < 30 * 86_400_000 for lo, hi in pieces)
+    assert pieces[0][0] == to_epoch_ms(datetime.date(2024, 1, 1))
+    assert pieces[-1][1] == to_epoch_ms(datetime.date(2024, 3, 1))
+
+
+def test_missing_ranges_skip_covered_ranges(store):
+    store.write('NSE', '2885', 'ONE_DAY', np.empty((0, 6)), covered=(100, 199))
+    store.write('NSE', '2885', 'ONE_DAY', np.empty((0, 6)), covered=(300, 399))
+    assert store.missing_ranges('NSE', '2885', 'ONE_DAY', 0, 500) == [(0, 99), (200, 299), (400, 500)]
+    store.write('NSE', '2885', 'ONE_DAY', np.empty((0, 6)), covered=(200, 299))
+    assert store.coverage('NSE', '2885', 'ONE_DAY') == [[100, 399]]
+
+
+def test_out_of_order_writes_are_merged(store):
+    store.write('NSE', '2885', 'ONE_DAY', np.array([[3000, 1, 1, 1, 1, 1], [4000, 2, 2, 2, 2, 2]]))
+    store.write('NSE', '2885', 'ONE_DAY', np.array([[1000, 0, 0, 0, 0, 0], [4000, 9, 9, 9, 9, 9]]))
+    records = store.read('NSE', '2885', 'ONE_DAY')
+    assert records['start'].tolist() == [1000, 3000, 4000]
+    assert records['close'].tolist() == [0, 1, 9]  # the newest copy wins
+    assert store.read('NSE', '2885', 'ONE_DAY', 2000, 3000)['start'].tolist() == [3000]
+
+
+def test_torn_trailing_record_is_ignored(store):
+    store.write('NSE', '2885', 'ONE_DAY', np.array([[1000, 1, 1, 1, 1, 1]]))
+    path = store._paths('NSE', '2885', 'ONE_DAY')[0]
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    assert starts(store, 'ONE_DAY') == [1000]
+    store.write('NSE', '2885', 'ONE_DAY', np.array([[2000, 2, 2, 2, 2, 2]]))
+    assert starts(store, 'ONE_DAY') == [1000, 2000]
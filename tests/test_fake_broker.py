@@ -0,0 +1,38 @@
+from src.clock import SimulatedClock
+from src.fake_broker import RATE_LIMITED, FakeBroker
+from src.market_data_manager import F_LTP, F_TIMESTAMP, MarketDataManager
+
+# Monday 2024-06-03 10:00 IST
+NOW_MS = 1717389000000
+INSTRUMENTS = [{'symbol': f'S{i}-EQ', 'token': str(1000 + i), 'exchange': 'NSE'} for i in range(3)]
+
+
+def test_tick_feed_drives_market_data_for_subscribed_tokens():
+    broker = FakeBroker()
+    feed = broker.feed(ticks_per_second=None, max_ticks=300, clock=SimulatedClock(NOW_MS))
+    market_data = MarketDataManager(None, feed=feed, max_tokens=4, capacity=128)
+    market_data.subscribe(INSTRUMENTS + [{'symbol': 'BANKNIFTY', 'token': '1000', 'exchange': 'NFO'}])
+    market_data.unsubscribe(INSTRUMENTS[2:])
+    market_data.start()
+    assert feed.done.wait(10)
+    market_data.stop()
+    assert feed.sent == market_data.ticks_received == 300
+    assert market_data.ticks_dropped == 0
+    assert [int(market_data.store.counts[market_data.slot_for(i['exchange'], i['token'])])
+            for i in INSTRUMENTS[:2]] == [100, 100]
+    assert market_data.slot_for('NSE', '1002') is None
+    for instrument in INSTRUMENTS[:2]:
+        latest = market_data.latest('NSE', instrument['token'])
+        assert latest[F_LTP] == broker.price('NSE', instrument['token'], step=False)
+        assert latest[F_TIMESTAMP] == NOW_MS
+    # Same token on another segment: its own price walk and its own slot.
+    assert market_data.latest('NFO', '1000')[F_LTP] == broker.price('NFO', '1000', step=False)
+
+
+def test_calls_over_the_endpoint_limit_are_refused():
+    broker = FakeBroker(rate_limits={'getProfile': 2})
+    connection = broker.connect(api_key='key')
+    responses = [connection.getProfile('refresh') for _ in range(3)]
+    assert [response['status'] for response in responses] == [True, True, False]
+    assert responses[2] is RATE_LIMITED
+    assert broker.calls == {'getProfile': 3} and broker.rate_limited == {'getProfile': 1}
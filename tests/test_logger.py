@@ -0,0 +1,23 @@
+import logging
+
+from src.logger import RateLimitFilter
+
+
+def record(level, lineno=10):
+    return logging.LogRecord('src.market_data_manager', level, 'market_data_manager.py', lineno, 'tick', (), None)
+
+
+def test_rate_limit_filter_drops_floods_and_counts_them():
+    limiter = RateLimitFilter(rate=0.001, burst=2)
+    assert [limiter.filter(record(logging.INFO)) for _ in range(5)] == [True, True, False, False, False]
+    assert limiter.filter(record(logging.INFO, lineno=11))  # another call site has its own budget
+    limiter._buckets[('market_data_manager.py', 10)]._tokens = 1
+    passed = record(logging.INFO)
+    assert limiter.filter(passed)
+    assert passed.suppressed == 3
+
+
+def test_rate_limit_filter_never_drops_warnings():
+    limiter = RateLimitFilter(rate=0.001, burst=1)
+    assert all(limiter.filter(record(logging.WARNING)) for _ in range(10))
+    assert all(limiter.filter(record(logging.ERROR)) for _ in range(10))
@@ -0,0 +1,98 @@
+import struct
+
+import pytest
+
+from src.market_data_manager import (F_ASK, F_BID, F_LTP, F_TIMESTAMP, F_VOLUME, LTP_MODE, QUOTE, SNAP_QUOTE,
+                                     MarketDataManager, RingStore, encode_tick)
+
+INSTRUMENTS = [{'symbol': 'RELIANCE-EQ', 'token': '2885', 'exchange': 'NSE'},
+               {'symbol': 'TCS-EQ', 'token': '11536', 'exchange': 'NSE'},
+               {'symbol': 'USDINR24JUNFUT', 'token': '1186', 'exchange': 'CDS'}]
+
+
+@pytest.fixture
+def market_data():
+    market_data = MarketDataManager(None, max_tokens=4, capacity=8)
+    market_data.subscribe(INSTRUMENTS)
+    return market_data
+
+
+def test_snap_quote_decodes_price_volume_and_best_bid_ask(market_data):
+    market_data.on_packet(encode_tick(2885, 1, SNAP_QUOTE, 7, 1717386300000, 2950.55, ltq=10, volume=12345,
+                                      bid=2950.5, ask=2950.6, bid_qty=300, ask_qty=200))
+    timestamp, ltp, volume, ltq, bid, ask, bid_qty, ask_qty = market_data.latest('NSE', '2885')
+    assert (timestamp, ltp, volume, ltq) == (1717386300000, 2950.55, 12345, 10)
+    assert (bid, ask, bid_qty, ask_qty) == (2950.5, 2950.6, 300, 200)
+
+
+def test_ltp_and_quote_packets_fall_back_to_ltp_for_bid_ask(market_data):
+    market_data.on_packet(encode_tick(2885, 1, LTP_MODE, 1, 1000, 100.25))
+    assert market_data.latest('NSE', '2885')[[F_LTP, F_BID, F_ASK, F_VOLUME]].tolist() == [100.25, 100.25, 100.25, 0]
+    market_data.on_packet(encode_tick(2885, 1, QUOTE, 2, 2000, 100.5, ltq=5, volume=900))
+    assert market_data.latest('NSE', '2885')[[F_LTP, F_BID, F_VOLUME]].tolist() == [100.5, 100.5, 900]
+
+
+def test_currency_prices_use_their_own_scale(market_data):
+    market_data.on_packet(encode_tick(1186, 13, LTP_MODE, 1, 1000, 83.4575))
+    assert market_data.latest('CDS', '1186')[F_LTP] == pytest.approx(83.4575)
+
+
+def test_same_token_on_two_segments_gets_two_slots(market_data):
+    market_data.subscribe([{'symbol': 'NSE1186-EQ', 'token': '1186', 'exchange': 'NSE'}])
+    nse, cds = market_data.slot_for('NSE', '1186'), market_data.slot_for('CDS', '1186')
+    assert None not in (nse, cds) and nse != cds
+    market_data.on_packet(encode_tick(1186, 1, LTP_MODE, 1, 1000, 512.5))
+    market_data.on_packet(encode_tick(1186, 13, LTP_MODE, 1, 1000, 83.4575))
+    assert market_data.latest('NSE', '1186')[F_LTP] == 512.5
+    assert market_data.latest('CDS', '1186')[F_LTP] == pytest.approx(83.4575)
+    market_data.on_packet(encode_tick(1186, 3, LTP_MODE, 1, 1000, 1.0))  # BSE: not subscribed
+    assert market_data.ticks_dropped == 1
+    assert market_data.slot_for('NOSUCH', '1186') is None
+
+
+def test_depth_with_unordered_sides_is_scanned(market_data):
+    packet = bytearray(encode_tick(11536, 1, SNAP_QUOTE, 1, 1000, 3900.0, bid=3899.0, ask=3901.0,
+                                   bid_qty=1, ask_qty=2))
+    # Swap the first buy and sell depth entries: the best sell now comes first.
+    entry = struct.calcsize('<Hqqh')
+    first, sixth = slice(147, 147 + entry), slice(147 + 5 * entry, 147 + 6 * entry)
+    packet[first], packet[sixth] = packet[sixth], packet[first]
+    market_data.on_packet(bytes(packet))
+    assert market_data.latest('NSE', '11536')[[F_BID, F_ASK]].tolist() == [3899.0, 3901.0]
+
+
+def test_unknown_tokens_are_dropped_and_listeners_see_slots(market_data):
+    seen = []
+    market_data.add_tick_listener(seen.append)
+    market_data.on_packet(encode_tick(999, 1, LTP_MODE, 1, 1000, 1.0))
+    market_data.on_packet(encode_tick(11536, 1, LTP_MODE, 1, 1000, 1.0))
+    assert (market_data.ticks_dropped, market_data.ticks_received) == (1, 1)
+    assert seen == [market_data.slot_for('NSE', '11536')]
+
+
+def test_window_is_oldest_first_across_wraparound(market_data):
+    for i in range(20):
+        market_data.on_packet(encode_tick(2885, 1, LTP_MODE, i, i, 100.0 + i))
+    assert market_data.window('NSE', '2885', 5, F_TIMESTAMP).tolist() == [15, 16, 17, 18, 19]
+    assert len(market_data.window('NSE', '2885', 100, F_LTP)) == 8
+    assert market_data.window('NSE', 'NOSUCH', 5) is None
+
+
+def test_freed_slots_are_reused_last(market_data):
+    reliance = market_data.slot_for('NSE', '2885')
+    market_data.unsubscribe([INSTRUMENTS[0]])
+    assert market_data.latest('NSE', '2885') is None
+    market_data.subscribe([{'symbol': 'INFY-EQ', 'token': '1594', 'exchange': 'NSE'}])
+    assert market_data.slot_for('NSE', '1594') != reliance
+    market_data.subscribe([{'symbol': 'SBIN-EQ', 'token': '3045', 'exchange': 'NSE'}])
+    assert market_data.slot_for('NSE', '3045') == reliance
+    assert market_data.subscribe([{'symbol': 'HDFC-EQ', 'token': '1333', 'exchange': 'NSE'}]) == []
+
+
+def test_ring_store_window_is_a_view():
+    store = RingStore(('a', 'b'), max_slots=1, capacity=4)
+    for i in range(6):
+        store.write(0, (i, -i))
+    window = store.window(0, 3)
+    assert window.tolist() == [[3, 4, 5], [-3, -4, -5]]
+    assert window.base is not None
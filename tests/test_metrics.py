@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from src.metrics import ACK, BAR_CLOSE, ORDER_SEND, RISK_CHECK, SIGNAL, Histogram, Metrics, timed
+
+
+def test_histogram_is_exact_for_small_values():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert (histogram.count, histogram.total, histogram.max) == (100, 5050, 100)
+    assert [histogram.percentile(q) for q in (0.01, 0.5, 0.9, 0.99, 1.0)] == [1, 50, 90, 99, 100]
+
+
+@pytest.mark.parametrize('scale', [1_000, 1_000_000, 1_000_000_000])
+def test_histogram_percentiles_within_bucket_precision(scale):
+    histogram = Histogram()
+    values = [scale + i * scale // 1000 for i in range(1000)]
+    for value in values:
+        histogram.record(value)
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * len(values) + 0.5) - 1]
+        assert histogram.percentile(q) == pytest.approx(exact, rel=0.016)
+    assert histogram.percentile(1.0) <= histogram.max == values[-1]
+
+
+def test_histogram_edges():
+    histogram = Histogram()
+    assert histogram.percentile(0.5) == 0 and histogram.summary() == {'count': 0}
+    histogram.record(-5)
+    histogram.record(1 << 60)  # beyond the range: lands in the last bucket, max stays exact
+    assert histogram.percentile(0.5) == 0
+    assert histogram.max == 1 << 60 and histogram.counts[-1] == 1
+    summary = histogram.summary(scale=1.0)
+    assert set(summary) == {'count', 'mean', 'p50', 'p90', 'p99', 'p999', 'max'}
+    histogram.reset()
+    assert histogram.count == 0 and not any(histogram.counts)
+
+
+def test_stages_record_only_in_pipeline_order():
+    metrics = Metrics(max_slots=2)
+    metrics.stage(SIGNAL, 0)  # no bar close yet
+    assert metrics.stages['signal'].count == 0
+    metrics.stamp_tick(0)
+    for stage in (BAR_CLOSE, SIGNAL, RISK_CHECK, ORDER_SEND, ACK):
+        metrics.stage(stage, 0)
+    assert [metrics.stages[name].count for name in metrics.stages] == [1] * 5
+    assert metrics.tick_to_ack.count == 1
+    # A second signal without a new bar close is not a new measurement; nor is another slot's.
+    metrics.stage(SIGNAL, 0)
+    metrics.stage(BAR_CLOSE, 1)
+    assert metrics.stages['signal'].count == 1 and metrics.stages['bar_close'].count == 1
+
+
+def test_stage_stamped_elsewhere():
+    metrics = Metrics(max_slots=1)
+    metrics.stamp_tick(0)
+    closed = time.monotonic_ns()
+    metrics.stage(BAR_CLOSE, 0, closed)
+    metrics.stage(SIGNAL, 0)
+    assert metrics.stages['bar_close'].count == metrics.stages['signal'].count == 1
+    # A bar close stamped before the slot's latest tick is not a tick -> bar close latency,
+    # and the ack it leads to is not reported as tick-to-ack.
+    closed = time.monotonic_ns()
+    metrics.stamp_tick(0)
+    metrics.stage(BAR_CLOSE, 0, closed)
+    for stage in (SIGNAL, RISK_CHECK, ORDER_SEND, ACK):
+        metrics.stage(stage, 0)
+    assert metrics.stages['bar_close'].count == 1 and metrics.stages['signal'].count == 2
+    assert metrics.tick_to_ack.count == 0
+
+
+class Limiter:
+    wait_count = 3
+    wait_seconds = 0.25
+
+
+def test_render_prometheus():
+    metrics = Metrics(max_slots=1)
+    metrics.stamp_tick(0)
+    metrics.stage(BAR_CLOSE, 0)
+    metrics.api_call('get_candle_data', 2_000_000, False)
+    metrics.api_call('get_candle_data', 4_000_000, True)
+    metrics.register_limiter('get_candle_data', Limiter())
+    metrics.register_gauge('queue_size', lambda: 7, "Items queued.")
+    metrics.register_gauge('broken', lambda: 1 / 0)
+    text = metrics.render_prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert 'trading_stage_latency_seconds_count{stage="bar_close"} 1' in lines
+    assert 'trading_stage_latency_seconds_count{stage="ack"} 0' in lines
+    assert 'trading_api_calls_total{method="get_candle_data"} 2' in lines
+    assert 'trading_api_failures_total{method="get_candle_data"} 1' in lines
+    assert 'trading_api_latency_seconds_sum{method="get_candle_data"} 0.006000000' in lines
+    assert 'trading_api_rate_limit_waits_total{method="get_candle_data"} 3' in lines
+    assert ['# HELP trading_queue_size Items queued.', '# TYPE trading_queue_size gauge',
+            'trading_queue_size 7'] == lines[-3:]
+    assert 'broken' not in text
+
+
+def test_timed_counts_false_results_as_failures(monkeypatch):
+    metrics = Metrics(max_slots=1)
+    monkeypatch.setattr('src.metrics.METRICS', metrics)
+
+    @timed('lookup')
+    def lookup(found):
+        return {'ok': True} if found else None
+
+    lookup(True)
+    lookup(False)
+    assert (metrics.api['lookup'].calls, metrics.api['lookup'].failures) == (2, 1)
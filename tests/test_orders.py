@@ -0,0 +1,122 @@
+import pytest
+
+from src.clock import SimulatedClock
+from src.market_data_manager import LTP_MODE, MarketDataManager, encode_tick
+from src.models.enums import OrderStatus
+from src.orders import BUY, LIMIT, MARKET, SELL, STOPLOSS_LIMIT, STOPLOSS_MARKET, PaperTradingEngine
+
+# Monday 2024-06-03 10:00 IST
+NOW_MS = 1717389000000
+INSTRUMENT = {'symbol': 'RELIANCE-EQ', 'token': '2885', 'exchange': 'NSE'}
+
+
+@pytest.fixture
+def market_data():
+    market_data = MarketDataManager(None, max_tokens=2, capacity=8)
+    market_data.subscribe([INSTRUMENT])
+    return market_data
+
+
+@pytest.fixture
+def clock():
+    return SimulatedClock(NOW_MS)
+
+
+@pytest.fixture
+def engine(market_data, clock):
+    engine = PaperTradingEngine(market_data, clock, charges=lambda side, price, quantity: 0.0)
+    engine.filled = []
+    engine.add_fill_listener(engine.filled.append)
+    return engine
+
+
+def quote(market_data, clock, bid, ask, bid_qty=100, ask_qty=100, ltp=None):
+    clock.advance(1_000)
+    market_data.on_packet(encode_tick(2885, 1, 3, 0, clock.now_ms(), ltp if ltp is not None else (bid + ask) / 2,
+                                      bid=bid, ask=ask, bid_qty=bid_qty, ask_qty=ask_qty))
+
+
+def fills(engine):
+    return [(fill.side, fill.quantity, fill.price) for fill in engine.filled]
+
+
+def test_market_orders_fill_at_the_touch(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.1)
+    engine.place_order(INSTRUMENT, BUY, 10)
+    engine.place_order(INSTRUMENT, SELL, 4)
+    assert fills(engine) == [(BUY, 10, 100.1), (SELL, 4, 100.0)]
+    assert engine.net_quantity(0) == 6
+
+
+def test_market_order_fills_partially_over_the_displayed_depth(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.1, ask_qty=30)
+    order = engine.place_order(INSTRUMENT, BUY, 50)
+    assert (order.filled_quantity, order.status) == (30, OrderStatus.OPEN)
+    quote(market_data, clock, 100.1, 100.2, ask_qty=30)
+    assert (order.filled_quantity, order.status) == (50, OrderStatus.COMPLETE)
+    assert order.average_price == pytest.approx((30 * 100.1 + 20 * 100.2) / 50)
+
+
+def test_ltp_only_ticks_fill_without_a_size_limit(engine, market_data, clock):
+    market_data.on_packet(encode_tick(2885, 1, LTP_MODE, 0, NOW_MS, 99.5))
+    engine.place_order(INSTRUMENT, BUY, 10_000)
+    assert fills(engine) == [(BUY, 10_000, 99.5)]
+
+
+def test_limit_orders_rest_until_marketable_best_price_first(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.5)
+    low = engine.place_order(INSTRUMENT, BUY, 5, LIMIT, price=99.0)
+    high = engine.place_order(INSTRUMENT, BUY, 5, LIMIT, price=99.5)
+    assert engine.filled == []
+    quote(market_data, clock, 99.0, 99.4, ask_qty=5)
+    assert (high.status, low.status) == (OrderStatus.COMPLETE, OrderStatus.OPEN)
+    assert fills(engine) == [(BUY, 5, 99.4)]
+
+
+def test_stop_orders_trigger_on_the_last_traded_price(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.1)
+    stop = engine.place_order(INSTRUMENT, SELL, 10, STOPLOSS_MARKET, trigger_price=99.0)
+    stop_limit = engine.place_order(INSTRUMENT, BUY, 10, STOPLOSS_LIMIT, price=101.5, trigger_price=101.0)
+    assert (stop.status, stop_limit.status) == (OrderStatus.TRIGGER_PENDING, OrderStatus.TRIGGER_PENDING)
+    quote(market_data, clock, 98.9, 99.0, ltp=98.95)
+    assert stop.status == OrderStatus.COMPLETE
+    quote(market_data, clock, 101.0, 101.6, ltp=101.2)
+    assert stop_limit.status == OrderStatus.OPEN  # triggered, but the offer is above the limit
+    quote(market_data, clock, 101.2, 101.4, ltp=101.3)
+    assert fills(engine) == [(SELL, 10, 98.9), (BUY, 10, 101.4)]
+
+
+def test_string_order_types_are_coerced_before_booking(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.1)
+    stop = engine.place_order(INSTRUMENT, 'SELL', 10, 'STOPLOSS_MARKET', trigger_price=99.0)
+    assert stop.status == OrderStatus.TRIGGER_PENDING
+    assert engine.filled == []
+    rejected = engine.place_order(INSTRUMENT, 'SELL', 10, 'ICEBERG')
+    assert rejected.status == OrderStatus.REJECTED
+
+
+def test_cancel_and_modify(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.5)
+    order = engine.place_order(INSTRUMENT, BUY, 5, LIMIT, price=99.0)
+    assert engine.modify_order(order.order_id, price=100.5)
+    assert engine.order(order.order_id).status == OrderStatus.COMPLETE
+    other = engine.place_order(INSTRUMENT, SELL, 5, LIMIT, price=101.0)
+    assert engine.cancel_all(0) == 1
+    assert engine.order(other.order_id).status == OrderStatus.CANCELLED
+    assert not engine.cancel_order(other.order_id)
+    quote(market_data, clock, 101.0, 101.2)
+    assert fills(engine) == [(BUY, 5, 100.5)]
+
+
+def test_intraday_positions_are_squared_off_once_a_day(engine, market_data, clock):
+    quote(market_data, clock, 100.0, 100.1)
+    engine.place_order(INSTRUMENT, BUY, 10)
+    resting = engine.place_order(INSTRUMENT, SELL, 10, LIMIT, price=105.0)
+    clock.set(NOW_MS + (5 * 60 + 15) * 60_000)  # 15:15
+    quote(market_data, clock, 100.2, 100.3)
+    assert resting.status == OrderStatus.CANCELLED
+    assert engine.net_quantity(0) == 0
+    assert fills(engine)[-1] == (SELL, 10, 100.2)
+    engine.place_order(INSTRUMENT, BUY, 1)
+    quote(market_data, clock, 100.2, 100.3)
+    assert engine.net_quantity(0) == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from src.models.enums import Side
+from src.models.trade import Fill
+from src.portfolio import Portfolio
+
+
+def fill(slot, side, quantity, price, fees=0.0):
+    return Fill(f'order-{slot}-{quantity}-{price}', slot, f'S{slot}', side, quantity, price, fees, 0)
+
+
+@pytest.fixture
+def portfolio():
+    return Portfolio(100_000.0, max_slots=8, margin_rate=0.2)
+
+
+def test_on_fill_books_positions_pnl_and_round_trips(portfolio):
+    seen = []
+    portfolio.add_fill_listener(lambda f, position: seen.append(position.quantity))
+    portfolio.on_fill(fill(1, Side.BUY, 100, 50.0, fees=2.0))
+    portfolio.on_fill(fill(1, Side.BUY, 100, 52.0, fees=2.0))
+    assert portfolio.quantity(1) == 200 and portfolio.open_positions == 1
+    assert portfolio.margin_used == pytest.approx(200 * 51.0 * 0.2)
+
+    portfolio.mark(1, 55.0)
+    assert portfolio.unrealized_pnl == pytest.approx(800.0)
+    portfolio.on_fill(fill(1, Side.SELL, 200, 55.0, fees=3.0))
+    snapshot = portfolio.snapshot()
+    assert snapshot['realized_pnl'] == pytest.approx(800.0)
+    assert snapshot['unrealized_pnl'] == pytest.approx(0.0)
+    assert snapshot['net_pnl'] == pytest.approx(793.0)
+    assert snapshot['margin_used'] == pytest.approx(0.0)
+    assert snapshot['open_positions'] == 0
+    assert portfolio.round_trips == [pytest.approx(793.0)]
+    assert seen == [100, 200, 0]
+
+
+def test_reversal_closes_one_cycle_and_opens_another(portfolio):
+    portfolio.on_fill(fill(2, Side.SELL, 10, 100.0))
+    portfolio.on_fill(fill(2, Side.BUY, 30, 90.0))
+    assert portfolio.quantity(2) == 20
+    assert portfolio.realized_pnl == pytest.approx(100.0)
+    assert portfolio.round_trips == [pytest.approx(100.0)]
+    assert portfolio.position(2).average_price == 90.0
+
+
+def test_incremental_totals_match_resync(portfolio):
+    rng = np.random.default_rng(5)
+    for _ in range(2000):
+        slot = int(rng.integers(0, 8))
+        if rng.random() < 0.5:
+            side = Side.BUY if rng.random() < 0.5 else Side.SELL
+            portfolio.on_fill(fill(slot, side, int(rng.integers(1, 50)), float(rng.uniform(90, 110)),
+                                   float(rng.uniform(0, 1))))
+        else:
+            portfolio.mark(slot, float(rng.uniform(90, 110)))
+    incremental = portfolio.snapshot()
+    portfolio.resync()
+    for key, value in portfolio.snapshot().items():
+        assert incremental[key] == pytest.approx(value, abs=1e-6), key
+
+
+def test_start_session_rolls_pnl_into_funds_only_when_flat(portfolio):
+    portfolio.on_fill(fill(0, Side.BUY, 10, 100.0, fees=1.0))
+    portfolio.mark(0, 110.0)
+    portfolio.start_session()
+    assert portfolio.funds == 100_000.0 and portfolio.quantity(0) == 10
+
+    portfolio.on_fill(fill(0, Side.SELL, 10, 110.0, fees=1.0))
+    equity = portfolio.equity()
+    portfolio.start_session()
+    assert portfolio.funds == pytest.approx(equity) == pytest.approx(100_098.0)
+    assert portfolio.snapshot()['net_pnl'] == 0.0
+    assert portfolio.equity() == portfolio.funds
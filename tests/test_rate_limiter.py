@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from src.rate_limiter import SlidingWindowLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_bursts_to_capacity_then_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.now += 10
+    assert sum(bucket.try_acquire() for _ in range(10)) == 3
+
+
+def test_token_bucket_rejects_oversized_requests():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=5).acquire(tokens=6)
+
+
+def test_token_bucket_acquire_times_out():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=0.05)
+
+
+def test_sliding_window_never_exceeds_rate_in_a_window():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(rate=3, period=1.0, clock=clock)
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now = 100.999
+    assert not limiter.try_acquire()
+    clock.now = 101.0
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_sliding_window_frees_slots_as_grants_expire():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(rate=2, period=1.0, clock=clock)
+    assert limiter.try_acquire()
+    clock.now = 100.6
+    assert limiter.try_acquire()
+    clock.now = 101.1  # the first grant has left the window, the second has not
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_sliding_window_paces_concurrent_callers():
+    limiter = SlidingWindowLimiter(rate=4, period=0.2)
+    granted = []
+    lock = threading.Lock()
+
+    def call():
+        limiter.acquire()
+        with lock:
+            granted.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    granted.sort()
+    assert len(granted) == 12
+    # Any 5 consecutive grants span at least one window.
+    assert all(granted[i + 4] - granted[i] >= 0.2 for i in range(len(granted) - 4))
+    assert limiter.wait_count == 8
+
+
+def test_sliding_window_acquire_times_out():
+    limiter = SlidingWindowLimiter(rate=1, period=10.0)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.05)
+    with pytest.raises(ValueError):
+        SlidingWindowLimiter(rate=0)
+
+
+def test_sliding_window_accepts_fractional_rates():
+    clock = FakeClock()
+    slow = SlidingWindowLimiter(rate=0.5, clock=clock)  # one call every two seconds
+    assert [slow.try_acquire() for _ in range(2)] == [True, False]
+    clock.now = 101.999
+    assert not slow.try_acquire()
+    clock.now = 102.0
+    assert slow.try_acquire()
+    fast = SlidingWindowLimiter(rate=2.5, clock=clock)
+    assert [fast.try_acquire() for _ in range(3)] == [True, True, False]
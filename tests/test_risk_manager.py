@@ -0,0 +1,113 @@
+import pytest
+
+from src.clock import SimulatedClock
+from src.market_data_manager import MarketDataManager, encode_tick
+from src.models.enums import OrderStatus
+from src.orders import BUY, LIMIT, SELL, PaperTradingEngine
+from src.portfolio import Portfolio
+from src.risk_manager import RiskManager
+from src.strategy import Signal
+
+# Monday 2024-06-03 10:00 IST
+NOW_MS = 1717389000000
+INSTRUMENT = {'symbol': 'RELIANCE-EQ', 'token': '2885', 'exchange': 'NSE'}
+
+
+class Desk:
+    """Market data, paper gateway, portfolio and risk wired the way the runtime wires them."""
+
+    def __init__(self, **limits):
+        self.clock = SimulatedClock(NOW_MS)
+        self.market_data = MarketDataManager(None, max_tokens=2, capacity=8)
+        self.market_data.subscribe([INSTRUMENT])
+        self.portfolio = Portfolio(1_000_000.0, max_slots=2, market_data=self.market_data)
+        self.gateway = PaperTradingEngine(self.market_data, self.clock, charges=lambda side, price, quantity: 0.0)
+        self.gateway.add_fill_listener(self.portfolio.on_fill)
+        self.risk = RiskManager(self.portfolio, self.gateway, self.market_data, limits, max_slots=2)
+
+    def tick(self, price):
+        self.clock.advance(1_000)
+        self.market_data.on_packet(encode_tick(2885, 1, 3, 0, self.clock.now_ms(), price,
+                                               bid=price - 0.05, ask=price + 0.05, bid_qty=10_000, ask_qty=10_000))
+
+    def target(self, quantity):
+        return self.risk.submit_target(Signal(0, quantity, 0.0, self.clock.now_ms(), 'test'))
+
+
+def test_orders_are_checked_against_the_limits():
+    desk = Desk(max_order_quantity=500, max_position_value=20_000.0)
+    desk.tick(100.0)
+    assert desk.risk.check(0, BUY, 600) == "quantity 600 above limit 500"
+    assert desk.risk.check(0, BUY, 300).startswith("position value 30000.00")
+    desk.risk.set_price_band(0, 95.0, 105.0)
+    assert desk.risk.check(0, BUY, 10, 110.0).startswith("price 110.0 outside band")
+    assert desk.target(150) is not None
+    assert desk.portfolio.quantity(0) == 150
+    assert desk.risk.gross_exposure == pytest.approx(150 * 100.05)
+    # Adding to the position counts what is already held; reducing it is always allowed.
+    assert desk.risk.check(0, BUY, 100) is not None
+    assert desk.risk.check(0, SELL, 150) is None
+    assert desk.risk.rejections == 0
+
+
+def test_pending_orders_count_towards_the_position():
+    desk = Desk(max_position_value=20_000.0)
+    desk.tick(100.0)
+    order = desk.gateway.place_order(INSTRUMENT, BUY, 150, LIMIT, 99.0)
+    assert order.status == OrderStatus.OPEN
+    assert desk.risk.pending_buy[0] == 150 and desk.risk.open_orders == 1
+    assert desk.risk.check(0, BUY, 100, 99.0) is not None
+    desk.gateway.cancel_all(0)
+    assert desk.risk.pending_buy[0] == 0 and desk.risk.open_orders == 0
+
+
+def test_loss_limit_halts_entries_but_lets_positions_exit():
+    desk = Desk(max_daily_loss=500.0)
+    desk.tick(100.0)
+    desk.target(100)
+    desk.tick(90.0)
+    assert desk.risk.halted and 'daily loss limit' in desk.risk.halt_reason
+    assert desk.risk.check(0, BUY, 1) is not None
+    assert desk.risk.check(0, SELL, 150) is not None  # would reverse into a short
+    assert desk.target(0) is not None
+    assert desk.portfolio.quantity(0) == 0
+    assert desk.target(-10) is None and desk.portfolio.quantity(0) == 0
+
+
+def test_kill_switch_cancels_orders_and_optionally_squares_off():
+    desk = Desk()
+    desk.tick(100.0)
+    desk.target(50)
+    desk.gateway.place_order(INSTRUMENT, BUY, 10, LIMIT, 95.0)
+    assert desk.risk.kill_switch('manual') == 1
+    assert desk.risk.open_orders == 0 and desk.portfolio.quantity(0) == 50
+    desk.risk.resume()
+    desk.risk.kill_switch('manual', square_off=True)
+    assert desk.portfolio.quantity(0) == 0
+    desk.risk.start_session()
+    assert not desk.risk.halted and desk.risk.check(0, BUY, 1) is None
+
+
+def test_reused_slot_starts_clean():
+    desk = Desk(max_position_value=20_000.0)
+    desk.tick(100.0)
+    desk.target(100)
+    desk.tick(101.0)
+    desk.target(0)
+    desk.gateway.place_order(INSTRUMENT, BUY, 50, LIMIT, 95.0)
+    desk.risk.set_price_band(0, 90.0, 110.0)
+    assert desk.risk.open_orders == 1
+    equity = desk.portfolio.equity()
+
+    # What the runtime does when the basket hands the slot to another instrument.
+    desk.gateway.cancel_all(0)
+    desk.gateway.reset(0)
+    desk.portfolio.reset(0)
+    desk.risk.reset(0)
+    assert desk.gateway.net_quantity(0) == 0 and desk.gateway.open_orders() == []
+    assert desk.portfolio.equity() == pytest.approx(equity)
+    assert desk.portfolio.snapshot()['net_pnl'] == 0.0
+    assert desk.risk.open_orders == 0 and desk.risk.pending_buy[0] == 0
+    assert desk.risk.gross_exposure == 0.0 and desk.risk.upper_band[0] == float('inf')
+    desk.tick(150.0)
+    assert desk.risk.check(0, BUY, 100) is None
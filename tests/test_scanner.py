@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.scanner import StockScanner, parse_expression
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD']
+
+
+def constant_candles(close, volume, days=30):
+    """Daily candles with a fixed close, a 2-point range and fixed volume."""
+    stamps = np.arange(days) * 86_400_000.0
+    return np.column_stack([stamps, np.full(days, close), np.full(days, close + 1.0), np.full(days, close - 1.0),
+                            np.full(days, close), np.full(days, volume)])
+
+
+@pytest.fixture
+def scanner():
+    history = {'AAA': constant_candles(100.0, 1000), 'BBB': constant_candles(200.0, 2000),
+               'CCC': constant_candles(50.0, 500), 'DDD': constant_candles(400.0, 100, days=10)}
+    scanner = StockScanner(None, lookback_days=30, candle_loader=lambda inst, *_: history[inst['symbol']])
+    instruments = [{'symbol': s, 'token': str(i), 'exchange': 'NSE'} for i, s in enumerate(SYMBOLS)]
+    assert scanner.load_universe(instruments, end_date=datetime.date(2024, 1, 1))
+    return scanner
+
+
+def test_parse_expression_mirrors_range_clauses():
+    clauses = parse_expression('50 <= close < 2000 and gap_pct > 1')
+    assert [(column, op.__name__, value) for column, op, value in clauses] == [
+        ('close', 'ge', 50.0), ('close', 'lt', 2000.0), ('gap_pct', 'gt', 1.0)]
+    with pytest.raises(ValueError):
+        parse_expression('close >>> 5')
+
+
+def test_short_histories_are_left_padded(scanner):
+    assert np.isnan(scanner.history[0, 3, :20]).all()
+    np.testing.assert_array_equal(scanner.column('prev_close'), [100.0, 200.0, 50.0, 400.0])
+    np.testing.assert_array_equal(scanner.column('avg_volume_20'), [1000.0, 2000.0, 500.0, 100.0])
+
+
+def test_update_today_invalidates_only_today_columns(scanner):
+    scanner.update_today({'AAA': {'open': 102.0, 'ltp': 104.0, 'tradeVolume': 3000}})
+    history_columns = {name: scanner.column(name) for name in ('prev_close', 'sma_20', 'atr_14', 'atr_pct')}
+    assert scanner.column('gap_pct')[0] == pytest.approx(2.0)
+    assert scanner.column('rel_volume')[0] == pytest.approx(3.0)
+
+    scanner.update_today({'AAA': {'open': 95.0, 'ltp': 90.0, 'tradeVolume': 500}, 'ZZZ': {'open': 1.0}})
+    for name, values in history_columns.items():
+        assert scanner._cache[name] is values
+    assert 'gap_pct' not in scanner._cache and 'close' not in scanner._cache
+    assert scanner.column('gap_pct')[0] == pytest.approx(-5.0)
+    assert scanner.column('change_pct')[0] == pytest.approx(-10.0)
+    # Symbols without a live quote fall back to the previous close.
+    assert scanner.column('close')[1] == 200.0
+
+
+def test_scan_filters_and_ranks(scanner):
+    scanner.update_today_arrays(open=[101.0, 210.0, 51.0, 380.0], volume=[2000, 2000, 2000, np.nan])
+    assert [symbol for symbol, _ in scanner.scan('gap_pct > 0', 'gap_pct')] == ['BBB', 'CCC', 'AAA']
+    assert scanner.scan('gap_pct > 0', 'rel_volume', top_n=1) == [('CCC', 4.0)]
+    assert [symbol for symbol, _ in scanner.scan('gap_pct > -10', 'gap_pct', descending=False)][0] == 'DDD'
+
+
+class FakeBasket:
+    def __init__(self):
+        self.loaded = None
+
+    def load_basket_stocks(self, symbols):
+        self.loaded = symbols
+        return True
+
+
+def test_feed_basket_keeps_base_symbols_and_adds_top_picks(scanner):
+    scanner.update_today_arrays(open=[101.0, 210.0, 51.0, 380.0])
+    basket = FakeBasket()
+    assert scanner.feed_basket(basket, ['RELIANCE', 'CCC'], 'gap_pct > 0', 'gap_pct', top_n=2)
+    assert basket.loaded == ['RELIANCE', 'CCC', 'BBB']
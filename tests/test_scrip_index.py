@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from src.scrip_index import ScripMasterIndex
+
+SCRIPS = [
+    {'token': '2885', 'symbol': 'RELIANCE-EQ', 'name': 'RELIANCE', 'exch_seg': 'NSE', 'instrumenttype': '',
+     'lotsize': '1', 'tick_size': '5.000000'},
+    {'token': '500325', 'symbol': 'RELIANCE', 'name': 'RELIANCE', 'exch_seg': 'BSE', 'instrumenttype': '',
+     'lotsize': '1', 'tick_size': '5.000000'},
+    {'token': '11536', 'symbol': 'TCS-EQ', 'name': 'TCS', 'exch_seg': 'NSE', 'instrumenttype': '',
+     'lotsize': '1', 'tick_size': '5.000000'},
+    {'token': '2885', 'symbol': 'RELIANCE27JUN24FUT', 'name': 'RELIANCE', 'exch_seg': 'NFO',
+     'instrumenttype': 'FUTSTK', 'lotsize': '250', 'tick_size': '10.000000'},
+    {'token': '1594', 'symbol': 'INFY-EQ', 'name': 'INFY', 'exch_seg': 'NSE', 'instrumenttype': '',
+     'lotsize': '1', 'tick_size': '5.000000'},
+    {'token': '9999', 'symbol': 'NOEXCHANGE', 'name': 'NOEXCHANGE'},  # missing exch_seg: skipped
+]
+
+
+def write_master(path, scrips):
+    with open(path, 'w') as f:
+        json.dump(scrips, f)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    json_path = str(tmp_path / "OpenAPIScripMaster.json")
+    write_master(json_path, SCRIPS)
+    return json_path, str(tmp_path / "OpenAPIScripMaster.idx")
+
+
+@pytest.fixture
+def index(paths):
+    index = ScripMasterIndex.load(*paths)
+    yield index
+    index.close()
+
+
+def test_build_skips_incomplete_entries(index):
+    assert len(index) == 5
+    assert index.exchanges == ['BSE', 'NFO', 'NSE']
+
+
+def test_lookup_is_exchange_aware(index):
+    assert index.lookup('RELIANCE-EQ', 'NSE')['token'] == '2885'
+    assert index.lookup('RELIANCE', 'BSE')['token'] == '500325'
+    assert index.lookup('RELIANCE', 'NSE') is None
+    assert index.lookup('RELIANCE-EQ', 'MCX') is None
+
+
+def test_row_has_typed_fields(index):
+    assert index.lookup('RELIANCE27JUN24FUT', 'NFO') == {
+        'symbol': 'RELIANCE27JUN24FUT', 'token': '2885', 'exch_seg': 'NFO', 'name': 'RELIANCE',
+        'instrumenttype': 'FUTSTK', 'lotsize': 250, 'tick_size': 10.0,
+    }
+
+
+def test_token_lookup(index):
+    assert index.lookup_token('2885', 'NFO')['symbol'] == 'RELIANCE27JUN24FUT'
+    assert index.lookup_token(2885, 'NSE')['symbol'] == 'RELIANCE-EQ'
+    # Without an exchange, segments are tried in index order.
+    assert index.lookup_token('2885')['exch_seg'] == 'NFO'
+    assert index.lookup_token('424242') is None
+
+
+def test_prefix_search_and_exchange_scan(index):
+    rows = index.find_rows_by_prefix('RELIANCE', 'NSE')
+    assert [index.row(row)['symbol'] for row in rows] == ['RELIANCE-EQ']
+    rows = index.find_rows_by_prefix('', 'NSE', limit=2)
+    assert [index.row(row)['symbol'] for row in rows] == ['INFY-EQ', 'RELIANCE-EQ']
+    assert sorted(index.row(row)['symbol'] for row in index.rows_for_exchange('NSE', symbol_suffix='-EQ')) == \
+        ['INFY-EQ', 'RELIANCE-EQ', 'TCS-EQ']
+    assert list(index.rows_for_exchange('NFO', instrument_type='OPTSTK')) == []
+
+
+def test_unchanged_source_reuses_index(paths):
+    json_path, index_path = paths
+    ScripMasterIndex.load(json_path, index_path).close()
+    built = os.stat(index_path).st_mtime_ns
+    # Touched but identical: the hash matches, so the index is kept.
+    os.utime(json_path, ns=(built + 10 ** 9, built + 10 ** 9))
+    index = ScripMasterIndex.load(json_path, index_path)
+    assert len(index) == 5
+    index.close()
+    assert ScripMasterIndex._read_header(index_path)[4] == os.stat(json_path).st_mtime_ns
+
+
+def test_changed_source_rebuilds_index(paths):
+    json_path, index_path = paths
+    ScripMasterIndex.load(json_path, index_path).close()
+    write_master(json_path, SCRIPS + [{'token': '3045', 'symbol': 'SBIN-EQ', 'name': 'SBIN', 'exch_seg': 'NSE'}])
+    index = ScripMasterIndex.load(json_path, index_path)
+    assert len(index) == 6
+    assert index.lookup('SBIN-EQ', 'NSE')['token'] == '3045'
+    index.close()
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "not-an-index.idx"
+    path.write_bytes(b'\0' * 128)
+    with pytest.raises(ValueError):
+        ScripMasterIndex(str(path))
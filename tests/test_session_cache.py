@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+pytest.importorskip('cryptography.fernet')
+
+from src.fake_broker import fake_jwt
+from src.session_cache import SessionCache, jwt_expiry
+
+
+def in_hours(hours):
+    return (datetime.datetime.now() + datetime.timedelta(hours=hours)).replace(microsecond=0)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'cache' / 'session.bin')
+    expires = in_hours(6)
+    SessionCache(path, 'secret', 'C1').save('Bearer jwt', 'refresh', 'feed', expires)
+    session = SessionCache(path, 'secret', 'C1').load()
+    assert (session['jwt_token'], session['refresh_token'], session['feed_token']) == ('Bearer jwt', 'refresh', 'feed')
+    assert session['expires_at'] == expires
+    with open(path, 'rb') as f:
+        assert b'refresh' not in f.read()
+
+
+@pytest.mark.parametrize('secret, client_code', [('other secret', 'C1'), ('secret', 'C2')])
+def test_cache_is_ignored_under_another_key_or_account(tmp_path, secret, client_code):
+    path = str(tmp_path / 'session.bin')
+    SessionCache(path, 'secret', 'C1').save('Bearer jwt', 'refresh', 'feed', in_hours(6))
+    assert SessionCache(path, secret, client_code).load() is None
+
+
+def test_expired_or_missing_cache_loads_nothing(tmp_path):
+    path = str(tmp_path / 'session.bin')
+    cache = SessionCache(path, 'secret', 'C1')
+    assert cache.load() is None
+    cache.save('Bearer jwt', 'refresh', 'feed', in_hours(-1))
+    assert cache.load() is None
+    cache.clear()
+    cache.clear()
+
+
+def test_jwt_expiry():
+    expires = in_hours(5)
+    assert jwt_expiry(fake_jwt(expires)) == expires
+    for token in (None, '', 'not-a-jwt', 'a.!!!.c', 'a.e30.c', fake_jwt(expires).replace('.', '', 1)):
+        assert jwt_expiry(token) is None
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.bar_aggregator import B_CLOSE
+from src.strategy import IndicatorEngine, SymbolIndicators, TrendStrategy, compute_indicators_batch
+
+# Monday 2024-01-01 09:15 IST
+SESSION_START_MS = 1704080700000
+MINUTE_MS = 60_000
+
+
+def random_bars(n=900, seed=7):
+    rng = np.random.default_rng(seed)
+    starts = (SESSION_START_MS + np.arange(n) // 375 * 86_400_000 + np.arange(n) % 375 * MINUTE_MS).astype(float)
+    close = 200 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = close + rng.normal(0, 0.2, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 0.5, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.5, n)
+    return np.vstack([starts, open_, high, low, close, rng.integers(1, 5000, n)]).astype(float)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_streaming_and_batch_indicators_agree_exactly(seed):
+    bars = random_bars(seed=seed)
+    batch = compute_indicators_batch(bars)
+    state = SymbolIndicators()
+    streamed = {name: [] for name in batch}
+    for bar in bars.T.tolist():
+        state.update_bar(bar)
+        for name in streamed:
+            streamed[name].append(getattr(state, name))
+    for name, values in streamed.items():
+        np.testing.assert_array_equal(np.asarray(values), batch[name], err_msg=name)
+
+
+def make_state(time_of_day_ms, close=100.0, ema_fast=101.0, ema_slow=100.0, vwap=99.0, sideways=False):
+    # Bar end (start + 5 minutes) lands on the requested IST time of day.
+    start = SESSION_START_MS - (9 * 3600 + 15 * 60) * 1000 + time_of_day_ms - 300_000
+    return SimpleNamespace(last_bar_start=start, close=close, ema_fast=ema_fast, ema_slow=ema_slow, vwap=vwap,
+                           sideways=sideways)
+
+
+@pytest.fixture
+def strategy():
+    strategy = TrendStrategy(IndicatorEngine(timeframe=300, max_slots=4), capital_per_trade=10_000.0)
+    strategy.signals = []
+    strategy.add_signal_listener(strategy.signals.append)
+    return strategy
+
+
+def test_trend_entries_size_by_capital(strategy):
+    strategy.on_indicators(0, make_state(10 * 3600_000))
+    strategy.on_indicators(1, make_state(10 * 3600_000, close=50.0, ema_fast=49.0, ema_slow=50.0, vwap=51.0))
+    assert [(s.slot, s.target_quantity, s.reason) for s in strategy.signals] == [
+        (0, 100, 'trend long'), (1, -200, 'trend short')]
+    # An unchanged target emits nothing.
+    strategy.on_indicators(0, make_state(10 * 3600_000 + 300_000))
+    assert len(strategy.signals) == 2
+
+
+def test_sideways_flag_suppresses_entries_and_exits_positions(strategy):
+    strategy.on_indicators(0, make_state(10 * 3600_000, sideways=True))
+    assert strategy.signals == [] and strategy.target(0) == 0
+    strategy.on_indicators(0, make_state(10 * 3600_000 + 300_000))
+    strategy.on_indicators(0, make_state(10 * 3600_000 + 600_000, sideways=True))
+    assert [(s.target_quantity, s.reason) for s in strategy.signals] == [(100, 'trend long'), (0, 'sideways')]
+
+
+def test_no_entries_after_cutoff_and_square_off(strategy):
+    strategy.on_indicators(0, make_state(10 * 3600_000))
+    strategy.on_indicators(1, make_state(15 * 3600_000 + 300_000))
+    assert strategy.target(1) == 0
+    strategy.on_indicators(0, make_state(15 * 3600_000 + 15 * 60_000))
+    assert [(s.slot, s.target_quantity, s.reason) for s in strategy.signals] == [
+        (0, 100, 'trend long'), (0, 0, 'square-off')]
+    assert strategy.signals[-1].timestamp_ms % 86_400_000 == (15 * 3600 + 15 * 60 - 19800) * 1000
+
+
+def test_flatten_all_zeroes_every_open_target(strategy):
+    engine = strategy.engine
+    for slot in (0, 2):
+        engine.state(slot).update_bar(random_bars(1)[:, 0].tolist())
+        strategy.set_target(slot, 10)
+    strategy.flatten_all(SESSION_START_MS, reason='kill switch')
+    assert [(s.slot, s.target_quantity, s.price) for s in strategy.signals] == [
+        (0, 0, engine.state(0).close), (2, 0, engine.state(2).close)]
+    assert engine.state(0).close == random_bars(1)[B_CLOSE, 0]
@@ -0,0 +1,67 @@
+import datetime
+import logging
+
+import pytest
+
+from src.clock import SimulatedClock
+from src.database_manager import TradeJournal, to_epoch_ms
+from src.models.order import Order
+from src.orders import BUY, LIMIT, INTRADAY, STATUS_OPEN
+
+NOW_MS = to_epoch_ms(datetime.datetime(2024, 6, 3, 10, 0))
+INSTRUMENT = {'symbol': 'RELIANCE-EQ', 'token': '2885', 'exchange': 'NSE'}
+
+
+def open_order(order_id):
+    order = Order(order_id, 0, INSTRUMENT, BUY, LIMIT, 10, 2900.0, 0.0, INTRADAY, NOW_MS)
+    order.status = STATUS_OPEN
+    return order
+
+
+def crash(journal):
+    """Stops the writer after everything is written, without closing the session."""
+    assert journal.flush()
+    journal._stop.set()
+    journal._wake.set()
+    journal._thread.join()
+    journal._thread = None
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path), clock=SimulatedClock(NOW_MS), flush_interval=0.01)
+    journal.start()
+    yield journal
+    journal.close()
+
+
+def sessions(journal):
+    return {row['session']: row['clean'] for row in journal._query("SELECT session, clean FROM sessions")}
+
+
+def test_orders_are_journaled_and_the_session_closed_clean(journal):
+    journal.record_order(open_order('PAPER00000001'))
+    assert journal.flush()
+    assert [order['status'] for order in journal.orders('2024-06-03')] == ['open']
+    journal.close()
+    assert sessions(journal) == {journal.session: 1}
+
+
+def test_crashed_session_is_recovered_once(tmp_path, caplog):
+    clock = SimulatedClock(NOW_MS)
+    crashed = TradeJournal(str(tmp_path), clock=clock, flush_interval=0.01)
+    crashed.start()
+    crashed.record_order(open_order('PAPER00000001'))
+    crash(crashed)
+
+    with caplog.at_level(logging.WARNING, logger='src.database_manager'):
+        for _ in range(2):
+            clock.advance(1_000)
+            restarted = TradeJournal(str(tmp_path), clock=clock, flush_interval=0.01)
+            restarted.start()
+            restarted.close()
+    warnings = [record for record in caplog.records if 'did not close cleanly' in record.getMessage()]
+    assert len(warnings) == 1
+    order, = restarted.orders(session=crashed.session)
+    assert (order['status'], order['updated_ms']) == ('cancelled', NOW_MS + 1_000)
+    assert sessions(restarted)[crashed.session] == 2